@@ -0,0 +1,234 @@
+import logging
+
+from solana.rpc.commitment import Processed
+from solana.rpc.types import TokenAccountOpts
+
+from spl.token.instructions import create_associated_token_account
+from termcolor import cprint
+
+from app.async_utils import fetch_pool_keys, get_pool_reserves, get_token_balance
+from app.blockhash import BlockhashCache
+from app.broadcast import TransactionSender
+from app.chain_constants import ChainConstants, get_payer_token_account
+from app.config import PERSISTENT_WSOL, payer_keypair
+from app.constants import SOL_DECIMAL
+from app.price_feed import PriceFeed
+from app.quote import quote_buy, quote_sell
+from app.raydium import (
+    build_buy_instructions,
+    build_persistent_buy_instructions,
+    build_persistent_sell_instructions,
+    build_sell_instructions,
+    get_token_decimals,
+    get_token_mint,
+    sign_transaction
+)
+from app.rpc import get_async_client
+from app.scheduler import CRITICAL, prioritized
+from app.swap_templates import SwapTemplates
+from app.token_accounts import TokenAccountIndex
+from app.wsol import WsolAccountManager
+
+
+def prepare_swap(pool_keys: dict) -> None:
+    """
+    Precompiles the pool's swap instructions once it passed the filters.
+
+    Called in the idle window between discovery and the buy decision, so the
+    buy and every later sell only pack their amounts.
+    """
+    mint = get_token_mint(pool_keys)
+    token_account = TokenAccountIndex.get_instance().get_account(mint) or get_payer_token_account(mint)
+    wsol_account = WsolAccountManager.get_instance().account if PERSISTENT_WSOL else None
+    SwapTemplates.get_instance().prepare(pool_keys, token_account, wsol_account)
+
+
+async def get_reserves(pool_keys: dict):
+    """Vault amounts of the pool, from the price feed when it has a fresh subscribed tick."""
+    tick = PriceFeed.get_instance().fresh(pool_keys["amm_id"])
+    if tick is not None:
+        return tick.base_vault_amount, tick.quote_vault_amount
+    return await get_pool_reserves(pool_keys)
+
+
+def report_confirmation(confirmed, token_symbol) -> None:
+    if confirmed is None:
+        logging.error(f" {token_symbol} -   Transaction expired before it landed.")
+    elif not confirmed:
+        cprint(f" -- {token_symbol} --  Transaction failed.", "red", attrs=["bold"])
+
+
+async def buy(pair_address: str, pool_keys=None, sol_in: float = .01, slippage: int = 5, token_symbol=None):
+    """
+    Async version of `app.raydium.buy`.
+
+    Returns:
+        (txn_sig, confirmed)
+    """
+    reserved = None
+    try:
+        client = get_async_client()
+        logging.debug(f"Starting buy transaction for pair address: {pair_address}")
+
+        if pool_keys is None:
+            pool_keys = await fetch_pool_keys(pair_address)
+
+            if pool_keys is None:
+                logging.error("No pool keys found...")
+                return None, False
+            logging.debug(f"  Pool keys for    {token_symbol}    fetched successfully.")
+
+        mint = get_token_mint(pool_keys)
+
+        logging.debug("Calculating transaction amounts...")
+        reserves = await get_reserves(pool_keys)
+        if reserves is None:
+            logging.error(f"  {token_symbol} - Pool vaults not found...")
+            return None, False
+        amount_in, minimum_amount_out = quote_buy(pool_keys, *reserves, int(sol_in * SOL_DECIMAL), slippage)
+        cprint(f"\n{token_symbol}   Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}", "yellow", attrs=["bold"])
+
+        logging.debug("Checking for existing token account...")
+        token_accounts = TokenAccountIndex.get_instance()
+        if token_accounts.ready:
+            token_account = token_accounts.get_account(mint)
+        else:
+            token_account_check = await client.get_token_accounts_by_owner(payer_keypair.pubkey(), TokenAccountOpts(mint), Processed)
+            token_account = token_account_check.value[0].pubkey if token_account_check.value else None
+
+        if token_account:
+            token_account_instr = None
+            logging.info(f"\n      {token_symbol}      Token account found: {token_account}")
+        else:
+            token_account = get_payer_token_account(mint)
+            token_account_instr = create_associated_token_account(payer_keypair.pubkey(), payer_keypair.pubkey(), mint)
+            logging.error("No existing token account found; creating associated token account.")
+
+        logging.debug(f"     {token_symbol}      Creating swap instructions...")
+        wsol = WsolAccountManager.get_instance()
+        if PERSISTENT_WSOL and wsol.reserve(amount_in):
+            reserved = amount_in
+            instructions = build_persistent_buy_instructions(
+                pool_keys, amount_in, minimum_amount_out,
+                wsol.account, token_account, token_account_instr
+            )
+        else:
+            balance_needed = ChainConstants.get_instance().token_account_rent
+            instructions = build_buy_instructions(
+                pool_keys, amount_in, minimum_amount_out,
+                token_account, token_account_instr, balance_needed
+            )
+
+        logging.debug(f"     {token_symbol}     Compiling transaction message...")
+        blockhash, last_valid_block_height = await BlockhashCache.get_instance().get()
+        txn = sign_transaction(instructions, blockhash)
+        logging.debug(f"    {token_symbol}     Transaction size: {len(bytes(txn))} bytes, {len(instructions)} instructions")
+        logging.info(f"Transaction Signature: {txn.signatures[0]}")
+
+        logging.debug(f"    {token_symbol}     Broadcasting transaction until it lands...")
+        txn_sig, confirmed = await TransactionSender.get_instance().send(txn, last_valid_block_height)
+        report_confirmation(confirmed, token_symbol)
+        logging.info(f"\n    {token_symbol}  -  Transaction confirmed: {confirmed}")
+        if not confirmed:
+            # the retry gets a precompiled route again
+            prepare_swap(pool_keys)
+
+        return (txn_sig, confirmed)
+
+    except Exception as e:
+        logging.error(f"  {token_symbol} - Error occurred during transaction: {str(e)}")
+        return (None, False)
+    finally:
+        if reserved is not None:
+            WsolAccountManager.get_instance().release(reserved)
+
+
+@prioritized(CRITICAL)
+async def sell(pair_address: str, percentage: int = 100, slippage: int = 5, token_symbol="", pool_keys=None):
+    """
+    Async version of `app.raydium.sell`.
+
+    Returns:
+        (confirmed, txn_sig, sold_token_amount)
+    """
+    reserved = None
+    try:
+        logging.debug(f"Starting sell transaction for: {token_symbol}")
+        if not (1 <= percentage <= 100):
+            logging.error("Percentage must be between 1 and 100.")
+            return False, None, None
+
+        if pool_keys is None:
+            logging.debug(f"  {token_symbol}  -  Fetching pool keys...")
+            pool_keys = await fetch_pool_keys(pair_address)
+            if pool_keys is None:
+                logging.error(f"  {token_symbol}  -  No pool keys found...")
+                return False, None, None
+
+        mint = get_token_mint(pool_keys)
+
+        logging.debug(f"  {token_symbol}  -  Retrieving token balance...")
+        token_accounts = TokenAccountIndex.get_instance()
+        token_balance = token_accounts.get_balance(mint, get_token_decimals(pool_keys)) if token_accounts.ready else None
+        if token_balance is None:
+            token_balance = await get_token_balance(str(mint))
+        logging.info(f"\n    {token_symbol}  -   Token Balance: {token_balance}")
+        if not token_balance:
+            logging.error(f"   {token_symbol}  -   No token balance available to sell.")
+            return False, None, None
+        token_balance = token_balance * (percentage / 100)
+
+        logging.debug("Calculating transaction amounts...")
+        raw_balance = token_accounts.get_raw_amount(mint) if token_accounts.ready else None
+        if raw_balance is not None:
+            token_amount_in = raw_balance * percentage // 100
+        else:
+            token_amount_in = int(token_balance * 10**get_token_decimals(pool_keys))
+        reserves = await get_reserves(pool_keys)
+        if reserves is None:
+            logging.error(f"  {token_symbol}  -  Pool vaults not found...")
+            return False, None, None
+        amount_in, minimum_amount_out = quote_sell(pool_keys, *reserves, token_amount_in, slippage)
+        logging.info(f"\n    {token_symbol}  -  Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}")
+
+        token_account = get_payer_token_account(mint)
+
+        logging.debug("Creating swap instructions...")
+        wsol = WsolAccountManager.get_instance()
+        if PERSISTENT_WSOL and wsol.reserve(0):
+            reserved = 0
+            instructions = build_persistent_sell_instructions(
+                pool_keys, amount_in, minimum_amount_out,
+                wsol.account, token_account, percentage == 100
+            )
+        else:
+            balance_needed = ChainConstants.get_instance().token_account_rent
+            instructions = build_sell_instructions(
+                pool_keys, amount_in, minimum_amount_out,
+                token_account, balance_needed, percentage == 100
+            )
+
+        logging.debug(f"--  {token_symbol} -- Compiling transaction message...")
+        blockhash, last_valid_block_height = await BlockhashCache.get_instance().get()
+        txn = sign_transaction(instructions, blockhash)
+        logging.debug(f"    {token_symbol}     Transaction size: {len(bytes(txn))} bytes, {len(instructions)} instructions")
+        logging.info(f"  {token_symbol}  -  Transaction Signature: {txn.signatures[0]}")
+
+        logging.debug(f"  {token_symbol}  -  Broadcasting transaction until it lands...")
+        txn_sig, confirmed = await TransactionSender.get_instance().send(txn, last_valid_block_height)
+        report_confirmation(confirmed, token_symbol)
+        logging.info(f"--   {token_symbol}  -   Transaction confirmed: {confirmed}")
+        if confirmed and percentage == 100:
+            # the token account is closed by this transaction
+            token_accounts.remove(mint)
+        else:
+            # the next sell gets a precompiled route again
+            prepare_swap(pool_keys)
+        return confirmed, txn_sig, token_balance
+
+    except Exception as e:
+        logging.error(f"  {token_symbol}  -  Error occurred during transaction: {str(e)}")
+        return False, None, None
+    finally:
+        if reserved is not None:
+            WsolAccountManager.get_instance().release(reserved)
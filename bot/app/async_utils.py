@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from solana.rpc.commitment import Commitment, Confirmed, Processed
+from solana.rpc.types import TokenAccountOpts
+from solders.pubkey import Pubkey  # type: ignore
+from solders.signature import Signature  # type: ignore
+
+from termcolor import cprint
+
+from app.config import payer_keypair
+from app.confirmation import CONFIRM_TIMEOUT, ConfirmationEngine
+from app.decoders import AMM_POOL_KEYS_DECODER, MARKET_POOL_KEYS_DECODER
+from app.pool_cache import PoolKeysCache
+from app.rpc import get_async_client
+from app.utils import (
+    decode_many_pool_keys,
+    find_data,
+    get_market_id,
+    parse_token_price,
+    parse_vault_amounts,
+    pool_keys_from_decoded
+)
+
+# getMultipleAccounts accepts up to 100 pubkeys per request
+MAX_MULTIPLE_ACCOUNTS = 100
+
+
+async def fetch_pool_keys(pair_address: str) -> dict:
+    try:
+        cache = PoolKeysCache.get_instance()
+        pool_keys = cache.get(pair_address)
+        if pool_keys is not None:
+            return pool_keys
+
+        client = get_async_client()
+        amm_id = Pubkey.from_string(str(pair_address))
+        amm_data = (await client.get_account_info(amm_id, encoding="base64")).value.data
+
+        # send the market read right away and decode the AMM account while it is in flight
+        marketId = get_market_id(amm_data)
+        market_request = asyncio.ensure_future(client.get_account_info(marketId, encoding="base64"))
+        try:
+            amm_data_decoded = AMM_POOL_KEYS_DECODER.decode(amm_data)
+        except Exception:
+            market_request.cancel()
+            raise
+        market_decoded = MARKET_POOL_KEYS_DECODER.decode((await market_request).value.data)
+
+        pool_keys = pool_keys_from_decoded(amm_id, amm_data_decoded, market_decoded)
+        cache.put(amm_id, pool_keys)
+        return pool_keys
+    except Exception as e:
+        logging.error(f"Error fetching pool keys: {str(e)}")
+        return None
+
+
+async def fetch_many_pool_keys(pair_addresses: list) -> dict:
+    """
+    Resolves pool keys for many pools with getMultipleAccounts.
+
+    Cached pools are served locally; the rest cost one request for the AMM
+    accounts and one for their markets per 100 pools.
+
+    Returns:
+        {pair_address (str): pool_keys}, pools that could not be resolved are omitted.
+    """
+    cache = PoolKeysCache.get_instance()
+    client = get_async_client()
+    result = {}
+    missing = []
+    for pair_address in pair_addresses:
+        pool_keys = cache.get(pair_address)
+        if pool_keys is not None:
+            result[str(pair_address)] = pool_keys
+        else:
+            missing.append(Pubkey.from_string(str(pair_address)))
+
+    resolved = {}
+    for start in range(0, len(missing), MAX_MULTIPLE_ACCOUNTS):
+        chunk = missing[start:start + MAX_MULTIPLE_ACCOUNTS]
+        try:
+            amm_accounts = (await client.get_multiple_accounts(chunk, encoding="base64")).value
+            found = [
+                (amm_id, account.data)
+                for amm_id, account in zip(chunk, amm_accounts)
+                if account is not None
+            ]
+            market_ids = [get_market_id(amm_data) for _, amm_data in found]
+            market_accounts = (await client.get_multiple_accounts(market_ids, encoding="base64")).value
+
+            amm_ids, amm_datas, market_datas = [], [], []
+            for (amm_id, amm_data), market_account in zip(found, market_accounts):
+                if market_account is None:
+                    continue
+                amm_ids.append(amm_id)
+                amm_datas.append(amm_data)
+                market_datas.append(market_account.data)
+
+            for amm_id, pool_keys in zip(amm_ids, decode_many_pool_keys(amm_ids, amm_datas, market_datas)):
+                resolved[amm_id] = pool_keys
+        except Exception as e:
+            logging.error(f"Error fetching pool keys batch: {str(e)}")
+
+    if resolved:
+        cache.put_many(resolved)
+        result.update({str(amm_id): pool_keys for amm_id, pool_keys in resolved.items()})
+    return result
+
+
+async def get_token_balance(mint_str: str):
+    try:
+        response = await get_async_client().get_token_accounts_by_owner_json_parsed(
+            payer_keypair.pubkey(),
+            TokenAccountOpts(mint=Pubkey.from_string(mint_str))
+        )
+        ui_amount = find_data(json.loads(response.to_json()), "uiAmount")
+        return float(ui_amount)
+    except Exception as e:
+        logging.error(f"Error fetching token balance: {str(e)}")
+        return None
+
+
+async def confirm_txn(
+        txn_sig: Signature,
+        token_name: str = None,
+        commitment: Commitment = Confirmed,
+        timeout: float = CONFIRM_TIMEOUT
+) -> bool:
+    """
+    Waits for the transaction through the shared `ConfirmationEngine`.
+
+    Returns:
+        True if confirmed, False if it failed on chain, None on timeout.
+    """
+    confirmed = await ConfirmationEngine.get_instance().wait(txn_sig, commitment, timeout)
+    if confirmed is None:
+        logging.error(f" {token_name} -   Transaction confirmation timed out.")
+    elif not confirmed:
+        cprint(f" -- {token_name} --  Transaction failed.", "red", attrs=["bold"])
+    return confirmed
+
+
+async def get_token_price(pool_keys: dict) -> tuple:
+    try:
+        balances_response = await get_async_client().get_multiple_accounts_json_parsed(
+            [pool_keys["base_vault"], pool_keys["quote_vault"]],
+            Processed
+        )
+        return parse_token_price(pool_keys, balances_response.value)
+
+    except Exception as e:
+        logging.error(f"Error occurred: {str(e)}")
+        return None, None
+
+
+async def get_pool_reserves(pool_keys: dict) -> Optional[tuple]:
+    """
+    Returns:
+        (base_vault_amount, quote_vault_amount) in raw units.
+    """
+    response = await get_async_client().get_multiple_accounts(
+        [pool_keys["base_vault"], pool_keys["quote_vault"]],
+        Processed,
+        encoding="base64"
+    )
+    return parse_vault_amounts(response.value)
+
+
+async def get_sol_balance(pubkey: Pubkey = None) -> float:
+    response = await get_async_client().get_balance(pubkey or payer_keypair.pubkey())
+    return response.value / 10**9
@@ -0,0 +1,93 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, List, Optional
+
+
+class BatchWriter:
+    """
+    Base of the stores written in batches from a background thread.
+
+    `put` only queues an item, so callers on the event loop never wait on
+    the disk. The writer thread, started on the first `put` or by `start`,
+    collects items until a batch is full or the flush interval elapsed and
+    hands them to `_flush`. `close` writes what is still queued and stops
+    the thread; it also runs at exit.
+
+    Subclasses implement `_flush` and may override `_open` and `_release`
+    to hold resources, such as a database connection, in the writer thread.
+    """
+
+    def __init__(self, name: str, batch_size: int, flush_interval: float):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.written = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, item: Any) -> None:
+        if self._thread is None:
+            self.start()
+        self._queue.put(item)
+
+    def close(self) -> None:
+        """Writes the queued items and stops the writer thread."""
+        if self._thread is None or self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self._queue.qsize(),
+            "written": self.written,
+            "errors": self.errors,
+        }
+
+    def _open(self) -> None:
+        """Runs in the writer thread before the first batch."""
+
+    def _release(self) -> None:
+        """Runs in the writer thread after the last batch."""
+
+    def _flush(self, batch: List[Any]) -> None:
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        self._open()
+        try:
+            while True:
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+                elif self._closed.is_set():
+                    return
+        finally:
+            self._release()
+
+    def _collect(self) -> List[Any]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+            except queue.Empty:
+                if self._closed.is_set():
+                    break
+        return batch
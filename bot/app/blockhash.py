@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+
+from solana.rpc.commitment import Commitment, Confirmed
+from solders.hash import Hash  # type: ignore
+
+from app.rpc import get_async_client
+
+BLOCKHASH_REFRESH_INTERVAL = 2
+# A blockhash stays valid for 150 blocks (~60 seconds),
+# older cached values are refetched before use.
+BLOCKHASH_MAX_AGE = 20
+
+
+class BlockhashCache:
+    """
+    Keeps a recent blockhash in memory, refreshed by a background task.
+
+    Transaction builders read `get()` instead of calling
+    `get_latest_blockhash` on the critical path of every swap.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            refresh_interval: float = BLOCKHASH_REFRESH_INTERVAL,
+            max_age: float = BLOCKHASH_MAX_AGE,
+            commitment: Commitment = Confirmed
+    ):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.commitment = commitment
+
+        self.blockhash: Optional[Hash] = None
+        self.last_valid_block_height: Optional[int] = None
+        self.fetched_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.refreshes = 0
+        self.errors = 0
+        self.stale_reads = 0
+        self.refresh_latency: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = BlockhashCache()
+        return cls._instance
+
+    @property
+    def age(self) -> Optional[float]:
+        if self.blockhash is None:
+            return None
+        return time.monotonic() - self.fetched_at
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            started = time.monotonic()
+            response = await get_async_client().get_latest_blockhash(self.commitment)
+            self.blockhash = response.value.blockhash
+            self.last_valid_block_height = response.value.last_valid_block_height
+            self.fetched_at = time.monotonic()
+            self.refresh_latency = self.fetched_at - started
+            self.refreshes += 1
+
+    async def get(self, max_age: Optional[float] = None) -> Tuple[Hash, int]:
+        """
+        Returns the cached blockhash and its last valid block height.
+
+        Fetches a new one inline if the cached value is older than `max_age`.
+        """
+        self.start()
+        age = self.age
+        if age is None or age > (max_age or self.max_age):
+            self.stale_reads += 1
+            await self.refresh()
+        return self.blockhash, self.last_valid_block_height
+
+    def stats(self) -> dict:
+        return {
+            "age": self.age,
+            "refresh_latency": self.refresh_latency,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "stale_reads": self.stale_reads,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error refreshing blockhash: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
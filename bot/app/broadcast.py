@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+from solana.rpc.commitment import Commitment, Confirmed
+from solana.rpc.types import TxOpts
+from solders.signature import Signature  # type: ignore
+from solders.transaction import VersionedTransaction  # type: ignore
+
+from app.config import SEND_ENDPOINTS
+from app.confirmation import CONFIRM_TIMEOUT, ConfirmationEngine
+from app.rpc import get_async_client
+from app.scheduler import RequestScheduler
+
+REBROADCAST_INTERVAL = float(os.getenv("REBROADCAST_INTERVAL", "0.5"))
+# How often the block height is compared with the blockhash expiry
+BLOCK_HEIGHT_INTERVAL = 2
+# Wait for a confirmation already on its way once the blockhash expired
+EXPIRY_GRACE = 2
+
+
+class TransactionSender:
+    """
+    Broadcasts a signed transaction to every send endpoint until it lands.
+
+    The same signed bytes are sent to all `SEND_ENDPOINTS` at once and sent
+    again every `REBROADCAST_INTERVAL` while the `ConfirmationEngine` waits
+    for the signature. Nodes drop duplicates, so rebroadcasting only raises
+    the chance that a leader sees the transaction. The loop ends when the
+    transaction is confirmed, fails on chain, or its blockhash expires; only
+    then is it worth rebuilding and signing a new one.
+
+    Sends never wait for a rate limit, they only count against it. An
+    endpoint backing off after a 429 is skipped while others are available.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            endpoints: List[str] = None,
+            interval: float = REBROADCAST_INTERVAL,
+            block_height_interval: float = BLOCK_HEIGHT_INTERVAL
+    ):
+        self.endpoints = list(endpoints or SEND_ENDPOINTS)
+        self.interval = interval
+        self.block_height_interval = block_height_interval
+
+        self.sent = 0
+        self.broadcasts = 0
+        self.send_errors = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.expired = 0
+        self.last_latency: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = TransactionSender()
+        return cls._instance
+
+    async def send(
+            self,
+            txn: VersionedTransaction,
+            last_valid_block_height: int,
+            commitment: Commitment = Confirmed,
+            timeout: float = CONFIRM_TIMEOUT
+    ) -> Tuple[Signature, Optional[bool]]:
+        """
+        Sends `txn` and rebroadcasts it until it is confirmed or expired.
+
+        Returns:
+            (signature, confirmed): confirmed is True if the transaction
+            succeeded, False if it failed on chain, None if its blockhash
+            expired (or `timeout` elapsed) before it landed.
+        """
+        signature = txn.signatures[0]
+        raw = bytes(txn)
+        started = time.monotonic()
+        self.sent += 1
+
+        # nothing to wait for if no endpoint accepted the first broadcast
+        await self._broadcast(raw, signature, first=True)
+        confirmation = asyncio.create_task(ConfirmationEngine.get_instance().wait(signature, commitment, timeout))
+        checked_at = started
+        try:
+            while True:
+                done, _ = await asyncio.wait({confirmation}, timeout=self.interval)
+                if done:
+                    return signature, self._result(confirmation.result(), started)
+
+                if time.monotonic() - checked_at >= self.block_height_interval:
+                    checked_at = time.monotonic()
+                    if await self._expired(last_valid_block_height):
+                        try:
+                            confirmed = await asyncio.wait_for(asyncio.shield(confirmation), EXPIRY_GRACE)
+                        except asyncio.TimeoutError:
+                            self.expired += 1
+                            logging.error(f"Transaction {signature} expired after {time.monotonic() - started:.1f}s")
+                            return signature, None
+                        return signature, self._result(confirmed, started)
+
+                await self._broadcast(raw, signature)
+        finally:
+            if not confirmation.done():
+                confirmation.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "endpoints": len(self.endpoints),
+            "sent": self.sent,
+            "broadcasts": self.broadcasts,
+            "send_errors": self.send_errors,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "expired": self.expired,
+            "last_latency": self.last_latency,
+        }
+
+    def _result(self, confirmed: Optional[bool], started: float) -> Optional[bool]:
+        if confirmed:
+            self.confirmed += 1
+            self.last_latency = time.monotonic() - started
+        elif confirmed is False:
+            self.failed += 1
+        return confirmed
+
+    async def _broadcast(self, raw: bytes, signature: Signature, first: bool = False) -> None:
+        self.broadcasts += 1
+        scheduler = RequestScheduler.get_instance()
+        endpoints = [endpoint for endpoint in self.endpoints if not scheduler.blocked_for(endpoint)] or self.endpoints
+        results = await asyncio.gather(*(self._send(endpoint, raw) for endpoint in endpoints), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        self.send_errors += len(errors)
+        if first and len(errors) == len(results):
+            raise errors[0]
+        for error in errors:
+            logging.debug(f"Error broadcasting {signature}: {str(error)}")
+
+    async def _send(self, endpoint: str, raw: bytes) -> None:
+        scheduler = RequestScheduler.get_instance()
+        scheduler.consume(endpoint, "send_raw_transaction")
+        try:
+            # the node must not queue its own retries, the sender rebroadcasts
+            await get_async_client(endpoint).send_raw_transaction(raw, opts=TxOpts(skip_preflight=True, max_retries=0))
+        except Exception as e:
+            scheduler.record(endpoint, e)
+            raise
+        scheduler.record(endpoint)
+
+    async def _expired(self, last_valid_block_height: int) -> bool:
+        try:
+            block_height = (await get_async_client().get_block_height(Confirmed)).value
+        except Exception as e:
+            logging.error(f"Error fetching block height: {str(e)}")
+            return False
+        return block_height > last_valid_block_height
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+from spl.token.instructions import get_associated_token_address
+
+from app.config import payer_keypair
+from app.constants import OPEN_BOOK_PROGRAM
+from app.layouts import ACCOUNT_LAYOUT
+from app.rpc import get_async_client
+
+# Rent only changes with a cluster feature activation
+CHAIN_CONSTANTS_REFRESH_INTERVAL = 6 * 60 * 60
+# Rent-exempt minimum of a 165 byte token account, used until the first fetch succeeds
+DEFAULT_TOKEN_ACCOUNT_RENT = 2_039_280
+
+payer_pubkey = payer_keypair.pubkey()
+
+
+@lru_cache(maxsize=1024)
+def get_payer_token_account(mint: Pubkey) -> Pubkey:
+    """ATA of the payer for the given mint, derived once per mint."""
+    return get_associated_token_address(payer_pubkey, mint)
+
+
+@lru_cache(maxsize=1024)
+def get_market_authority(market_id: Pubkey, vault_signer_nonce: int) -> Pubkey:
+    return Pubkey.create_program_address(
+        [bytes(market_id), bytes([vault_signer_nonce]), bytes(7)],
+        OPEN_BOOK_PROGRAM
+    )
+
+
+class ChainConstants:
+    """
+    Values that are effectively constant for the life of the bot.
+
+    Resolved once at startup and refreshed rarely in the background,
+    so transaction builders never pay a round trip for them.
+    """
+    _instance = None
+
+    def __init__(self, refresh_interval: float = CHAIN_CONSTANTS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.token_account_rent = DEFAULT_TOKEN_ACCOUNT_RENT
+        self.refreshed_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ChainConstants()
+        return cls._instance
+
+    async def refresh(self) -> None:
+        response = await get_async_client().get_minimum_balance_for_rent_exemption(ACCOUNT_LAYOUT.sizeof())
+        self.token_account_rent = response.value
+        self.refreshed_at = time.time()
+        logging.info(f"Token account rent: {self.token_account_rent} lamports")
+
+    async def start(self) -> None:
+        """Resolves the constants once and schedules the background refresh."""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            await self.refresh()
+        except Exception as e:
+            logging.error(f"Error resolving chain constants, using defaults: {str(e)}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing chain constants: {str(e)}")
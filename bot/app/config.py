@@ -2,7 +2,6 @@ import logging.handlers
 import os
 import base58
 import logging
-from solana.rpc.api import Client
 from solders.keypair import Keypair  # type: ignore
 import dotenv
 from colorama import Fore, Style, init
@@ -12,9 +11,24 @@ dotenv.load_dotenv()
 SECRET_KEY = os.getenv("PRIVATE_KEY")
 RPC = "https://mainnet.helius-rpc.com/?api-key=8c91081f-d02b-472f-9f4b-fea3c9b7195c"  # ignore E501
 MAIN_RPC = "https://api.mainnet-beta.solana.com"
+WSS_RPC = RPC.replace("https://", "wss://", 1)
+# Comma separated endpoint pool of the RPC router, in order of preference
+RPC_ENDPOINTS = [
+    endpoint.strip()
+    for endpoint in os.getenv("RPC_ENDPOINTS", f"{RPC},{MAIN_RPC}").split(",")
+    if endpoint.strip()
+]
+# Endpoints every signed transaction is broadcast to, the router endpoints by default
+SEND_ENDPOINTS = [
+    endpoint.strip()
+    for endpoint in os.getenv("SEND_ENDPOINTS", ",".join(RPC_ENDPOINTS)).split(",")
+    if endpoint.strip()
+]
 UNIT_BUDGET = 100_000
 UNIT_PRICE = 1_000_000
-client = Client(RPC)
+# Swap through one long-lived WSOL account instead of a fresh one per trade
+PERSISTENT_WSOL = os.getenv("PERSISTENT_WSOL", "false").lower() == "true"
+PERSISTENT_WSOL_UNIT_BUDGET = 80_000
 # payer_keypair = Keypair.from_base58_string(PRIV_KEY)
 payer_keypair = Keypair.from_bytes(base58.b58decode(SECRET_KEY))
 
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from solana.rpc.commitment import Commitment, Confirmed
+from solana.rpc.websocket_api import SubscriptionError, connect
+from solders.rpc.config import RpcSignatureSubscribeConfig  # type: ignore
+from solders.errors import SerdeJSONError  # type: ignore
+from solders.rpc.requests import SignatureSubscribe, SignatureUnsubscribe  # type: ignore
+from solders.rpc.responses import SignatureNotification, SubscriptionResult  # type: ignore
+from solders.signature import Signature  # type: ignore
+from solders.commitment_config import CommitmentLevel  # type: ignore
+from websockets.exceptions import ConnectionClosedError, ProtocolError
+
+from app.config import WSS_RPC
+from app.signature_status import SignatureStatusManager
+
+# A transaction that is not confirmed once its blockhash expired never will be
+CONFIRM_TIMEOUT = 90
+RECONNECT_DELAY = 2
+
+COMMITMENT_LEVELS = {
+    "processed": CommitmentLevel.Processed,
+    "confirmed": CommitmentLevel.Confirmed,
+    "finalized": CommitmentLevel.Finalized,
+}
+
+
+class _Pending:
+    def __init__(self, signature: Signature, commitment: Commitment):
+        self.signature = signature
+        self.commitment = commitment
+        self.future = asyncio.get_running_loop().create_future()
+        self.started = time.monotonic()
+        self.subscription: Optional[int] = None
+        self.waiters = 0
+
+    @property
+    def key(self) -> Tuple[Signature, Commitment]:
+        return self.signature, self.commitment
+
+    def resolve(self, result: bool) -> None:
+        if not self.future.done():
+            self.future.set_result(result)
+
+
+class ConfirmationEngine:
+    """
+    Resolves transaction signatures as soon as they reach a commitment.
+
+    Every pending signature gets a `signatureSubscribe` on one shared
+    websocket. The `SignatureStatusManager` batch poll runs next to it, so a
+    dropped connection or a notification sent before the subscription landed
+    never leaves a trade waiting for its timeout.
+
+    Waiters on the same signature and commitment share one subscription and
+    one status poll, which are only torn down when the last of them leaves.
+    A subscription the node has not fired yet is then unsubscribed, so
+    timed out signatures do not pile up on the shared websocket.
+    """
+    _instance = None
+
+    def __init__(self, wss: str = WSS_RPC):
+        self.wss = wss
+        self.statuses = SignatureStatusManager.get_instance()
+
+        self._pending: Dict[Tuple[Signature, Commitment], _Pending] = {}
+        self._requests: Dict[int, Tuple[Signature, Commitment]] = {}
+        self._subscriptions: Dict[int, Tuple[Signature, Commitment]] = {}
+        self._websocket = None
+        self._task: Optional[asyncio.Task] = None
+        self._unsubscribes: Set[asyncio.Task] = set()
+
+        self.confirmed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.by_websocket = 0
+        self.by_poll = 0
+        self.last_latency: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ConfirmationEngine()
+        return cls._instance
+
+    @property
+    def connected(self) -> bool:
+        return self._websocket is not None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def wait(
+            self,
+            signature: Signature,
+            commitment: Commitment = Confirmed,
+            timeout: float = CONFIRM_TIMEOUT
+    ) -> Optional[bool]:
+        """
+        Waits until the transaction reaches `commitment`.
+
+        Returns:
+            True if it succeeded, False if it failed on chain,
+            None if it was not seen before the timeout.
+        """
+        self.start()
+        pending = self._pending.get((signature, commitment))
+        created = pending is None
+        if created:
+            pending = _Pending(signature, commitment)
+            self._pending[pending.key] = pending
+        pending.waiters += 1
+        try:
+            if created:
+                status = self.statuses.watch(signature, commitment)
+                status.add_done_callback(lambda future: self._on_status(pending, future))
+                if self._websocket is not None:
+                    await self._subscribe(pending)
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logging.error(f"Transaction {signature} not confirmed after {timeout}s")
+            return None
+        finally:
+            pending.waiters -= 1
+            if not pending.waiters:
+                self.statuses.forget(signature, commitment)
+                self._discard(pending)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "pending": len(self._pending),
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "by_websocket": self.by_websocket,
+            "by_poll": self.by_poll,
+            "last_latency": self.last_latency,
+        }
+
+    def _resolve(self, pending: _Pending, err, source: str) -> None:
+        if pending.future.done():
+            return
+        self.last_latency = time.monotonic() - pending.started
+        if err is None:
+            self.confirmed += 1
+        else:
+            self.failed += 1
+            logging.error(f"Transaction {pending.signature} failed: {err}")
+        if source == "websocket":
+            self.by_websocket += 1
+        else:
+            self.by_poll += 1
+        pending.resolve(err is None)
+
+    def _discard(self, pending: _Pending) -> None:
+        if self._pending.get(pending.key) is pending:
+            del self._pending[pending.key]
+        # signature subscriptions are removed by the node after one notification
+        if pending.subscription is not None and self._subscriptions.pop(pending.subscription, None) is not None:
+            self._unsubscribe(pending.subscription)
+
+    def _unsubscribe(self, subscription: int) -> None:
+        if self._websocket is None:
+            return
+        task = asyncio.create_task(self._send_unsubscribe(self._websocket, subscription))
+        self._unsubscribes.add(task)
+        task.add_done_callback(self._unsubscribes.discard)
+
+    async def _send_unsubscribe(self, websocket, subscription: int) -> None:
+        try:
+            request_id = websocket.increment_counter_and_get_id()
+            await websocket.send_data(SignatureUnsubscribe(subscription, request_id))
+        except Exception as e:
+            logging.error(f"Error unsubscribing from signature subscription {subscription}: {str(e)}")
+
+    async def _subscribe(self, pending: _Pending) -> None:
+        websocket = self._websocket
+        try:
+            request_id = websocket.increment_counter_and_get_id()
+            self._requests[request_id] = pending.key
+            config = RpcSignatureSubscribeConfig(commitment=COMMITMENT_LEVELS[pending.commitment])
+            await websocket.send_data(SignatureSubscribe(pending.signature, config, request_id))
+        except Exception as e:
+            # the poll still covers this signature
+            logging.error(f"Error subscribing to signature {pending.signature}: {str(e)}")
+
+    def _on_status(self, pending: _Pending, future: asyncio.Future) -> None:
+        if not future.cancelled():
+            self._resolve(pending, future.result().err, "poll")
+
+    def _handle(self, message) -> None:
+        if isinstance(message, SubscriptionResult):
+            key = self._requests.pop(message.id, None)
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.subscription = message.result
+                self._subscriptions[message.result] = key
+            elif key is not None:
+                # every waiter left before the node answered
+                self._unsubscribe(message.result)
+        elif isinstance(message, SignatureNotification):
+            # signature subscriptions are removed by the node after one notification
+            key = self._subscriptions.pop(message.subscription, None)
+            pending = self._pending.get(key)
+            if pending is not None:
+                self._resolve(pending, message.result.value.err, "websocket")
+
+    async def _run(self) -> None:
+        async for websocket in connect(self.wss):
+            try:
+                self._requests.clear()
+                self._subscriptions.clear()
+                self._websocket = websocket
+                # signatures sent while we were disconnected
+                for pending in list(self._pending.values()):
+                    pending.subscription = None
+                    await self._subscribe(pending)
+
+                while True:
+                    try:
+                        messages = await websocket.recv()
+                    except SubscriptionError as err:
+                        logging.error(f"Signature subscription rejected: {str(err)}")
+                        continue
+                    except SerdeJSONError:
+                        # solders can not parse the `true` acknowledging an unsubscribe
+                        continue
+                    for message in messages:
+                        self._handle(message)
+
+            except (ProtocolError, ConnectionClosedError) as err:
+                logging.error(f"Confirmation websocket closed: {str(err)}")
+            except asyncio.CancelledError:
+                self._websocket = None
+                raise
+            except Exception as err:
+                logging.error(f"Confirmation websocket error: {str(err)}")
+            self._websocket = None
+            await asyncio.sleep(RECONNECT_DELAY)
@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from solana.exceptions import SolanaRpcException
+from solana.rpc.commitment import Commitment, Confirmed, Finalized, Processed
+from solana.rpc.websocket_api import connect
+from websockets.exceptions import ConnectionClosedError, ProtocolError
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.config import RpcTransactionLogsFilterMentions  # type: ignore
+from solders.signature import Signature  # type: ignore
+
+from termcolor import cprint
+
+from app.confirmation import ConfirmationEngine
+from app.find_new_token import (
+    WSS,
+    RaydiumLPV4,
+    get_tokens,
+    get_tokens_from_logs,
+    log_instruction,
+    process_logs,
+    subscribe_to_logs
+)
+from app.frame_filter import FrameFilter
+from app.history import PoolHistory
+from app.pool_cache import PoolKeysCache
+from app.scheduler import rate_limited
+from app.signature_status import COMMITMENT_RANK
+from app.swap_templates import SwapTemplates
+
+# Events kept per subscriber before the oldest ones are dropped.
+# A pool that waited this long in the queue is not worth sniping anyway.
+DISCOVERY_QUEUE_SIZE = 100
+RECONNECT_DELAY = 2
+# Pools resolved concurrently. Each one costs a getMultipleAccounts and,
+# when the logs are not enough, a getTransaction against the public endpoint.
+DISCOVERY_FETCH_WORKERS = int(os.getenv("DISCOVERY_FETCH_WORKERS", "4"))
+DISCOVERY_FETCH_QUEUE_SIZE = 64
+DISCOVERY_FETCH_RETRIES = 3
+# Doubled after every failed attempt: 0.5s, 1s, 2s
+DISCOVERY_FETCH_BACKOFF = 0.5
+# Pools are detected at DISCOVERY_COMMITMENT and only bought once the pool
+# creation reaches POOL_CONFIRM_COMMITMENT. Both take processed, confirmed or finalized.
+DISCOVERY_COMMITMENT = Commitment(os.getenv("DISCOVERY_COMMITMENT", "processed"))
+POOL_CONFIRM_COMMITMENT = Commitment(os.getenv("POOL_CONFIRM_COMMITMENT", "confirmed"))
+# A processed pool creation that is not confirmed by then was dropped with its fork
+POOL_CONFIRM_TIMEOUT = 30
+
+
+class NewPoolEvent(NamedTuple):
+    base: str
+    mint: str
+    pair_address: Pubkey
+    signature: Signature
+    detected_at: float
+    commitment: Commitment = Finalized
+
+
+class PoolDiscoveryService:
+    """
+    Long-lived discovery of new Raydium pools.
+
+    Owns a single `logsSubscribe` websocket subscription to the Raydium
+    program and publishes every detected pool as a `NewPoolEvent` to all
+    subscriber queues, so consumers never reconnect between pools.
+
+    Matching signatures are resolved by a pool of fetch workers, so a slow
+    or rate limited request never stalls the websocket reader. Events are
+    still published in the order the signatures were received.
+
+    Pools are published as soon as they are seen at `commitment`, so
+    consumers can resolve keys, build templates and run their filters
+    while the creation confirms. `confirm` gates the buy on
+    `confirm_commitment`; pools that never get there are rolled back.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            program: Pubkey | str = RaydiumLPV4,
+            wss: str = WSS,
+            commitment: Commitment = DISCOVERY_COMMITMENT,
+            confirm_commitment: Commitment = POOL_CONFIRM_COMMITMENT,
+            queue_size: int = DISCOVERY_QUEUE_SIZE,
+            fetch_workers: int = DISCOVERY_FETCH_WORKERS,
+            fetch_queue_size: int = DISCOVERY_FETCH_QUEUE_SIZE,
+            fetch_retries: int = DISCOVERY_FETCH_RETRIES,
+            fetch_backoff: float = DISCOVERY_FETCH_BACKOFF
+    ):
+        self.program = Pubkey.from_string(program) if isinstance(program, str) else program
+        self.wss = wss
+        self.commitment = commitment
+        self.confirm_commitment = confirm_commitment
+        self.queue_size = queue_size
+        self.fetch_workers = fetch_workers
+        self.fetch_queue_size = fetch_queue_size
+        self.fetch_retries = fetch_retries
+        self.fetch_backoff = fetch_backoff
+
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._dropped: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._fetch_queue: Optional[asyncio.Queue] = None
+        self._order_queue: Optional[asyncio.Queue] = None
+        self._in_flight = 0
+        self.frame_filter = FrameFilter(log_instruction)
+        self._confirmations: OrderedDict[str, asyncio.Task] = OrderedDict()
+        # evicted confirmations keep running for the consumers awaiting them
+        self._untracked = set()
+        self._measurements = set()
+
+        self.connected = False
+        self.published = 0
+        self.reconnects = 0
+        self.from_logs = 0
+        self.from_transactions = 0
+        self.fetched = 0
+        self.fetch_errors = 0
+        self.fetch_retried = 0
+        self.fetch_latency: Optional[float] = None
+        self._fetch_latency_total = 0.0
+        self.speculative = 0
+        self.pools_confirmed = 0
+        self.rolled_back = 0
+        self._saved = {Confirmed: [0.0, 0], Finalized: [0.0, 0]}
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PoolDiscoveryService()
+        return cls._instance
+
+    def subscribe(self, name: str, maxsize: Optional[int] = None) -> asyncio.Queue:
+        """
+        Registers a consumer and returns its event queue.
+
+        Args:
+            name: Consumer name, used as key in stats.
+            maxsize: Queue size, defaults to the service queue size.
+
+        Returns:
+            asyncio.Queue receiving NewPoolEvent objects.
+        """
+        if name not in self._queues:
+            self._queues[name] = asyncio.Queue(maxsize or self.queue_size)
+            self._dropped[name] = 0
+        return self._queues[name]
+
+    def unsubscribe(self, name: str) -> None:
+        self._queues.pop(name, None)
+        self._dropped.pop(name, None)
+
+    def start(self) -> asyncio.Task:
+        """Starts the discovery task if it is not running yet."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self.connected = False
+        for task in [*self._confirmations.values(), *self._untracked, *self._measurements]:
+            task.cancel()
+        self._confirmations.clear()
+
+    def is_speculative(self, event: NewPoolEvent) -> bool:
+        return COMMITMENT_RANK[event.commitment] < COMMITMENT_RANK[self.confirm_commitment]
+
+    async def confirm(self, event: NewPoolEvent) -> bool:
+        """
+        Waits until the pool creation reaches `confirm_commitment`.
+
+        Returns:
+            True once the pool can be bought, False if the creation failed or
+            never confirmed; its cached keys and template are discarded then.
+        """
+        if not self.is_speculative(event):
+            return True
+        task = self._confirmations.get(str(event.signature))
+        if task is None:
+            task = self._track_confirmation(event)
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "published": self.published,
+            "reconnects": self.reconnects,
+            **self.frame_filter.stats(),
+            "from_logs": self.from_logs,
+            "from_transactions": self.from_transactions,
+            "fetch_queue": self._fetch_queue.qsize() if self._fetch_queue else 0,
+            "fetch_in_flight": self._in_flight,
+            "reorder_queue": self._order_queue.qsize() if self._order_queue else 0,
+            "fetch_errors": self.fetch_errors,
+            "fetch_retries": self.fetch_retried,
+            "fetch_latency": self.fetch_latency,
+            "fetch_latency_avg": self._fetch_latency_total / self.fetched if self.fetched else None,
+            "commitment": self.commitment,
+            "confirm_commitment": self.confirm_commitment,
+            "speculative": self.speculative,
+            "pools_confirmed": self.pools_confirmed,
+            "rolled_back": self.rolled_back,
+            # how much earlier pools were published than at these commitments
+            "saved_vs_confirmed_avg": self._saved_avg(Confirmed),
+            "saved_vs_finalized_avg": self._saved_avg(Finalized),
+            "backlog": {name: queue.qsize() for name, queue in self._queues.items()},
+            "dropped": dict(self._dropped),
+        }
+
+    def _saved_avg(self, commitment: Commitment) -> Optional[float]:
+        total, count = self._saved[commitment]
+        return total / count if count else None
+
+    def _track_confirmation(self, event: NewPoolEvent) -> asyncio.Task:
+        task = asyncio.create_task(self._confirm(event))
+        self._confirmations[str(event.signature)] = task
+        while len(self._confirmations) > self.queue_size:
+            # a consumer may still be waiting in `confirm`, the task ends by its own timeout
+            _, oldest = self._confirmations.popitem(last=False)
+            if not oldest.done():
+                self._untracked.add(oldest)
+                oldest.add_done_callback(self._untracked.discard)
+        return task
+
+    async def _confirm(self, event: NewPoolEvent) -> bool:
+        engine = ConfirmationEngine.get_instance()
+        confirmed = await engine.wait(event.signature, self.confirm_commitment, POOL_CONFIRM_TIMEOUT)
+        if not confirmed:
+            self._rollback(event)
+            return False
+        self.pools_confirmed += 1
+        self._record_saved(self.confirm_commitment, event)
+
+        if self.confirm_commitment != Finalized:
+            # only measured, the buy is not waiting for it
+            measurement = asyncio.create_task(self._measure_finalized(event))
+            self._measurements.add(measurement)
+            measurement.add_done_callback(self._measurements.discard)
+        return True
+
+    async def _measure_finalized(self, event: NewPoolEvent) -> None:
+        engine = ConfirmationEngine.get_instance()
+        if await engine.wait(event.signature, Finalized, POOL_CONFIRM_TIMEOUT):
+            self._record_saved(Finalized, event)
+
+    def _record_saved(self, commitment: Commitment, event: NewPoolEvent) -> None:
+        saved = time.time() - event.detected_at
+        self._saved[commitment][0] += saved
+        self._saved[commitment][1] += 1
+        logging.info(f"Pool {event.pair_address} reached {commitment} {saved:.2f}s after detection")
+
+    def _rollback(self, event: NewPoolEvent) -> None:
+        self.rolled_back += 1
+        PoolKeysCache.get_instance().invalidate(event.pair_address)
+        SwapTemplates.get_instance().discard(event.pair_address)
+        logging.warning(f"Pool {event.pair_address} did not reach {self.confirm_commitment}, rolled back")
+
+    def _publish(self, event: NewPoolEvent) -> None:
+        self.published += 1
+        PoolHistory.get_instance().record_pool(
+            event.pair_address, event.mint, event.base, event.signature, event.commitment, event.detected_at
+        )
+        if self.is_speculative(event):
+            self.speculative += 1
+            # confirms while the consumers do their cheap steps
+            self._track_confirmation(event)
+        for name, queue in self._queues.items():
+            if queue.full():
+                # drop the oldest event, fresh pools are more valuable
+                queue.get_nowait()
+                self._dropped[name] += 1
+                logging.warning(f"Discovery consumer '{name}' is behind, dropped {self._dropped[name]} events")
+            queue.put_nowait(event)
+
+    async def _resolve(self, signature: Signature, logs: List[str]) -> Optional[Tuple[str, str, Pubkey]]:
+        for attempt in range(self.fetch_retries + 1):
+            try:
+                data = await get_tokens_from_logs(signature, logs, self.program, self.commitment)
+                if data:
+                    self.from_logs += 1
+                    return data
+                # getTransaction does not serve processed transactions
+                data = await get_tokens(signature, self.program, Confirmed if self.commitment == Processed else self.commitment)
+                self.from_transactions += 1
+                return data
+            except (AttributeError, SolanaRpcException) as err:
+                # Omitting httpx.HTTPStatusError: Client error '429 Too Many Requests'
+                # and transactions the endpoint does not return yet
+                if attempt == self.fetch_retries:
+                    self.fetch_errors += 1
+                    logging.error(f"Giving up on {signature}: {str(err)}")
+                    return None
+                self.fetch_retried += 1
+                if rate_limited(err) is not None:
+                    # the scheduler holds the retry until the endpoint's backoff is over
+                    logging.info(f"{str(err)}\nretrying {signature} after the rate limit backoff")
+                    continue
+                delay = self.fetch_backoff * 2 ** attempt
+                logging.info(f"{str(err)}\nretrying {signature} in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _fetch_worker(self) -> None:
+        while True:
+            signature, logs, future, received_at = await self._fetch_queue.get()
+            self._in_flight += 1
+            try:
+                data = await self._resolve(signature, logs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as err:
+                self.fetch_errors += 1
+                logging.error(f"Error resolving pool of {signature}: {str(err)}")
+                data = None
+            finally:
+                self._in_flight -= 1
+
+            latency = time.monotonic() - received_at
+            self.fetched += 1
+            self.fetch_latency = latency
+            self._fetch_latency_total += latency
+            if not future.done():
+                future.set_result(data)
+
+    async def _publish_in_order(self) -> None:
+        while True:
+            signature, future, received_at = await self._order_queue.get()
+            try:
+                data = await future
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                continue
+            if data:
+                base, mint, pair_address = data
+                self._publish(NewPoolEvent(base, mint, pair_address, signature, received_at, self.commitment))
+
+    async def _read(self, websocket) -> None:
+        loop = asyncio.get_running_loop()
+        async for signature, logs in process_logs(websocket, log_instruction, self.frame_filter):
+            # detection time includes resolving the pool
+            received_at = time.time()
+            future = loop.create_future()
+            # blocks the reader only when every worker is behind by a full queue
+            await self._fetch_queue.put((signature, logs, future, time.monotonic()))
+            self._order_queue.put_nowait((signature, future, received_at))
+
+    async def _run(self) -> None:
+        self._fetch_queue = asyncio.Queue(self.fetch_queue_size)
+        self._order_queue = asyncio.Queue()
+        stage = [asyncio.create_task(self._fetch_worker()) for _ in range(self.fetch_workers)]
+        stage.append(asyncio.create_task(self._publish_in_order()))
+        try:
+            async for websocket in connect(self.wss):
+                try:
+                    await subscribe_to_logs(
+                        websocket,
+                        RpcTransactionLogsFilterMentions(self.program),
+                        self.commitment
+                    )
+                    self.connected = True
+                    logging.info("Discovery subscription established")
+                    await self._read(websocket)
+
+                except (ProtocolError, ConnectionClosedError) as err:
+                    # Restart socket connection if ProtocolError: invalid status code
+                    logging.error(f"Discovery websocket closed: {str(err)}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    logging.error(f"Discovery error: {str(err)}")
+                    cprint(f"Discovery error: {err}", "red", attrs=["reverse"])
+                self.connected = False
+                self.reconnects += 1
+                await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            for task in stage:
+                task.cancel()
+            await asyncio.gather(*stage, return_exceptions=True)
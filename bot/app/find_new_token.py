@@ -1,18 +1,14 @@
-import os
-import pandas as pd
-from time import sleep
 import logging
 import asyncio
-from typing import AsyncIterator, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 from asyncstdlib import enumerate
 from pip._vendor.typing_extensions import Iterator
 
 from solana.rpc.websocket_api import connect
 from solana.rpc.commitment import Finalized, Commitment
-from solana.rpc.api import Client
 from solana.exceptions import SolanaRpcException
 from solana.rpc.websocket_api import SolanaWsClientProtocol
-from websockets.exceptions import ConnectionClosedError, ProtocolError
+from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK, ProtocolError
 
 from solders.pubkey import Pubkey  # type: ignore
 from solders.rpc.config import RpcTransactionLogsFilterMentions  # type: ignore
@@ -21,12 +17,18 @@ from solders.transaction_status import UiPartiallyDecodedInstruction, ParsedInst
 
 from termcolor import colored, cprint
 
+from app.frame_filter import FrameFilter, recv_frame
+from app.journal import Journal
+from app.pool_cache import PoolKeysCache
+from app.ray_log import find_init_log, get_amm_id
+from app.rpc import get_async_client
+from app.utils import decode_pool_keys
+
 
 # Raydium Liquidity Pool V4
 RaydiumLPV4 = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
 URI = "https://api.mainnet-beta.solana.com"  #"https://api.devnet.solana.com" # | "https://api.mainnet-beta.solana.com"
 WSS = "wss://api.mainnet-beta.solana.com"  #"wss://api.devnet.solana.com"  # | "wss://api.mainnet-beta.solana.com"
-solana_client = Client(URI)
 log_instruction = "init_pc_amount"
 # log_instruction = "initialize2"
 
@@ -57,26 +59,45 @@ async def subscribe_to_logs(
     first_resp = await websocket.recv()
     return first_resp[0].result
 
-async def process_messages(
+async def process_logs(
         websocket: SolanaWsClientProtocol,
-        instruction: str
-) -> AsyncIterator[Signature]:
+        instruction: str,
+        frame_filter: Optional[FrameFilter] = None
+) -> AsyncIterator[Tuple[Signature, List[str]]]:
     """
     Processes incoming transaction logs from a websocket connection,
     filtering by the given instruction.
 
+    Raw frames are checked for the instruction before they are parsed,
+    so swaps are dropped without decoding them.
+
     Args:
         websocket: An instance of SolanaWsClientProtocol to interact with websocket.
         instruction: The instruction string to filter logs by.
+        frame_filter: Filter counting the frames, created when not given.
 
     Yields:
-        Signatures of transaction logs containing the given instruction.
+        (signature, logs) of transactions containing the given instruction.
     """
-    async for idx, msg in enumerate(websocket):
-        value = msg[0].result.value
+    frame_filter = frame_filter or FrameFilter(instruction)
+    idx = 0
+    while True:
+        try:
+            frame = await recv_frame(websocket)
+        except ConnectionClosedOK:
+            return
 
         if not idx % 20000:
-            cprint(f"Received {idx} messages", "light_cyan")
+            cprint(f"Received {idx} messages, parsed {frame_filter.parsed}", "light_cyan")
+        idx += 1
+
+        if not frame_filter.match(frame):
+            continue
+        msg = frame_filter.parse(frame)
+        value = msg[0].result.value
+        if value.err is not None:
+            # failed pool creations are notified too
+            continue
 
         for log in value.logs:
             if instruction not in log:
@@ -85,12 +106,23 @@ async def process_messages(
             logging.info(f"Signature: \n{value.signature}")
             logging.info(f"Log: \n{log}")
 
-            # Logging to messages.json
-            with open("messages.json", 'a', encoding='utf-8') as raw_messages:
-                raw_messages.write(f"'signature': {value.signature}, \n")
-                raw_messages.write(msg[0].to_json())
-                raw_messages.write("\n \n")
-            yield value.signature
+            Journal.get_instance().write("log", {
+                "signature": str(value.signature),
+                "slot": msg[0].result.context.slot,
+                "logs": value.logs,
+            })
+            yield value.signature, value.logs
+            break
+
+async def process_messages(
+        websocket: SolanaWsClientProtocol,
+        instruction: str
+) -> AsyncIterator[Signature]:
+    """
+    Same as `process_logs`, yielding only the signatures.
+    """
+    async for signature, _ in process_logs(websocket, instruction):
+        yield signature
 
 def get_tokens_info(
         instruction: UiPartiallyDecodedInstruction | ParsedInstruction
@@ -113,27 +145,70 @@ def get_tokens_info(
     logging.info(f"\n Token0: {token0}, \n Token1: {token1}, \n Pair: {pair}")
     return token0, token1, pair
 
-def save_to_csv(data, filename="pool_data.csv"):
-    df = pd.DataFrame(data)
-    if not os.path.isfile(filename):
-        df.to_csv(filename, index=False)
-    else:
-        df.to_csv(filename, mode='a', header=False, index=False)
+def report_new_pool(signature: Signature, tokens: Tuple[Pubkey, Pubkey, Pubkey]) -> Tuple[str, str, Pubkey]:
+    """
+    Prints and saves a detected pool.
+
+    Args:
+        signature: Signature of the pool creation transaction
+        tokens: (token0, token1, pair) as returned by `get_tokens_info`
 
-async def get_tokens(signature: Signature, RaydiumLPV4: Pubkey) -> None:
+    Returns:
+        Tuple[str, str, Pubkey]: (base, mint, pair)
+    """
+    print()
+    cprint("=============================================================", "white", "on_magenta", attrs=['bold'])
+    cprint("===================== NEW POOL DETECTED =====================", "white", "on_magenta", attrs=['bold'])
+    cprint("=============================================================", "white", "on_magenta", attrs=['bold'])
+    print()
+    # cprint(f"Link to raydium pool: https://api.raydium.io/v2/ammV3/ammPool/{tokens[2]}", "blue", attrs=["bold"])
+    # cprint(f"Link to DEXScreener: https://dexscreener.com/solana/{tokens[2]}", "red", "on_yellow")
+    # cprint(f"Link to Solscan: https://solscan.io/tx/{signature}", "red", "on_white", attrs=['bold'])
+    
+
+    mint = tokens[0] if "111111111111111111111111111111111111" in str(tokens[1]) else tokens[1]
+    base = tokens[1] if "111111111111111111111111111111111111" in str(tokens[1]) else tokens[0]
+    cprint(f"Link to RugCheck: https://api.rugcheck.xyz/v1/tokens/{mint}/report", "green")
+
+
+    Journal.get_instance().write("pool", {
+        'Token0': str(tokens[0]),
+        'Token1': str(tokens[1]),
+        'LP Pair': str(tokens[2]),
+        'Signature': str(signature),
+        'Solscan': f"https://solscan.io/tx/{signature}",
+        'DEXScreener': f"https://dexscreener.com/solana/{tokens[2]}",
+        'RugCheck': f"https://api.rugcheck.xyz/v1/tokens/{mint}/report"
+    })
+
+    logging.info("\n======= find new LP !!! =======\n")
+    logging.info(f"""
+    Token_base: {base}
+    Token_mint: {mint}, \n Pair: {tokens[2]}
+    Link to raydium pool: https://api.raydium.io/v2/ammV3/ammPool/{tokens[2]}
+    Link to DEXScreener: https://dexscreener.com/solana/{tokens[2]}?maker=4NZNfmNPfejj2YvAqSzbKTukDbz5FTiwBAdifAAGVrMc
+    Link to Solscan: https://solscan.io/tx/{signature}
+    Link to RugCheck: https://api.rugcheck.xyz/v1/tokens/{mint}/report
+    """)
+
+    return str(base), str(mint), tokens[2]
+
+async def get_tokens(signature: Signature, RaydiumLPV4: Pubkey, commitment: Optional[Commitment] = None) -> None:
     """
     Get token0, token1, and pair Pubkey from given signature
 
     Args:
         signature: Signature of the transaction
         RaydiumLPV4: Pubkey of RaydiumLPV4 program
+        commitment: Commitment of the transaction read, confirmed or finalized.
 
     Returns:
         None
     """
-    transaction = solana_client.get_transaction(
+    transaction = await get_async_client().get_transaction(
         signature,
         encoding="jsonParsed",
+        commitment=commitment,
         max_supported_transaction_version=0
     )
     # with open("transactions.json", 'a', encoding='utf-8') as raw_transactions:
@@ -149,61 +224,60 @@ async def get_tokens(signature: Signature, RaydiumLPV4: Pubkey) -> None:
     )
     logging.info(f"Print filtered instructions RAW:\n{filtered_instructions}")
 
-    pool_data = []
     for instruction in filtered_instructions:
         tokens = get_tokens_info(instruction)
 
-        # выводим в консоль данные токенов
-        data = [
-            {'Token_Index': 'Token0', 'Account Public Key': tokens[0]},  # Token0
-            {'Token_Index': 'Token1', 'Account Public Key': tokens[1]},  # Token1
-            {'Token_Index': 'LP Pair', 'Account Public Key': tokens[2]}  # LP Pair
-        ]
-
-        print()
-        cprint("=============================================================", "white", "on_magenta", attrs=['bold'])
-        cprint("===================== NEW POOL DETECTED =====================", "white", "on_magenta", attrs=['bold'])
-        cprint("=============================================================", "white", "on_magenta", attrs=['bold'])
-        print()
-        # header = ["Token_Index", "Account Public Key"]
-        # print()
-        # cprint("│".join(f" {col.ljust(15)} " for col in header), "green", attrs=["bold"])
-        # for row in data:
-        #     cprint("│".join(f" {str(row[col]).ljust(15)} " for col in header), "green", attrs=["bold"])
-        # print()
-        # cprint(f"Link to raydium pool: https://api.raydium.io/v2/ammV3/ammPool/{tokens[2]}", "blue", attrs=["bold"])
-        # cprint(f"Link to DEXScreener: https://dexscreener.com/solana/{tokens[2]}", "red", "on_yellow")
-        # cprint(f"Link to Solscan: https://solscan.io/tx/{signature}", "red", "on_white", attrs=['bold'])
-        
-
-        mint = tokens[0] if "111111111111111111111111111111111111" in str(tokens[1]) else tokens[1]
-        base = tokens[1] if "111111111111111111111111111111111111" in str(tokens[1]) else tokens[0]
-        cprint(f"Link to RugCheck: https://api.rugcheck.xyz/v1/tokens/{mint}/report", "green")
-
-
-        pool_data.append ({
-            'Token0': tokens[0],
-            'Token1': tokens[1],
-            'LP Pair': tokens[2], 
-            'Signature': signature,
-            'Solscan': f"https://solscan.io/tx/{signature}",
-            'DEXScreener': f"https://dexscreener.com/solana/{tokens[2]}",
-            'RugCheck': f"https://api.rugcheck.xyz/v1/tokens/{mint}/report"
-        })
-        # Save data to CSV after each transaction
-        save_to_csv(pool_data)
-
-        logging.info("\n======= find new LP !!! =======\n")
-        logging.info(f"""
-        Token_base: {base}
-        Token_mint: {mint}, \n Pair: {tokens[2]}
-        Link to raydium pool: https://api.raydium.io/v2/ammV3/ammPool/{tokens[2]}
-        Link to DEXScreener: https://dexscreener.com/solana/{tokens[2]}?maker=4NZNfmNPfejj2YvAqSzbKTukDbz5FTiwBAdifAAGVrMc
-        Link to Solscan: https://solscan.io/tx/{signature}
-        Link to RugCheck: https://api.rugcheck.xyz/v1/tokens/{mint}/report
-        """)
-
-        return str(base), str(mint), tokens[2]
+        return report_new_pool(signature, tokens)
+
+async def get_tokens_from_logs(
+        signature: Signature,
+        logs: List[str],
+        RaydiumLPV4: Pubkey,
+        commitment: Optional[Commitment] = None
+) -> Optional[Tuple[str, str, Pubkey]]:
+    """
+    Get base, mint and pair from the `ray_log` of the initialize2 instruction,
+    without fetching the transaction.
+
+    The AMM id is derived from the market in the log, then the AMM and market
+    accounts are read in one request and decoded into pool keys, which are
+    cached for the buy.
+
+    Args:
+        signature: Signature of the transaction
+        logs: Log lines of the transaction
+        RaydiumLPV4: Pubkey of RaydiumLPV4 program
+        commitment: Commitment of the account read, the one the logs were received at.
+
+    Returns:
+        (base, mint, pair), None if the logs have no init log or the
+        accounts do not match it.
+    """
+    init_log = find_init_log(logs)
+    if init_log is None:
+        return None
+    amm_id = get_amm_id(init_log.market, RaydiumLPV4)
+    response = await get_async_client().get_multiple_accounts(
+        [amm_id, init_log.market],
+        commitment,
+        encoding="base64"
+    )
+    amm_account, market_account = response.value
+    if amm_account is None or market_account is None:
+        logging.info(f"Pool accounts of {signature} are not visible, falling back to the transaction")
+        return None
+
+    try:
+        pool_keys = decode_pool_keys(amm_id, amm_account.data, market_account.data)
+    except Exception as e:
+        # not a v4 AMM or market account
+        logging.info(f"Pool accounts of {signature} do not decode, falling back to the transaction: {str(e)}")
+        return None
+    if pool_keys["market_id"] != init_log.market:
+        # pool created with a non-PDA AMM account
+        return None
+    PoolKeysCache.get_instance().put(amm_id, pool_keys)
+    return report_new_pool(signature, (pool_keys["base_mint"], pool_keys["quote_mint"], amm_id))
 
 async def find_new_tokens(RaydiumLPV4: Pubkey = RaydiumLPV4):
     """
@@ -223,18 +297,21 @@ async def find_new_tokens(RaydiumLPV4: Pubkey = RaydiumLPV4):
             # меняем уровень логирования
             logging.getLogger().setLevel(logging.INFO) 
             
-            async for i, signature in enumerate(process_messages(websocket, log_instruction)):
+            async for i, (signature, logs) in enumerate(process_logs(websocket, log_instruction)):
                 logging.info(f"{i}")
 
                 try:
-                    token0, token1, pool = await get_tokens(signature, RaydiumLPV4)
+                    token0, token1, pool = (
+                        await get_tokens_from_logs(signature, logs, RaydiumLPV4)
+                        or await get_tokens(signature, RaydiumLPV4)
+                    )
                     return token0, token1, pool
                 except (AttributeError, SolanaRpcException) as err:
-                     # Omitting httpx.HTTPStatusError: Client error '429 Too Many Requests'
+                    # 429 Too Many Requests backs the endpoint off in the RequestScheduler,
+                    # no need to stall the stream here
                     # logging.exception(err)
-                    logging.info(f"{str(err)}\nsleep for 5 seconds and try again")
-                    cprint(f"{err}\nSleep for 5 seconds and try again", "red", attrs=["reverse", "blink"])
-                    sleep(4)
+                    logging.info(f"{str(err)}\ntrying the next pool")
+                    cprint(f"{err}\nTrying the next pool", "red", attrs=["reverse", "blink"])
                     continue
 
         except (ProtocolError, ConnectionClosedError) as err:
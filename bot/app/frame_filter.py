@@ -0,0 +1,149 @@
+"""
+Prefilter of raw `logsSubscribe` frames.
+
+Almost every notification from the Raydium v4 program is a swap. Parsing
+each one into solders objects just to scan its logs for `init_pc_amount`
+costs more than everything else discovery does, so frames are read from
+the websocket without parsing and only those containing the instruction
+marker are decoded. The marker only appears inside the log lines, so a
+frame without it can never match.
+"""
+from typing import List, Union
+
+from solana.rpc.websocket_api import SolanaWsClientProtocol
+from solders.rpc.responses import parse_websocket_message  # type: ignore
+
+Frame = Union[str, bytes]
+
+
+async def recv_frame(websocket: SolanaWsClientProtocol) -> Frame:
+    """Next raw frame, skipping the RPC parsing of `SolanaWsClientProtocol.recv`."""
+    return await super(SolanaWsClientProtocol, websocket).recv()
+
+
+class FrameFilter:
+    def __init__(self, instruction: str):
+        self.instruction = instruction
+        self._marker = instruction.encode()
+
+        self.received = 0
+        self.parsed = 0
+
+    def match(self, frame: Frame) -> bool:
+        self.received += 1
+        return (self._marker if isinstance(frame, bytes) else self.instruction) in frame
+
+    def parse(self, frame: Frame) -> List:
+        self.parsed += 1
+        return parse_websocket_message(frame if isinstance(frame, str) else frame.decode())
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.received,
+            "frames_parsed": self.parsed,
+        }
+
+
+if __name__ == "__main__":
+    # Replays frames through the old and the prefiltered path:
+    #   python -m app.frame_filter [frames.jsonl]
+    #   python -m app.frame_filter --record frames.jsonl 20000
+    import asyncio
+    import base64
+    import json
+    import os
+    import random
+    import sys
+    import time
+
+    from solana.rpc.commitment import Processed
+    from solana.rpc.websocket_api import connect
+    from solders.pubkey import Pubkey  # type: ignore
+    from solders.rpc.config import RpcTransactionLogsFilterMentions  # type: ignore
+    from solders.signature import Signature  # type: ignore
+
+    from app.find_new_token import RaydiumLPV4, WSS, log_instruction, subscribe_to_logs
+
+    async def record(path: str, count: int) -> None:
+        async with connect(WSS) as websocket:
+            await subscribe_to_logs(websocket, RpcTransactionLogsFilterMentions(Pubkey.from_string(RaydiumLPV4)), Processed)
+            with open(path, "w", encoding="utf-8") as frames_file:
+                for _ in range(count):
+                    frames_file.write(await recv_frame(websocket) + "\n")
+
+    def synthetic_frames(count: int, init_every: int = 5000) -> List[str]:
+        rng = random.Random(1)
+        frames = []
+        for idx in range(count):
+            logs = [
+                "Program ComputeBudget111111111111111111111111111111 invoke [1]",
+                "Program ComputeBudget111111111111111111111111111111 success",
+                f"Program {RaydiumLPV4} invoke [1]",
+                f"Program log: ray_log: {base64.b64encode(os.urandom(57)).decode()}",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA invoke [2]",
+                "Program log: Instruction: Transfer",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA consumed 4736 of 28227 compute units",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA success",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA invoke [2]",
+                "Program log: Instruction: Transfer",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA consumed 4645 of 20510 compute units",
+                "Program TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA success",
+                f"Program {RaydiumLPV4} consumed 31610 of 44020 compute units",
+                f"Program {RaydiumLPV4} success",
+            ]
+            if idx % init_every == init_every - 1:
+                logs[3:3] = [
+                    "Program log: initialize2: InitializeInstruction2 { nonce: 254, open_time: 0, "
+                    "init_pc_amount: 1000000000, init_coin_amount: 1000000000000000 }"
+                ]
+            signature = str(Signature.from_bytes(rng.randbytes(64)))
+            frames.append(json.dumps({
+                "jsonrpc": "2.0",
+                "method": "logsNotification",
+                "params": {
+                    "result": {
+                        "context": {"slot": 280_000_000 + idx},
+                        "value": {"signature": signature, "err": None, "logs": logs},
+                    },
+                    "subscription": 1,
+                },
+            }))
+        return frames
+
+    def parse_all(frames: List[str]) -> int:
+        matched = 0
+        for frame in frames:
+            value = parse_websocket_message(frame)[0].result.value
+            matched += any(log_instruction in log for log in value.logs)
+        return matched
+
+    def prefilter_all(frames: List[str]) -> int:
+        frame_filter = FrameFilter(log_instruction)
+        matched = 0
+        for frame in frames:
+            if not frame_filter.match(frame):
+                continue
+            value = frame_filter.parse(frame)[0].result.value
+            matched += any(log_instruction in log for log in value.logs)
+        return matched
+
+    if sys.argv[1:2] == ["--record"]:
+        asyncio.run(record(sys.argv[2], int(sys.argv[3])))
+        sys.exit()
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as frames_file:
+            frames = [line.rstrip("\n") for line in frames_file if line.strip()]
+        # skip the subscription confirmation
+        frames = [frame for frame in frames if "logsNotification" in frame]
+    else:
+        frames = synthetic_frames(50_000)
+
+    results = {}
+    for label, replay in (("parse every frame", parse_all), ("prefilter", prefilter_all)):
+        started = time.perf_counter()
+        matched = replay(frames)
+        elapsed = time.perf_counter() - started
+        results[label] = matched
+        print(f"{label:>18}: {len(frames) / elapsed:12,.0f} msgs/s/core | {matched} pools in {len(frames)} frames")
+    assert len(set(results.values())) == 1
@@ -0,0 +1,262 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from app.batch_writer import BatchWriter
+
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+HISTORY_BATCH_SIZE = 256
+HISTORY_FLUSH_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pools (
+    amm_id TEXT PRIMARY KEY,
+    mint TEXT NOT NULL,
+    base TEXT NOT NULL,
+    signature TEXT,
+    commitment TEXT,
+    detected_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pools_mint ON pools (mint);
+CREATE INDEX IF NOT EXISTS pools_detected_at ON pools (detected_at);
+
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    amm_id TEXT NOT NULL,
+    mint TEXT,
+    symbol TEXT,
+    side TEXT NOT NULL,
+    sol_amount REAL,
+    token_amount REAL,
+    price REAL,
+    pnl REAL,
+    signature TEXT,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_amm_id ON trades (amm_id);
+CREATE INDEX IF NOT EXISTS trades_mint ON trades (mint);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+
+CREATE TABLE IF NOT EXISTS outcomes (
+    id INTEGER PRIMARY KEY,
+    amm_id TEXT NOT NULL,
+    mint TEXT,
+    symbol TEXT,
+    sol_in REAL,
+    start_price REAL,
+    pnl REAL,
+    max_pnl REAL,
+    reason TEXT,
+    opened_at REAL,
+    closed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outcomes_amm_id ON outcomes (amm_id);
+CREATE INDEX IF NOT EXISTS outcomes_mint ON outcomes (mint);
+CREATE INDEX IF NOT EXISTS outcomes_closed_at ON outcomes (closed_at);
+"""
+
+INSERT_POOL = "INSERT OR IGNORE INTO pools VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_TRADE = (
+    "INSERT INTO trades (amm_id, mint, symbol, side, sol_amount, token_amount, price, pnl, signature, ts) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_OUTCOME = (
+    "INSERT INTO outcomes (amm_id, mint, symbol, sol_in, start_price, pnl, max_pnl, reason, opened_at, closed_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class PoolHistory(BatchWriter):
+    """
+    Local SQLite store of discovered pools, trades and position outcomes.
+
+    Rows are inserted from a background thread in batched transactions, so
+    recording never blocks the event loop. The database runs in WAL mode:
+    queries open their own connection and read while the writer appends.
+    Pools, trades and outcomes are indexed by mint, pool and time.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            path: str = HISTORY_DB,
+            batch_size: int = HISTORY_BATCH_SIZE,
+            flush_interval: float = HISTORY_FLUSH_INTERVAL
+    ):
+        super().__init__("history", batch_size, flush_interval)
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+        with connect(path) as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+        self.start()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PoolHistory()
+        return cls._instance
+
+    def record_pool(self, amm_id, mint, base, signature=None, commitment=None, detected_at: float = None) -> None:
+        self.put((INSERT_POOL, (
+            str(amm_id), str(mint), str(base), str(signature) if signature else None,
+            commitment, detected_at or time.time()
+        )))
+
+    def record_trade(
+            self,
+            amm_id,
+            side: str,
+            mint=None,
+            symbol: str = None,
+            sol_amount: float = None,
+            token_amount: float = None,
+            price: float = None,
+            pnl: float = None,
+            signature=None
+    ) -> None:
+        """Records a confirmed swap, `side` is "buy" or "sell"."""
+        self.put((INSERT_TRADE, (
+            str(amm_id), str(mint) if mint else None, symbol, side, sol_amount, token_amount,
+            price, pnl, str(signature) if signature else None, time.time()
+        )))
+
+    def record_outcome(
+            self,
+            amm_id,
+            reason: str,
+            mint=None,
+            symbol: str = None,
+            sol_in: float = None,
+            start_price: float = None,
+            pnl: float = None,
+            max_pnl: float = None,
+            opened_at: float = None
+    ) -> None:
+        """Records how a position ended."""
+        self.put((INSERT_OUTCOME, (
+            str(amm_id), str(mint) if mint else None, symbol, sol_in, start_price,
+            pnl, max_pnl, reason, opened_at, time.time()
+        )))
+
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Runs a read query on its own connection, call it off the event loop."""
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def pool(self, mint_or_amm_id: str) -> Optional[tuple]:
+        rows = self.query(
+            "SELECT * FROM pools WHERE mint = ? OR amm_id = ? ORDER BY detected_at DESC LIMIT 1",
+            (mint_or_amm_id, mint_or_amm_id)
+        )
+        return rows[0] if rows else None
+
+    def summary(self, days: float = 7, limit: int = 10) -> str:
+        """Markdown report of the last `days`, for the /history command."""
+        since = time.time() - days * 24 * 60 * 60
+        (pools,), = self.query("SELECT COUNT(*) FROM pools WHERE detected_at >= ?", (since,))
+        (buys, sells), = self.query(
+            "SELECT COALESCE(SUM(side = 'buy'), 0), COALESCE(SUM(side = 'sell'), 0) FROM trades WHERE ts >= ?",
+            (since,)
+        )
+        (closed, wins, avg_pnl, best, worst), = self.query(
+            "SELECT COUNT(*), COALESCE(SUM(pnl > 0), 0), AVG(pnl), MAX(pnl), MIN(pnl) "
+            "FROM outcomes WHERE closed_at >= ?",
+            (since,)
+        )
+        lines = [
+            f"**History** last {days:g} days",
+            f"Pools detected: {pools}  |  Buys: {buys}  |  Sells: {sells}",
+        ]
+        if closed:
+            lines.append(
+                f"Closed: {closed}  |  Win rate: {wins / closed * 100:.0f}%  |  "
+                f"Avg PnL: {avg_pnl:.2f}%  |  Best: {best:.2f}%  |  Worst: {worst:.2f}%"
+            )
+        for symbol, pnl, reason, closed_at in self.recent_outcomes(since, limit):
+            pnl_text = f"{pnl:.2f}%" if pnl is not None else "n/a"
+            lines.append(f"**{symbol or '?'}**  {pnl_text}  {reason}  {time.strftime('%m-%d %H:%M', time.localtime(closed_at))}")
+        return "\n".join(lines)
+
+    def recent_outcomes(self, since: float, limit: int = 10) -> List[Tuple]:
+        return self.query(
+            "SELECT symbol, pnl, reason, closed_at FROM outcomes WHERE closed_at >= ? ORDER BY closed_at DESC LIMIT ?",
+            (since, limit)
+        )
+
+    def _open(self) -> None:
+        self._connection = connect(self.path)
+
+    def _release(self) -> None:
+        self._connection.close()
+
+    def _flush(self, batch: list) -> None:
+        try:
+            with self._connection:
+                for sql, params in batch:
+                    self._connection.execute(sql, params)
+            self.written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Error writing history: {str(e)}")
+
+
+if __name__ == "__main__":
+    # Offline analysis: python -m app.history [days] [--db path] [--bench pools]
+    import argparse
+    import random
+    import tempfile
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("days", nargs="?", type=float, default=30)
+    parser.add_argument("--db", default=HISTORY_DB)
+    parser.add_argument("--bench", type=int, default=0, help="query a synthetic history of this many pools")
+    args = parser.parse_args()
+
+    if args.bench:
+        args.db = os.path.join(tempfile.mkdtemp(), "history.db")
+        with connect(args.db) as connection:
+            connection.executescript(SCHEMA)
+            now = time.time()
+            rng = random.Random(1)
+            # six months of detections, a trade and an outcome for every 50th pool
+            pools = [
+                (f"amm{i}", f"mint{i}", "So11111111111111111111111111111111111111112", None, "processed",
+                 now - rng.random() * 180 * 24 * 60 * 60)
+                for i in range(args.bench)
+            ]
+            connection.executemany(INSERT_POOL, pools)
+            connection.executemany(INSERT_TRADE, [
+                (amm_id, mint, "SYM", "buy", 0.006, 1e6, 1e-8, None, None, detected_at + 5)
+                for amm_id, mint, _, _, _, detected_at in pools[::50]
+            ])
+            connection.executemany(INSERT_OUTCOME, [
+                (amm_id, mint, "SYM", 0.006, 1e-8, rng.uniform(-60, 300), None, "stop_loss", detected_at, detected_at + 600)
+                for amm_id, mint, _, _, _, detected_at in pools[::50]
+            ])
+        connection.close()
+
+    history = PoolHistory(args.db)
+    started = time.perf_counter()
+    report = history.summary(args.days)
+    summary_time = time.perf_counter() - started
+    started = time.perf_counter()
+    history.pool("mint1" if args.bench else "")
+    lookup_time = time.perf_counter() - started
+    history.close()
+
+    print(report)
+    print(f"\nsummary {summary_time * 1000:.1f} ms | mint lookup {lookup_time * 1000:.2f} ms")
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import time
+from typing import List
+
+from app.batch_writer import BatchWriter
+
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "journal.jsonl")
+JOURNAL_BATCH_SIZE = 256
+JOURNAL_FLUSH_INTERVAL = 1.0
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024
+JOURNAL_BACKUPS = 5
+
+
+class Journal(BatchWriter):
+    """
+    Append-only JSON lines journal written from a background thread.
+
+    `write` only puts the record on a queue, so the event loop never waits
+    on the disk. The writer thread appends records in batches, flushing
+    when a batch is full or the flush interval elapsed, and rotates the
+    file to `<path>.1 ... <path>.<backups>` once it outgrows `max_bytes`.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            path: str = JOURNAL_FILE,
+            batch_size: int = JOURNAL_BATCH_SIZE,
+            flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+            max_bytes: int = JOURNAL_MAX_BYTES,
+            backups: int = JOURNAL_BACKUPS
+    ):
+        super().__init__("journal", batch_size, flush_interval)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self.flushes = 0
+        self.rotations = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = Journal()
+        return cls._instance
+
+    def write(self, kind: str, record: dict) -> None:
+        """Queues a record, stamped with its type and the current time."""
+        self.put({"type": kind, "ts": time.time(), **record})
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+        }
+
+    def _flush(self, batch: List[dict]) -> None:
+        lines = "".join(
+            json.dumps(record, separators=(",", ":"), default=str) + "\n"
+            for record in batch
+        )
+        try:
+            with open(self.path, "a", encoding="utf-8") as journal_file:
+                journal_file.write(lines)
+                size = journal_file.tell()
+            self.written += len(batch)
+            self.flushes += 1
+            if size >= self.max_bytes:
+                self._rotate()
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Error writing journal: {str(e)}")
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self.rotations += 1
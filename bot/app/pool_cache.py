@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from app.batch_writer import BatchWriter
+
+POOL_CACHE_FILE = os.getenv("POOL_CACHE_FILE", "pool_keys_cache.json")
+POOL_CACHE_SIZE = 512
+# AMM and market keys never change for a pool, the TTL only bounds
+# how long a closed or migrated pool can stay in the cache.
+POOL_CACHE_TTL = 24 * 60 * 60
+# Changes are written at most this often, never from the event loop
+POOL_CACHE_FLUSH_INTERVAL = 5.0
+
+
+class PoolKeysCache:
+    """
+    Bounded LRU cache of decoded pool keys keyed by AMM id.
+
+    Entries are persisted to a JSON file so a restarted bot can trade
+    positions it already holds without fetching the pool accounts again.
+    Keys of held positions are pinned: they neither count towards
+    `maxsize` nor expire, so discovery inserting every new pool can not
+    evict them. Changes are queued to a background writer that rewrites
+    the file at most once per flush interval.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            path: Optional[str] = POOL_CACHE_FILE,
+            maxsize: int = POOL_CACHE_SIZE,
+            ttl: float = POOL_CACHE_TTL,
+            flush_interval: float = POOL_CACHE_FLUSH_INTERVAL
+    ):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._pinned: Set[str] = set()
+        self._writer: Optional[_PoolKeysWriter] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.load()
+        if path:
+            self._writer = _PoolKeysWriter(path, flush_interval, {
+                key: self._encode_entry(key) for key in self._entries
+            })
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PoolKeysCache()
+        return cls._instance
+
+    def get(self, amm_id) -> Optional[dict]:
+        key = str(amm_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, pool_keys = entry
+        if key not in self._pinned and time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            self.evictions += 1
+            self.misses += 1
+            self._save(key)
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return pool_keys
+
+    def put(self, amm_id, pool_keys: dict) -> None:
+        self.put_many({amm_id: pool_keys})
+
+    def put_many(self, pool_keys_by_amm: dict) -> None:
+        now = time.time()
+        for amm_id, pool_keys in pool_keys_by_amm.items():
+            key = str(amm_id)
+            self._entries[key] = (now, pool_keys)
+            self._entries.move_to_end(key)
+            self._save(key)
+        for key in self._evict():
+            self.evictions += 1
+            self._save(key)
+
+    def invalidate(self, amm_id) -> None:
+        key = str(amm_id)
+        if self._entries.pop(key, None) is not None:
+            self._save(key)
+
+    def pin(self, amm_id) -> None:
+        """Keeps the keys of a held position until `unpin`."""
+        key = str(amm_id)
+        self._pinned.add(key)
+        if key in self._entries:
+            self._save(key)
+
+    def unpin(self, amm_id) -> None:
+        key = str(amm_id)
+        if key not in self._pinned:
+            return
+        self._pinned.discard(key)
+        if key in self._entries:
+            self._save(key)
+        for evicted in self._evict():
+            self.evictions += 1
+            self._save(evicted)
+
+    def close(self) -> None:
+        """Writes the pending changes."""
+        if self._writer is not None:
+            self._writer.close()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "pinned": len(self._pinned),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def load(self) -> None:
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                raw_entries = json.load(cache_file)
+            now = time.time()
+            for key, (stored_at, raw_keys, *pinned) in raw_entries.items():
+                pinned = bool(pinned and pinned[0])
+                if pinned or now - stored_at <= self.ttl:
+                    self._entries[key] = (stored_at, _decode_pool_keys(raw_keys))
+                    if pinned:
+                        self._pinned.add(key)
+            self._evict()
+            logging.info(f"Loaded {len(self._entries)} pool keys from {self.path}")
+        except Exception as e:
+            logging.error(f"Error loading pool keys cache: {str(e)}")
+
+    def _evict(self) -> List[str]:
+        """Drops the least recently used unpinned entries over `maxsize`."""
+        unpinned = [key for key in self._entries if key not in self._pinned]
+        evicted = unpinned[:max(len(unpinned) - self.maxsize, 0)]
+        for key in evicted:
+            del self._entries[key]
+        return evicted
+
+    def _encode_entry(self, key: str) -> list:
+        stored_at, pool_keys = self._entries[key]
+        return [stored_at, _encode_pool_keys(pool_keys), key in self._pinned]
+
+    def _save(self, key: str) -> None:
+        if self._writer is not None:
+            self._writer.put((key, self._encode_entry(key) if key in self._entries else None))
+
+
+class _PoolKeysWriter(BatchWriter):
+    """Mirrors the cache entries and rewrites the cache file per batch of changes."""
+
+    def __init__(self, path: str, flush_interval: float, raw_entries: dict):
+        super().__init__("pool_cache", POOL_CACHE_SIZE, flush_interval)
+        self.path = path
+        self._raw_entries = raw_entries
+
+    def _flush(self, batch: list) -> None:
+        for key, raw_entry in batch:
+            if raw_entry is None:
+                self._raw_entries.pop(key, None)
+            else:
+                self._raw_entries[key] = raw_entry
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(self._raw_entries, cache_file)
+            os.replace(tmp_path, self.path)
+            self.written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Error saving pool keys cache: {str(e)}")
+
+
+def _encode_pool_keys(pool_keys: dict) -> dict:
+    return {
+        name: str(value) if isinstance(value, Pubkey) else value
+        for name, value in pool_keys.items()
+    }
+
+
+def _decode_pool_keys(raw_keys: dict) -> dict:
+    return {
+        name: Pubkey.from_string(value) if isinstance(value, str) else value
+        for name, value in raw_keys.items()
+    }
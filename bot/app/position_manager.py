@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.pool_cache import PoolKeysCache
+from app.price_feed import PriceFeed
+
+MAX_POSITIONS = int(os.getenv("MAX_POSITIONS", "5"))
+MAX_SOL_EXPOSURE = float(os.getenv("MAX_SOL_EXPOSURE", "0.05"))
+POSITION_RESTARTS = 3
+POSITION_RESTART_DELAY = 5
+
+
+class PositionAbandoned(Exception):
+    """Raised by a tracker that gives up while the position's tokens are still held."""
+
+
+class Position:
+    def __init__(self, pair_address: str, symbol: str, token_name: str, sol_in: float):
+        self.pair_address = pair_address
+        self.symbol = symbol
+        self.token_name = token_name
+        self.sol_in = sol_in
+        self.amm_id = None
+        self.start_price: Optional[float] = None
+        self.status = "buying"
+        self.opened_at = time.time()
+        self.restarts = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def pnl(self) -> Optional[float]:
+        if not self.start_price or self.amm_id is None:
+            return None
+        tick = PriceFeed.get_instance().latest(self.amm_id)
+        if tick is None:
+            return None
+        return (tick.price - self.start_price) / self.start_price * 100
+
+
+class PositionManager:
+    """
+    Registry of open positions, each tracked by its own supervised task.
+
+    A position is reserved before the buy so concurrent signals can not
+    exceed the position or SOL exposure caps, then handed its tracking
+    coroutine once the buy is confirmed. A tracker that returns has closed
+    the position. One that raises `PositionAbandoned`, or keeps crashing
+    after a few restarts, leaves the tokens in the wallet: the position is
+    marked abandoned and keeps its slot and exposure until it is released
+    by hand.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            max_positions: int = MAX_POSITIONS,
+            max_exposure: float = MAX_SOL_EXPOSURE,
+            max_restarts: int = POSITION_RESTARTS
+    ):
+        self.max_positions = max_positions
+        self.max_exposure = max_exposure
+        self.max_restarts = max_restarts
+        self._positions: Dict[str, Position] = {}
+
+        self.opened = 0
+        self.closed = 0
+        self.rejected = 0
+        self.crashed = 0
+        self.abandoned = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PositionManager()
+        return cls._instance
+
+    @property
+    def exposure(self) -> float:
+        return sum(position.sol_in for position in self._positions.values())
+
+    def positions(self) -> List[Position]:
+        return list(self._positions.values())
+
+    def get(self, pair_address: str) -> Optional[Position]:
+        return self._positions.get(pair_address)
+
+    def reserve(self, pair_address: str, symbol: str, token_name: str, sol_in: float) -> Optional[Position]:
+        """Claims a slot for a new position, None if it is held already or a cap is reached."""
+        if pair_address in self._positions:
+            logging.info(f"Position in {symbol} is already open")
+            return None
+        if len(self._positions) >= self.max_positions:
+            self.rejected += 1
+            logging.warning(f"Skipping {symbol}: {len(self._positions)}/{self.max_positions} positions open")
+            return None
+        if self.exposure + sol_in > self.max_exposure + 1e-9:
+            self.rejected += 1
+            logging.warning(f"Skipping {symbol}: exposure {self.exposure + sol_in:.4f} SOL over the {self.max_exposure} SOL cap")
+            return None
+        position = Position(pair_address, symbol, token_name, sol_in)
+        self._positions[pair_address] = position
+        # a held position must still find its pool keys after a restart
+        PoolKeysCache.get_instance().pin(pair_address)
+        return position
+
+    def release(self, position: Position) -> None:
+        """Frees a slot whose buy did not go through, or an abandoned one once it is sold."""
+        if self._positions.get(position.pair_address) is position:
+            del self._positions[position.pair_address]
+            PoolKeysCache.get_instance().unpin(position.pair_address)
+
+    def track(self, position: Position, tracker: Callable[[], Awaitable]) -> asyncio.Task:
+        """Starts tracking a bought position in the background."""
+        position.status = "open"
+        self.opened += 1
+        position.task = asyncio.create_task(self._supervise(position, tracker))
+        return position.task
+
+    async def stop(self) -> None:
+        tasks = [position.task for position in self._positions.values() if position.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self._positions),
+            "exposure": self.exposure,
+            "opened": self.opened,
+            "closed": self.closed,
+            "rejected": self.rejected,
+            "crashed": self.crashed,
+            "abandoned": self.abandoned,
+        }
+
+    def summary(self) -> str:
+        if not self._positions:
+            return "No open positions"
+        lines = [f"**Positions** {len(self._positions)}/{self.max_positions}  |  {self.exposure:.4f}/{self.max_exposure} SOL"]
+        for position in self._positions.values():
+            pnl = position.pnl
+            pnl_text = f"{pnl:.2f}%" if pnl is not None else "n/a"
+            minutes = (time.time() - position.opened_at) / 60
+            lines.append(
+                f"**{position.symbol}**  {position.status}  |  {position.sol_in} SOL  |  PnL {pnl_text}  |  {minutes:.0f} min"
+            )
+        return "\n".join(lines)
+
+    async def _supervise(self, position: Position, tracker: Callable[[], Awaitable]) -> None:
+        abandoned = False
+        try:
+            while True:
+                try:
+                    await tracker()
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except PositionAbandoned as e:
+                    logging.critical(f"Tracking {position.symbol} gave up: {str(e)}, check the wallet")
+                    abandoned = True
+                    return
+                except Exception as e:
+                    self.crashed += 1
+                    position.restarts += 1
+                    logging.exception(f"Tracking {position.symbol} crashed ({position.restarts}/{self.max_restarts}): {str(e)}")
+                    if position.restarts > self.max_restarts:
+                        logging.critical(f"Giving up tracking {position.symbol}, its tokens are still held, check the wallet")
+                        abandoned = True
+                        return
+                    await asyncio.sleep(POSITION_RESTART_DELAY)
+        finally:
+            if abandoned:
+                position.status = "abandoned"
+                self.abandoned += 1
+            else:
+                position.status = "closed"
+                self.release(position)
+                self.closed += 1
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from solana.rpc.commitment import Processed
+from solana.rpc.websocket_api import SubscriptionError, connect
+from solders.account_decoder import UiAccountEncoding  # type: ignore
+from solders.commitment_config import CommitmentLevel  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.config import RpcAccountInfoConfig  # type: ignore
+from solders.errors import SerdeJSONError  # type: ignore
+from solders.rpc.requests import AccountSubscribe, AccountUnsubscribe  # type: ignore
+from solders.rpc.responses import AccountNotification, SubscriptionResult  # type: ignore
+from websockets.exceptions import ConnectionClosedError, ProtocolError
+
+from app.config import WSS_RPC
+from app.decoders import TOKEN_ACCOUNT_DECODER
+from app.layouts import ACCOUNT_LAYOUT
+from app.rpc import get_async_client
+from app.utils import price_from_vault_amounts
+
+PRICE_QUEUE_SIZE = 32
+RECONNECT_DELAY = 2
+# Oldest tick a swap quote is built from
+QUOTE_TICK_MAX_AGE = 2
+
+VAULT_SUBSCRIBE_CONFIG = RpcAccountInfoConfig(
+    encoding=UiAccountEncoding.Base64,
+    commitment=CommitmentLevel.Processed
+)
+
+
+class PriceTick(NamedTuple):
+    amm_id: Pubkey
+    price: float
+    base_vault_amount: int
+    quote_vault_amount: int
+    slot: Optional[int]
+    received_at: float
+
+
+class _TrackedPool:
+    def __init__(self, pool_keys: dict):
+        self.pool_keys = pool_keys
+        # one queue per consumer, every consumer sees every tick
+        self.queues: List[asyncio.Queue] = []
+        self.amounts: Dict[Pubkey, Optional[int]] = {
+            pool_keys["base_vault"]: None,
+            pool_keys["quote_vault"]: None,
+        }
+        self.latest: Optional[PriceTick] = None
+
+
+class PriceFeed:
+    """
+    Pushes a price tick for a pool every time one of its vaults changes.
+
+    The base and quote vault of every tracked pool are subscribed with
+    `accountSubscribe` on one shared websocket and decoded from the raw
+    token account data. Pools are added with `track` after a buy and
+    removed with `untrack` after the final sell; every vault is subscribed
+    again after a reconnect. Each `track` call gets its own queue, and a
+    pool stays subscribed until the last of them is untracked.
+    """
+    _instance = None
+
+    def __init__(self, wss: str = WSS_RPC):
+        self.wss = wss
+
+        self._pools: Dict[str, _TrackedPool] = {}
+        self._vaults: Dict[Pubkey, str] = {}
+        self._requests: Dict[int, Pubkey] = {}
+        self._subscriptions: Dict[int, Pubkey] = {}
+        self._vault_subscriptions: Dict[Pubkey, int] = {}
+        self._websocket = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.ticks = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PriceFeed()
+        return cls._instance
+
+    @property
+    def connected(self) -> bool:
+        return self._websocket is not None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def track(self, pool_keys: dict, maxsize: int = PRICE_QUEUE_SIZE) -> asyncio.Queue:
+        """
+        Starts streaming the pool's price.
+
+        Returns:
+            The caller's queue the pool's `PriceTick`s are pushed to, hand
+            it back to `untrack`. It is seeded with the current price when
+            the vaults can be read.
+        """
+        self.start()
+        key = str(pool_keys["amm_id"])
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        pool = self._pools.get(key)
+        if pool is not None:
+            pool.queues.append(queue)
+            if pool.latest is not None:
+                queue.put_nowait(pool.latest)
+            return queue
+
+        pool = _TrackedPool(pool_keys)
+        pool.queues.append(queue)
+        self._pools[key] = pool
+        for vault in pool.amounts:
+            self._vaults[vault] = key
+            if self._websocket is not None:
+                await self._subscribe(vault)
+        await self._seed(pool)
+        return queue
+
+    async def untrack(self, amm_id, queue: asyncio.Queue) -> None:
+        """Stops the consumer's queue, unsubscribes the pool after its last consumer."""
+        key = str(amm_id)
+        pool = self._pools.get(key)
+        if pool is None:
+            return
+        if queue in pool.queues:
+            pool.queues.remove(queue)
+        if pool.queues:
+            return
+        del self._pools[key]
+        for vault in pool.amounts:
+            self._vaults.pop(vault, None)
+            subscription = self._vault_subscriptions.pop(vault, None)
+            if subscription is None:
+                continue
+            self._subscriptions.pop(subscription, None)
+            if self._websocket is not None:
+                try:
+                    request_id = self._websocket.increment_counter_and_get_id()
+                    await self._websocket.send_data(AccountUnsubscribe(subscription, request_id))
+                except Exception as e:
+                    logging.error(f"Error unsubscribing from vault {vault}: {str(e)}")
+
+    def vaults(self) -> List[Pubkey]:
+        return list(self._vaults)
+
+    @property
+    def fully_subscribed(self) -> bool:
+        return self.connected and len(self._vault_subscriptions) == len(self._vaults)
+
+    def latest(self, amm_id) -> Optional[PriceTick]:
+        pool = self._pools.get(str(amm_id))
+        return pool.latest if pool else None
+
+    def fresh(self, amm_id, max_age: float = QUOTE_TICK_MAX_AGE) -> Optional[PriceTick]:
+        """The latest tick if both vaults are subscribed and it is at most `max_age` old."""
+        pool = self._pools.get(str(amm_id))
+        if pool is None or pool.latest is None or not self.connected:
+            return None
+        if any(vault not in self._vault_subscriptions for vault in pool.amounts):
+            return None
+        if time.monotonic() - pool.latest.received_at > max_age:
+            return None
+        return pool.latest
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "pools": len(self._pools),
+            "subscriptions": len(self._vault_subscriptions),
+            "ticks": self.ticks,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+    async def _seed(self, pool: _TrackedPool) -> None:
+        vaults = list(pool.amounts)
+        try:
+            response = await get_async_client().get_multiple_accounts(vaults, Processed, encoding="base64")
+        except Exception as e:
+            logging.error(f"Error reading vaults of {pool.pool_keys['amm_id']}: {str(e)}")
+            return
+        self.apply_many(
+            {vault: account.data for vault, account in zip(vaults, response.value) if account is not None},
+            response.context.slot
+        )
+
+    async def _subscribe(self, vault: Pubkey) -> None:
+        try:
+            request_id = self._websocket.increment_counter_and_get_id()
+            self._requests[request_id] = vault
+            await self._websocket.send_data(AccountSubscribe(vault, VAULT_SUBSCRIBE_CONFIG, request_id))
+        except Exception as e:
+            logging.error(f"Error subscribing to vault {vault}: {str(e)}")
+
+    def apply(self, vault: Pubkey, data: bytes, slot: Optional[int]) -> None:
+        """Updates a vault from raw token account data and pushes the pool's new price."""
+        pool = self._update(vault, data)
+        if pool is not None:
+            self._push(pool, slot)
+
+    def apply_many(self, accounts: Dict[Pubkey, bytes], slot: Optional[int]) -> None:
+        """Updates several vaults read together, pushing one tick per pool."""
+        pools = {}
+        for vault, data in accounts.items():
+            pool = self._update(vault, data)
+            if pool is not None:
+                pools[id(pool)] = pool
+        for pool in pools.values():
+            self._push(pool, slot)
+
+    def _update(self, vault: Pubkey, data: bytes) -> Optional[_TrackedPool]:
+        pool = self._pools.get(self._vaults.get(vault))
+        if pool is None or len(data) < ACCOUNT_LAYOUT.sizeof():
+            return None
+        _, _, amount = TOKEN_ACCOUNT_DECODER.unpack(data)
+        pool.amounts[vault] = amount
+        return pool
+
+    def _push(self, pool: _TrackedPool, slot: Optional[int]) -> None:
+        pool_keys = pool.pool_keys
+        base_amount = pool.amounts[pool_keys["base_vault"]]
+        quote_amount = pool.amounts[pool_keys["quote_vault"]]
+        if base_amount is None or quote_amount is None:
+            return
+        price, _ = price_from_vault_amounts(pool_keys, base_amount, quote_amount)
+        if price is None:
+            return
+
+        tick = PriceTick(pool_keys["amm_id"], price, base_amount, quote_amount, slot, time.monotonic())
+        pool.latest = tick
+        for queue in pool.queues:
+            if queue.full():
+                # exit logic only cares about the newest prices
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(tick)
+        self.ticks += 1
+
+    def _handle(self, message) -> None:
+        if isinstance(message, SubscriptionResult):
+            vault = self._requests.pop(message.id, None)
+            if vault is not None and vault in self._vaults:
+                self._subscriptions[message.result] = vault
+                self._vault_subscriptions[vault] = message.result
+        elif isinstance(message, AccountNotification):
+            vault = self._subscriptions.get(message.subscription)
+            if vault is not None:
+                self.apply(vault, message.result.value.data, message.result.context.slot)
+
+    async def _run(self) -> None:
+        async for websocket in connect(self.wss):
+            try:
+                self._requests.clear()
+                self._subscriptions.clear()
+                self._vault_subscriptions.clear()
+                self._websocket = websocket
+                for vault in list(self._vaults):
+                    await self._subscribe(vault)
+                # vaults could have changed while we were disconnected
+                for pool in list(self._pools.values()):
+                    await self._seed(pool)
+
+                while True:
+                    try:
+                        messages = await websocket.recv()
+                    except SubscriptionError as err:
+                        logging.error(f"Vault subscription rejected: {str(err)}")
+                        continue
+                    except SerdeJSONError:
+                        # solders can not parse the `true` acknowledging an unsubscribe
+                        continue
+                    for message in messages:
+                        self._handle(message)
+
+            except (ProtocolError, ConnectionClosedError) as err:
+                logging.error(f"Price feed websocket closed: {str(err)}")
+            except asyncio.CancelledError:
+                self._websocket = None
+                raise
+            except Exception as err:
+                logging.error(f"Price feed websocket error: {str(err)}")
+            self._websocket = None
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
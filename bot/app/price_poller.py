@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from solana.rpc.commitment import Processed
+
+from app.async_utils import MAX_MULTIPLE_ACCOUNTS
+from app.price_feed import PriceFeed
+from app.rpc import get_async_client
+from app.scheduler import CRITICAL, prioritized
+
+PRICE_POLL_INTERVAL = 2
+
+
+class PricePoller:
+    """
+    Polling fallback of the `PriceFeed`.
+
+    While the feed's websocket is down or some vault subscriptions are
+    missing, every tracked vault is read with as few `getMultipleAccounts`
+    calls as possible and the amounts are fed into the same per-pool tick
+    queues. The request count per tick depends on the number of vaults
+    divided by 100, not on the number of positions.
+    """
+    _instance = None
+
+    def __init__(self, feed: PriceFeed = None, interval: float = PRICE_POLL_INTERVAL):
+        self.feed = feed or PriceFeed.get_instance()
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        self.polls = 0
+        self.requests = 0
+        self.errors = 0
+        self.poll_latency: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = PricePoller()
+        return cls._instance
+
+    @property
+    def active(self) -> bool:
+        return bool(self.feed.vaults()) and not self.feed.fully_subscribed
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    # the stop losses run on these reads
+    @prioritized(CRITICAL)
+    async def poll(self) -> None:
+        vaults = self.feed.vaults()
+        if not vaults:
+            return
+        started = time.monotonic()
+        chunks = [
+            vaults[i:i + MAX_MULTIPLE_ACCOUNTS]
+            for i in range(0, len(vaults), MAX_MULTIPLE_ACCOUNTS)
+        ]
+        client = get_async_client()
+        responses = await asyncio.gather(
+            *(client.get_multiple_accounts(chunk, Processed, encoding="base64") for chunk in chunks),
+            return_exceptions=True
+        )
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                self.errors += 1
+                logging.error(f"Error polling vaults: {str(response)}")
+                continue
+            self.requests += 1
+            self.feed.apply_many(
+                {vault: account.data for vault, account in zip(chunk, response.value) if account is not None},
+                response.context.slot
+            )
+        self.polls += 1
+        self.poll_latency = time.monotonic() - started
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "polls": self.polls,
+            "requests": self.requests,
+            "errors": self.errors,
+            "poll_latency": self.poll_latency,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.active:
+                continue
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error in price poll loop: {str(e)}")
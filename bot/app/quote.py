@@ -0,0 +1,170 @@
+"""
+Constant-product quotes for Raydium v4 pools, in exact integer arithmetic.
+
+Mirrors `swap_base_in` of the AMM program: the swap fee is taken from the
+input rounding up, then `out = reserve_out * in / (reserve_in + in)` rounds
+down. Reserves are the raw vault amounts, so the quote ignores liquidity
+sitting in the OpenBook orders, which is empty for freshly created pools.
+
+Reserve products overflow int64, so the batch functions work on Python
+integers instead of numpy arrays.
+"""
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from app.constants import SOL
+
+# 0.25%, used for pool keys cached before the fee fields were decoded
+DEFAULT_SWAP_FEE_NUMERATOR = 25
+DEFAULT_SWAP_FEE_DENOMINATOR = 10_000
+
+
+def pool_fee(pool_keys: dict) -> Tuple[int, int]:
+    return (
+        pool_keys.get("swap_fee_numerator", DEFAULT_SWAP_FEE_NUMERATOR),
+        pool_keys.get("swap_fee_denominator", DEFAULT_SWAP_FEE_DENOMINATOR)
+    )
+
+
+def sol_token_reserves(pool_keys: dict, base_vault_amount: int, quote_vault_amount: int) -> Tuple[int, int]:
+    """Orders the raw vault amounts as (sol_reserve, token_reserve)."""
+    if str(pool_keys["base_mint"]) == SOL:
+        return base_vault_amount, quote_vault_amount
+    return quote_vault_amount, base_vault_amount
+
+
+def quote_exact_in(
+        amount_in: int,
+        reserve_in: int,
+        reserve_out: int,
+        fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR,
+        fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR
+) -> int:
+    """Raw amount received for `amount_in`, after fees and price impact."""
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    fee = -(-amount_in * fee_numerator // fee_denominator)
+    amount_in_after_fee = amount_in - fee
+    return reserve_out * amount_in_after_fee // (reserve_in + amount_in_after_fee)
+
+
+def quote_many(
+        amounts_in: Iterable[int],
+        reserve_in: int,
+        reserve_out: int,
+        fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR,
+        fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR
+) -> List[int]:
+    """Quotes many trade sizes against one pool."""
+    return [
+        quote_exact_in(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator)
+        for amount_in in amounts_in
+    ]
+
+
+def quote_pools(amount_in: int, pools: Sequence[Tuple[int, int, int, int]]) -> List[int]:
+    """
+    Quotes one trade size against many pools.
+
+    Args:
+        amount_in: Raw input amount.
+        pools: (reserve_in, reserve_out, fee_numerator, fee_denominator) per pool.
+    """
+    return [quote_exact_in(amount_in, *pool) for pool in pools]
+
+
+def price_impact(
+        amount_in: int,
+        reserve_in: int,
+        reserve_out: int,
+        fee_numerator: int = DEFAULT_SWAP_FEE_NUMERATOR,
+        fee_denominator: int = DEFAULT_SWAP_FEE_DENOMINATOR
+) -> float:
+    """Fraction of the spot value lost to fees and price impact."""
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0.0
+    amount_out = quote_exact_in(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator)
+    return 1 - (amount_out * reserve_in) / (amount_in * reserve_out)
+
+
+def minimum_amount_out(amount_out: int, slippage: float) -> int:
+    return int(amount_out * (100 - slippage) // 100)
+
+
+def quote_buy(
+        pool_keys: dict,
+        base_vault_amount: int,
+        quote_vault_amount: int,
+        lamports_in: int,
+        slippage: float
+) -> Tuple[int, int]:
+    """
+    Returns:
+        (amount_in, minimum_amount_out) of a SOL -> token swap.
+    """
+    sol_reserve, token_reserve = sol_token_reserves(pool_keys, base_vault_amount, quote_vault_amount)
+    amount_out = quote_exact_in(lamports_in, sol_reserve, token_reserve, *pool_fee(pool_keys))
+    return lamports_in, minimum_amount_out(amount_out, slippage)
+
+
+def quote_sell(
+        pool_keys: dict,
+        base_vault_amount: int,
+        quote_vault_amount: int,
+        token_amount_in: int,
+        slippage: float
+) -> Tuple[int, int]:
+    """
+    Returns:
+        (amount_in, minimum_amount_out) of a token -> SOL swap.
+    """
+    sol_reserve, token_reserve = sol_token_reserves(pool_keys, base_vault_amount, quote_vault_amount)
+    amount_out = quote_exact_in(token_amount_in, token_reserve, sol_reserve, *pool_fee(pool_keys))
+    return token_amount_in, minimum_amount_out(amount_out, slippage)
+
+
+def best_pool(amount_in: int, pools: Sequence[Tuple[int, int, int, int]]) -> Optional[int]:
+    """Index of the pool giving the largest output for `amount_in`."""
+    outputs = quote_pools(amount_in, pools)
+    if not outputs:
+        return None
+    return max(range(len(outputs)), key=outputs.__getitem__)
+
+
+if __name__ == "__main__":
+    import random
+    from fractions import Fraction
+
+    def reference_quote(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator):
+        fee = Fraction(amount_in * fee_numerator, fee_denominator)
+        fee = fee.numerator // fee.denominator + (fee.denominator != 1)
+        amount_in_after_fee = amount_in - fee
+        return int(Fraction(reserve_out * amount_in_after_fee, reserve_in + amount_in_after_fee))
+
+    # 1 SOL into 100 SOL / 1e15 token pool: fee 2_500_000, 10**15 * 997_500_000 // 100_997_500_000
+    assert quote_exact_in(10**9, 100 * 10**9, 10**15) == 9_876_482_091_140
+    assert quote_exact_in(1, 10**9, 10**9) == 0
+    assert quote_exact_in(0, 10**9, 10**9) == 0
+    assert quote_exact_in(10**6, 10**9, 10**9, 0, 10_000) == 999_000
+
+    rng = random.Random(7)
+    u64 = 2**64 - 1
+    for _ in range(100_000):
+        reserve_in = rng.randint(1, u64)
+        reserve_out = rng.randint(1, u64)
+        amount_in = rng.randint(1, u64)
+        fee_numerator, fee_denominator = rng.choice([(25, 10_000), (0, 10_000), (1, 100)])
+        amount_out = quote_exact_in(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator)
+
+        assert amount_out == reference_quote(amount_in, reserve_in, reserve_out, fee_numerator, fee_denominator)
+        assert 0 <= amount_out < reserve_out
+        # the pool never loses value: k does not decrease
+        assert (reserve_in + amount_in) * (reserve_out - amount_out) >= reserve_in * reserve_out
+        # a larger trade never gets less out
+        assert quote_exact_in(amount_in + 1, reserve_in, reserve_out, fee_numerator, fee_denominator) >= amount_out
+
+    sizes = [10**7 * i for i in range(1, 101)]
+    outputs = quote_many(sizes, 50 * 10**9, 10**15)
+    assert outputs == sorted(outputs)
+    assert quote_pools(10**8, [(10**9, 10**12, 25, 10_000), (2 * 10**9, 10**12, 25, 10_000)])[0] < 10**12
+    assert best_pool(10**8, [(10**9, 10**12, 25, 10_000), (10**9, 2 * 10**12, 25, 10_000)]) == 1
+    print("quote checks passed")
@@ -0,0 +1,87 @@
+"""
+Decoder of the `ray_log` line the Raydium v4 program emits on `initialize2`.
+
+The line is a base64 bincode `InitLog`:
+
+    log_type u8 (0) | time u64 | pc_decimals u8 | coin_decimals u8 |
+    pc_lot_size u64 | coin_lot_size u64 | pc_amount u64 | coin_amount u64 |
+    market [u8; 32]
+
+The AMM account is the program PDA of `[program, market, "amm_associated_seed"]`,
+so the pool identity is known from the log notification alone, without
+fetching the transaction.
+"""
+import base64
+import binascii
+import struct
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+from solders.pubkey import Pubkey  # type: ignore
+
+from app.constants import RAY_V4
+
+RAY_LOG_PREFIX = "ray_log: "
+INIT_LOG_TYPE = 0
+INIT_LOG = struct.Struct("<BQBBQQQQ32s")
+AMM_ASSOCIATED_SEED = b"amm_associated_seed"
+
+
+class InitLog(NamedTuple):
+    time: int
+    pc_decimals: int
+    coin_decimals: int
+    pc_lot_size: int
+    coin_lot_size: int
+    pc_amount: int
+    coin_amount: int
+    market: Pubkey
+
+
+def parse_init_log(log: str) -> Optional[InitLog]:
+    """Decodes one log line, None if it is not an `initialize2` ray_log."""
+    _, marker, encoded = log.partition(RAY_LOG_PREFIX)
+    if not marker:
+        return None
+    try:
+        raw = base64.b64decode(encoded.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) < INIT_LOG.size or raw[0] != INIT_LOG_TYPE:
+        return None
+    _, *values, market = INIT_LOG.unpack_from(raw)
+    return InitLog(*values, Pubkey.from_bytes(market))
+
+
+def find_init_log(logs: Iterable[str]) -> Optional[InitLog]:
+    for log in logs:
+        init_log = parse_init_log(log)
+        if init_log is not None:
+            return init_log
+    return None
+
+
+@lru_cache(maxsize=1024)
+def get_amm_id(market: Pubkey, program: Pubkey = RAY_V4) -> Pubkey:
+    amm_id, _ = Pubkey.find_program_address([bytes(program), bytes(market), AMM_ASSOCIATED_SEED], program)
+    return amm_id
+
+
+if __name__ == "__main__":
+    market = Pubkey.new_unique()
+    raw = INIT_LOG.pack(INIT_LOG_TYPE, 1_700_000_000, 9, 6, 1, 1, 10**9, 10**15, bytes(market))
+    logs = [
+        "Program log: initialize2: InitializeInstruction2 { nonce: 254, init_pc_amount: 1000000000 }",
+        f"Program log: {RAY_LOG_PREFIX}{base64.b64encode(raw).decode()}",
+    ]
+    init_log = find_init_log(logs)
+    assert init_log == InitLog(1_700_000_000, 9, 6, 1, 1, 10**9, 10**15, market)
+
+    # swap ray_logs use other log types
+    swap = bytes([3]) + raw[1:]
+    assert parse_init_log(f"Program log: {RAY_LOG_PREFIX}{base64.b64encode(swap).decode()}") is None
+    assert parse_init_log(f"Program log: {RAY_LOG_PREFIX}not base64!") is None
+
+    amm_id = get_amm_id(market)
+    assert not amm_id.is_on_curve() and amm_id == get_amm_id(Pubkey.from_bytes(bytes(market)))
+    print("ray_log checks passed")
@@ -1,5 +1,4 @@
-import base64
-import os
+from functools import lru_cache
 
 from solana.rpc.commitment import Processed
 from solana.rpc.types import TokenAccountOpts, TxOpts
@@ -23,17 +22,202 @@ from spl.token.instructions import (
     InitializeAccountParams,
     close_account,
     create_associated_token_account,
-    get_associated_token_address,
     initialize_account
 )
 from termcolor import colored, cprint
 import logging
 
-from app.config import client, payer_keypair, UNIT_BUDGET, UNIT_PRICE
+from app.chain_constants import get_payer_token_account
+from app.config import payer_keypair, PERSISTENT_WSOL_UNIT_BUDGET, UNIT_BUDGET, UNIT_PRICE
 from app.constants import SOL_DECIMAL, SOL, TOKEN_PROGRAM_ID, WSOL
 from app.layouts import ACCOUNT_LAYOUT
-from app.utils import confirm_txn, fetch_pool_keys, get_token_price, make_swap_instruction, get_token_balance
+from app.rpc import get_client
+from app.swap_templates import SwapTemplates, new_wsol_seed
+from app.quote import quote_buy, quote_sell
+from app.utils import confirm_txn, fetch_pool_keys, get_pool_reserves, get_token_balance
 
+client = get_client()
+
+# Compute budget instructions are identical for every swap
+COMPUTE_BUDGET_INSTRUCTIONS = (set_compute_unit_limit(UNIT_BUDGET), set_compute_unit_price(UNIT_PRICE))
+PERSISTENT_WSOL_COMPUTE_BUDGET_INSTRUCTIONS = (
+    set_compute_unit_limit(PERSISTENT_WSOL_UNIT_BUDGET), set_compute_unit_price(UNIT_PRICE)
+)
+
+
+@lru_cache(maxsize=1)
+def get_token_account_rent() -> int:
+    """Rent-exempt minimum of a token account, fetched once per process."""
+    return Token.get_min_balance_rent_for_exempt_for_account(client)
+
+
+def get_token_mint(pool_keys: dict) -> Pubkey:
+    return pool_keys['base_mint'] if str(pool_keys['base_mint']) != SOL else pool_keys['quote_mint']
+
+
+def get_token_decimals(pool_keys: dict) -> int:
+    return pool_keys['base_decimals'] if str(pool_keys['base_mint']) != SOL else pool_keys['quote_decimals']
+
+
+def make_wsol_account_instructions(lamports: int, seed: str = None) -> tuple:
+    """
+    Creates instructions for a fresh seeded WSOL account.
+
+    Args:
+        seed: Seed prepared by `SwapTemplate.prepare_wsol_route`, a new one if None.
+
+    Returns:
+        (wsol_token_account, create_instruction, init_instruction)
+    """
+    seed = seed or new_wsol_seed()
+    wsol_token_account = Pubkey.create_with_seed(payer_keypair.pubkey(), seed, TOKEN_PROGRAM_ID)
+
+    create_wsol_account_instr = create_account_with_seed(
+        CreateAccountWithSeedParams(
+            from_pubkey=payer_keypair.pubkey(),
+            to_pubkey=wsol_token_account,
+            base=payer_keypair.pubkey(),
+            seed=seed,
+            lamports=int(lamports),
+            space=ACCOUNT_LAYOUT.sizeof(),
+            owner=TOKEN_PROGRAM_ID
+        )
+    )
+
+    init_wsol_account_instr = initialize_account(
+        InitializeAccountParams(
+            program_id=TOKEN_PROGRAM_ID,
+            account=wsol_token_account,
+            mint=WSOL,
+            owner=payer_keypair.pubkey()
+        )
+    )
+    return wsol_token_account, create_wsol_account_instr, init_wsol_account_instr
+
+
+def build_buy_instructions(
+        pool_keys: dict,
+        amount_in: int,
+        minimum_amount_out: int,
+        token_account: Pubkey,
+        token_account_instr,
+        balance_needed: int
+) -> list:
+    logging.debug("Creating and initializing WSOL account...")
+    template = SwapTemplates.get_instance().get(pool_keys)
+    wsol_token_account, create_wsol_account_instr, init_wsol_account_instr = make_wsol_account_instructions(
+        balance_needed + amount_in, template.take_wsol_seed("buy", token_account)
+    )
+
+    logging.debug("Funding WSOL account...")
+    fund_wsol_account_instr = transfer(
+        TransferParams(
+            from_pubkey=payer_keypair.pubkey(),
+            to_pubkey=wsol_token_account,
+            lamports=int(amount_in)
+        )
+    )
+
+    swap_instructions = template.swap_instruction(amount_in, minimum_amount_out, wsol_token_account, token_account)
+    close_wsol_account_instr = close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_token_account, payer_keypair.pubkey(), payer_keypair.pubkey()))
+
+    instructions = [
+        *COMPUTE_BUDGET_INSTRUCTIONS,
+        create_wsol_account_instr,
+        init_wsol_account_instr,
+        fund_wsol_account_instr
+    ]
+
+    if token_account_instr:
+        instructions.append(token_account_instr)
+
+    instructions.append(swap_instructions)
+    instructions.append(close_wsol_account_instr)
+    return instructions
+
+
+def build_sell_instructions(
+        pool_keys: dict,
+        amount_in: int,
+        minimum_amount_out: int,
+        token_account: Pubkey,
+        balance_needed: int,
+        close_token_account: bool
+) -> list:
+    logging.debug("Generating seed and creating WSOL account...")
+    template = SwapTemplates.get_instance().get(pool_keys)
+    wsol_token_account, create_wsol_account_instr, init_wsol_account_instr = make_wsol_account_instructions(
+        balance_needed, template.take_wsol_seed("sell", token_account)
+    )
+
+    swap_instructions = template.swap_instruction(amount_in, minimum_amount_out, token_account, wsol_token_account)
+    close_wsol_account_instr = close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_token_account, payer_keypair.pubkey(), payer_keypair.pubkey()))
+
+    instructions = [
+        *COMPUTE_BUDGET_INSTRUCTIONS,
+        create_wsol_account_instr,
+        init_wsol_account_instr,
+        swap_instructions,
+        close_wsol_account_instr
+    ]
+
+    if close_token_account:
+        logging.debug("Preparing to close token account after swap...")
+        close_token_account_instr = close_account(
+            CloseAccountParams(TOKEN_PROGRAM_ID, token_account, payer_keypair.pubkey(), payer_keypair.pubkey())
+        )
+        instructions.append(close_token_account_instr)
+    return instructions
+
+
+def build_persistent_buy_instructions(
+        pool_keys: dict,
+        amount_in: int,
+        minimum_amount_out: int,
+        wsol_account: Pubkey,
+        token_account: Pubkey,
+        token_account_instr
+) -> list:
+    """Buy instructions that spend from an already funded WSOL account, see `app.wsol`."""
+    instructions = [
+        *PERSISTENT_WSOL_COMPUTE_BUDGET_INSTRUCTIONS
+    ]
+    if token_account_instr:
+        instructions.append(token_account_instr)
+    instructions.append(
+        SwapTemplates.get_instance().get(pool_keys).swap_instruction(amount_in, minimum_amount_out, wsol_account, token_account)
+    )
+    return instructions
+
+
+def build_persistent_sell_instructions(
+        pool_keys: dict,
+        amount_in: int,
+        minimum_amount_out: int,
+        wsol_account: Pubkey,
+        token_account: Pubkey,
+        close_token_account: bool
+) -> list:
+    """Sell instructions that leave the proceeds wrapped in the persistent WSOL account."""
+    instructions = [
+        *PERSISTENT_WSOL_COMPUTE_BUDGET_INSTRUCTIONS,
+        SwapTemplates.get_instance().get(pool_keys).swap_instruction(amount_in, minimum_amount_out, token_account, wsol_account)
+    ]
+    if close_token_account:
+        instructions.append(
+            close_account(CloseAccountParams(TOKEN_PROGRAM_ID, token_account, payer_keypair.pubkey(), payer_keypair.pubkey()))
+        )
+    return instructions
+
+
+def sign_transaction(instructions: list, blockhash) -> VersionedTransaction:
+    compiled_message = MessageV0.try_compile(
+        payer_keypair.pubkey(),
+        instructions,
+        [],
+        blockhash,
+    )
+    return VersionedTransaction(compiled_message, [payer_keypair])
 
 
 def buy(pair_address: str, pool_keys=None, sol_in: float = .01, slippage: int = 5, token_symbol=None):
@@ -52,16 +236,11 @@ def buy(pair_address: str, pool_keys=None, sol_in: float = .01, slippage: int =
             # cprint("Pool keys fetched successfully.", "white", "on_green", attrs=["bold"])
             logging.debug(f"  Pool keys for    {token_symbol}    fetched successfully.")
 
-        mint = pool_keys['base_mint'] if str(pool_keys['base_mint']) != SOL else pool_keys['quote_mint']
+        mint = get_token_mint(pool_keys)
         
         # cprint("Calculating transaction amounts...", "blue", attrs=["bold"])
         logging.debug("Calculating transaction amounts...")
-        amount_in = int(sol_in * SOL_DECIMAL)
-        token_price, token_decimal = get_token_price(pool_keys)
-        amount_out = float(sol_in) / float(token_price)
-        slippage_adjustment = 1 - (slippage / 100)
-        amount_out_with_slippage = amount_out * slippage_adjustment
-        minimum_amount_out = int(amount_out_with_slippage * 10**token_decimal)
+        amount_in, minimum_amount_out = quote_buy(pool_keys, *get_pool_reserves(pool_keys), int(sol_in * SOL_DECIMAL), slippage)
         # logging.info(f"                                       Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}")
         cprint(f"\n{token_symbol}   Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}", "yellow", attrs=["bold"])
 
@@ -75,85 +254,28 @@ def buy(pair_address: str, pool_keys=None, sol_in: float = .01, slippage: int =
             # cprint("Token account found.", "white", "on_green", attrs=["bold"])
             logging.info(f"\n      {token_symbol}      Token account found: {token_account}")
         else:
-            token_account = get_associated_token_address(payer_keypair.pubkey(), mint)
+            token_account = get_payer_token_account(mint)
             token_account_instr = create_associated_token_account(payer_keypair.pubkey(), payer_keypair.pubkey(), mint)
             logging.error("No existing token account found; creating associated token account.")
             # cprint("No existing token account found; creating associated token account.", "magenta", attrs=["bold", "reverse"])
 
-        # cprint("Generating seed for WSOL account...", "green", attrs=["bold"])
-        logging.debug("Generating seed for WSOL account...")
-        seed = base64.urlsafe_b64encode(os.urandom(24)).decode('utf-8') 
-        wsol_token_account = Pubkey.create_with_seed(payer_keypair.pubkey(), seed, TOKEN_PROGRAM_ID)
-        balance_needed = Token.get_min_balance_rent_for_exempt_for_account(client)
-        
-        # cprint("Creating and initializing WSOL account...", "blue", attrs=["bold"])
-        logging.debug("Creating and initializing WSOL account...")
-        create_wsol_account_instr = create_account_with_seed(
-            CreateAccountWithSeedParams(
-                from_pubkey=payer_keypair.pubkey(),
-                to_pubkey=wsol_token_account,
-                base=payer_keypair.pubkey(),
-                seed=seed,
-                lamports=int(balance_needed + amount_in),
-                space=ACCOUNT_LAYOUT.sizeof(),
-                owner=TOKEN_PROGRAM_ID
-            )
-        )
-
-        init_wsol_account_instr = initialize_account(
-            InitializeAccountParams(
-                program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                mint=WSOL,
-                owner=payer_keypair.pubkey()
-            )
-        )
-
-        # cprint("Funding WSOL account...", "yellow", attrs=["bold"])
-        logging.debug("Funding WSOL account...")
-        fund_wsol_account_instr = transfer(
-            TransferParams(
-                from_pubkey=payer_keypair.pubkey(),
-                to_pubkey=wsol_token_account,
-                lamports=int(amount_in)
-            )
-        )
+        balance_needed = get_token_account_rent()
 
         # cprint("Creating swap instructions...", "green", attrs=["bold"])
         logging.debug(f"     {token_symbol}      Creating swap instructions...")
-        swap_instructions = make_swap_instruction(amount_in, minimum_amount_out, wsol_token_account, token_account, pool_keys, payer_keypair)
-
-        # cprint("Preparing to close WSOL account after swap...", "blue", attrs=["bold"])
-        logging.debug("Preparing to close WSOL account after swap...")
-        close_wsol_account_instr = close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_token_account, payer_keypair.pubkey(), payer_keypair.pubkey()))
-        
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            create_wsol_account_instr,
-            init_wsol_account_instr,
-            fund_wsol_account_instr
-        ]
-        
-        if token_account_instr:
-            instructions.append(token_account_instr)
-        
-        instructions.append(swap_instructions)
-        instructions.append(close_wsol_account_instr)
+        instructions = build_buy_instructions(
+            pool_keys, amount_in, minimum_amount_out,
+            token_account, token_account_instr, balance_needed
+        )
 
         # cprint("Compiling transaction message...", "yellow", attrs=["bold"])
         logging.debug(f"     {token_symbol}     Compiling transaction message...")
-        compiled_message = MessageV0.try_compile(
-            payer_keypair.pubkey(),
-            instructions,
-            [],
-            client.get_latest_blockhash().value.blockhash,
-        )
+        txn = sign_transaction(instructions, client.get_latest_blockhash().value.blockhash)
 
         # cprint("Sending transaction...", "cyan", attrs=["bold"])
         logging.debug("    {token_symbol}     Sending transaction...")
         txn_sig = client.send_transaction(
-            txn = VersionedTransaction(compiled_message, [payer_keypair]), 
+            txn = txn, 
             opts = TxOpts(skip_preflight=True)
             ).value
 
@@ -209,7 +331,7 @@ def sell(pair_address: str, percentage: int = 100, slippage: int = 5, token_symb
         # cprint("Pool keys fetched successfully.", "white", "on_light_green", attrs=['bold'])
         logging.debug("  {token_symbol}  -   Pool keys fetched successfully.")
 
-        mint = pool_keys['base_mint'] if str(pool_keys['base_mint']) != SOL else pool_keys['quote_mint']
+        mint = get_token_mint(pool_keys)
 
         # cprint("Retrieving token balance...", "blue", attrs=["bold"])
         logging.debug("  {token_symbol}  -  Retrieving token balance...")
@@ -226,81 +348,28 @@ def sell(pair_address: str, percentage: int = 100, slippage: int = 5, token_symb
 
         # cprint("Calculating transaction amounts...", "blue", attrs=["bold"])
         logging.debug("Calculating transaction amounts...")
-        token_price, token_decimal = get_token_price(pool_keys)
-        amount_out = float(token_balance) * float(token_price)
-        slippage_adjustment = 1 - (slippage / 100)
-        amount_out_with_slippage = amount_out * slippage_adjustment
-        minimum_amount_out = int(amount_out_with_slippage * SOL_DECIMAL)
-        amount_in = int(token_balance * 10**token_decimal)
+        token_amount_in = int(token_balance * 10**get_token_decimals(pool_keys))
+        amount_in, minimum_amount_out = quote_sell(pool_keys, *get_pool_reserves(pool_keys), token_amount_in, slippage)
         # cprint(f"Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}", "magenta")
         logging.info(f"\n    {token_symbol}  -  Amount In: {amount_in} | Minimum Amount Out: {minimum_amount_out}")
 
-        token_account = get_associated_token_address(payer_keypair.pubkey(), mint)
-
-        # cprint("Generating seed and creating WSOL account...", "cyan", attrs=["bold"])
-        logging.debug("Generating seed and creating WSOL account...")
-        seed = base64.urlsafe_b64encode(os.urandom(24)).decode('utf-8')
-        wsol_token_account = Pubkey.create_with_seed(payer_keypair.pubkey(), seed, TOKEN_PROGRAM_ID)
-        balance_needed = Token.get_min_balance_rent_for_exempt_for_account(client)
-        
-        create_wsol_account_instr = create_account_with_seed(
-            CreateAccountWithSeedParams(
-                from_pubkey=payer_keypair.pubkey(),
-                to_pubkey=wsol_token_account,
-                base=payer_keypair.pubkey(),
-                seed=seed,
-                lamports=int(balance_needed),
-                space=ACCOUNT_LAYOUT.sizeof(),
-                owner=TOKEN_PROGRAM_ID
-            )
-        )
-        
-        init_wsol_account_instr = initialize_account(
-            InitializeAccountParams(
-                program_id=TOKEN_PROGRAM_ID,
-                account=wsol_token_account,
-                mint=WSOL,
-                owner=payer_keypair.pubkey()
-            )
-        )
+        token_account = get_payer_token_account(mint)
+        balance_needed = get_token_account_rent()
 
         # cprint("Creating swap instructions...", "light_yellow")
         logging.debug("Creating swap instructions...")
-        swap_instructions = make_swap_instruction(amount_in, minimum_amount_out, token_account, wsol_token_account, pool_keys, payer_keypair)
-        
-        # cprint("Preparing to close WSOL account after swap...", "light_cyan", attrs=["bold"])
-        logging.debug("Preparing to close WSOL account after swap...")
-        close_wsol_account_instr = close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_token_account, payer_keypair.pubkey(), payer_keypair.pubkey()))
-        
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            create_wsol_account_instr,
-            init_wsol_account_instr,
-            swap_instructions,
-            close_wsol_account_instr
-        ]
-
-        if percentage == 100:
-            # cprint("Preparing to close token account after swap...", "light_yellow", attrs=["bold"])
-            logging.debug("Preparing to close token account after swap...")
-            close_token_account_instr = close_account(
-                CloseAccountParams(TOKEN_PROGRAM_ID, token_account, payer_keypair.pubkey(), payer_keypair.pubkey())
-            )
-            instructions.append(close_token_account_instr)
+        instructions = build_sell_instructions(
+            pool_keys, amount_in, minimum_amount_out,
+            token_account, balance_needed, percentage == 100
+        )
 
         logging.debug("--  {token_symbol} -- Compiling transaction message...")
-        compiled_message = MessageV0.try_compile(
-            payer_keypair.pubkey(),
-            instructions,
-            [],
-            client.get_latest_blockhash().value.blockhash,
-        )
+        txn = sign_transaction(instructions, client.get_latest_blockhash().value.blockhash)
 
         # cprint("Sending transaction...", "light_blue", attrs=["bold"])
         logging.debug("  {token_symbol}  -  Sending transaction...")
         txn_sig = client.send_transaction(
-            txn = VersionedTransaction(compiled_message, [payer_keypair]), 
+            txn = txn, 
             opts = TxOpts(skip_preflight=True)
             ).value
 
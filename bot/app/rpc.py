@@ -0,0 +1,371 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Union
+
+from solana.rpc.api import Client
+from solana.rpc.async_api import AsyncClient
+
+from app.config import RPC_ENDPOINTS
+from app.scheduler import RequestScheduler
+
+RPC_TIMEOUT = 10
+# Latency-critical reads sent to a second endpoint when the first is slow
+HEDGED_METHODS = frozenset({"get_account_info", "get_multiple_accounts", "get_latest_blockhash"})
+RPC_HEDGE_DELAY = float(os.getenv("RPC_HEDGE_DELAY", "0.15"))
+RPC_HEDGE_COUNT = 2
+# Score of an endpoint that has not answered yet
+RPC_INITIAL_LATENCY = 0.5
+RPC_LATENCY_ALPHA = 0.2
+RPC_ERROR_ALPHA = 0.1
+# Every point of error rate multiplies the latency score by this much
+RPC_ERROR_PENALTY = 10
+
+_async_clients: Dict[str, AsyncClient] = {}
+_clients: Dict[str, Client] = {}
+
+
+class EndpointStats:
+    """Rolling latency and error rate of one endpoint."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def score(self) -> float:
+        latency = RPC_INITIAL_LATENCY if self.latency is None else self.latency
+        return latency * (1 + RPC_ERROR_PENALTY * self.error_rate)
+
+    def record(self, latency: float) -> None:
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += RPC_LATENCY_ALPHA * (latency - self.latency)
+        self.error_rate -= RPC_ERROR_ALPHA * self.error_rate
+
+    def record_error(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.error_rate += RPC_ERROR_ALPHA * (1 - self.error_rate)
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+# shared by the sync and async routers, both see the same endpoint health
+_endpoint_stats: Dict[str, EndpointStats] = {}
+
+
+def _stats_for(endpoint: str) -> EndpointStats:
+    if endpoint not in _endpoint_stats:
+        _endpoint_stats[endpoint] = EndpointStats(endpoint)
+    return _endpoint_stats[endpoint]
+
+
+def _rank(endpoints: List[str]) -> List[str]:
+    scheduler = RequestScheduler.get_instance()
+    # endpoints backing off after a 429 go last;
+    # sorted() is stable: the configured order breaks ties
+    return sorted(
+        endpoints,
+        key=lambda endpoint: (scheduler.blocked_for(endpoint) > 0, _stats_for(endpoint).score)
+    )
+
+
+def _shared_async_client(endpoint: str) -> AsyncClient:
+    if endpoint not in _async_clients:
+        _async_clients[endpoint] = AsyncClient(endpoint, timeout=RPC_TIMEOUT)
+    return _async_clients[endpoint]
+
+
+def _shared_client(endpoint: str) -> Client:
+    if endpoint not in _clients:
+        _clients[endpoint] = Client(endpoint, timeout=RPC_TIMEOUT)
+    return _clients[endpoint]
+
+
+class RpcRouter:
+    """
+    AsyncClient facade over a pool of RPC endpoints.
+
+    Any `AsyncClient` method can be called on the router. Requests go to the
+    endpoint with the best rolling latency and error score and fail over to
+    the next one on errors. `HEDGED_METHODS` are sent to a second endpoint
+    when the first has not answered within `hedge_delay`; the first answer
+    wins and the slower request is cancelled. Every request waits for its
+    endpoint's `RequestScheduler` rate limit first.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            endpoints: List[str] = None,
+            hedge_delay: float = RPC_HEDGE_DELAY,
+            hedge_count: int = RPC_HEDGE_COUNT
+    ):
+        self.endpoints = list(endpoints or RPC_ENDPOINTS)
+        self.hedge_delay = hedge_delay
+        self.hedge_count = hedge_count
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = RpcRouter()
+        return cls._instance
+
+    def ranked(self) -> List[str]:
+        return _rank(self.endpoints)
+
+    def stats(self) -> dict:
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "endpoints": {_label(endpoint): _stats_for(endpoint).to_dict() for endpoint in self.endpoints},
+            "limits": RequestScheduler.get_instance().stats(),
+        }
+
+    def __getattr__(self, name: str):
+        attribute = getattr(AsyncClient, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return getattr(_shared_async_client(self.ranked()[0]), name)
+
+        hedge_count = self.hedge_count if name in HEDGED_METHODS else 1
+
+        async def routed(*args, **kwargs):
+            return await self._request(name, args, kwargs, hedge_count)
+
+        routed.__name__ = name
+        return routed
+
+    async def _call(self, endpoint: str, name: str, args: tuple, kwargs: dict):
+        stats = _stats_for(endpoint)
+        scheduler = RequestScheduler.get_instance()
+        await scheduler.acquire(endpoint, name)
+        started = time.monotonic()
+        try:
+            result = await getattr(_shared_async_client(endpoint), name)(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.record_error()
+            scheduler.record(endpoint, e)
+            raise
+        stats.record(time.monotonic() - started)
+        scheduler.record(endpoint)
+        return result
+
+    async def _request(self, name: str, args: tuple, kwargs: dict, hedge_count: int):
+        endpoints = self.ranked()
+        tasks: Dict[asyncio.Task, str] = {}
+        error: Optional[Exception] = None
+        hedged = False
+
+        def launch() -> None:
+            endpoint = endpoints.pop(0)
+            tasks[asyncio.create_task(self._call(endpoint, name, args, kwargs))] = endpoint
+
+        launch()
+        pending = set(tasks)
+        try:
+            while pending:
+                hedge = endpoints and len(tasks) < hedge_count
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedges += 1
+                    hedged = True
+                    launch()
+                    pending = {task for task in tasks if not task.done()}
+                    continue
+
+                for task in done:
+                    if task.exception() is None:
+                        if hedged and task is not next(iter(tasks)):
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                    logging.warning(f"{name} failed on {_label(tasks[task])}: {str(error)}")
+
+                if endpoints and (not pending or len(tasks) < hedge_count):
+                    self.failovers += 1
+                    launch()
+                    pending = {task for task in tasks if not task.done()}
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def close(self) -> None:
+        await close_async_clients()
+
+
+class SyncRpcRouter:
+    """
+    Failover-only `Client` facade over the same endpoints and scores as
+    `RpcRouter`, for the synchronous scripts and the PnL tracker.
+    """
+    _instance = None
+
+    def __init__(self, endpoints: List[str] = None):
+        self.endpoints = list(endpoints or RPC_ENDPOINTS)
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SyncRpcRouter()
+        return cls._instance
+
+    def __getattr__(self, name: str):
+        attribute = getattr(Client, name)
+        if not callable(attribute):
+            return getattr(_shared_client(_rank(self.endpoints)[0]), name)
+
+        def routed(*args, **kwargs):
+            scheduler = RequestScheduler.get_instance()
+            error = None
+            for endpoint in _rank(self.endpoints):
+                stats = _stats_for(endpoint)
+                # cannot wait on the event loop's buckets, only counts against them
+                scheduler.consume(endpoint, name)
+                started = time.monotonic()
+                try:
+                    result = getattr(_shared_client(endpoint), name)(*args, **kwargs)
+                except Exception as e:
+                    stats.record_error()
+                    scheduler.record(endpoint, e)
+                    error = e
+                    logging.warning(f"{name} failed on {_label(endpoint)}: {str(e)}")
+                    continue
+                stats.record(time.monotonic() - started)
+                scheduler.record(endpoint)
+                return result
+            raise error
+
+        routed.__name__ = name
+        return routed
+
+
+def _label(endpoint: str) -> str:
+    # endpoints carry API keys in the query string
+    return endpoint.split("?", 1)[0]
+
+
+def get_async_client(endpoint: str = None) -> Union[RpcRouter, AsyncClient]:
+    """
+    Returns the shared `RpcRouter`, or the shared AsyncClient of one endpoint.
+
+    The clients keep their HTTP connections alive, so all coroutines on the
+    event loop reuse the same connection pools instead of opening a new one
+    for each request.
+    """
+    if endpoint is None:
+        return RpcRouter.get_instance()
+    return _shared_async_client(endpoint)
+
+
+def get_client(endpoint: str = None) -> Union[SyncRpcRouter, Client]:
+    """Synchronous counterpart of `get_async_client`."""
+    if endpoint is None:
+        return SyncRpcRouter.get_instance()
+    return _shared_client(endpoint)
+
+
+async def close_async_clients() -> None:
+    for endpoint, async_client in list(_async_clients.items()):
+        try:
+            await async_client.close()
+        except Exception as e:
+            logging.error(f"Error closing RPC client: {str(e)}")
+        _async_clients.pop(endpoint, None)
+
+
+if __name__ == "__main__":
+    # Routes requests to local stub JSON-RPC servers: python -m app.rpc
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def stub_server(delay: float, fail: bool = False) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(delay)
+                if fail:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.end_headers()
+                    return
+                # the block height tells which stub answered
+                height = int(delay * 1000)
+                if request["method"] == "getBlockHeight":
+                    result = height
+                else:
+                    result = {
+                        "context": {"slot": 1},
+                        "value": {"blockhash": "EkSnNWid2cvwEVnVx9aBqawnmiCNiDgp3gUdkDPTKN1N", "lastValidBlockHeight": height},
+                    }
+                body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except BrokenPipeError:
+                    # hedge loser, cancelled by the router
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_port}"
+
+    async def check() -> None:
+        slow, fast, other_fast, failing = stub_server(0.4), stub_server(0.02), stub_server(0.02), stub_server(0, fail=True)
+
+        # the slow endpoint is preferred until it is measured, the hedge answers first
+        router = RpcRouter([slow, fast], hedge_delay=0.05)
+        started = time.monotonic()
+        response = await router.get_latest_blockhash()
+        assert response.value.last_valid_block_height == 20 and time.monotonic() - started < 0.3
+        assert router.hedges == 1 and router.hedge_wins == 1
+        # not hedged: fails over from the rate limited endpoint
+        router = RpcRouter([failing, other_fast])
+        for _ in range(5):
+            assert (await router.get_block_height()).value == 20
+        assert router.ranked()[0] == other_fast and router.failovers == 1
+        # the 429 blocks the endpoint for its Retry-After
+        assert 0.5 < RequestScheduler.get_instance().blocked_for(failing) <= 1
+        print(RpcRouter([slow, fast, other_fast, failing]).stats())
+
+        # a backing off endpoint ranks behind even a slow one
+        sync_router = SyncRpcRouter([failing, slow])
+        assert _rank([failing, slow])[0] == slow
+        assert sync_router.get_latest_blockhash().value.last_valid_block_height == 400
+        await close_async_clients()
+        print("rpc router checks passed")
+
+    asyncio.run(check())
@@ -0,0 +1,377 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# Priority classes, lower is served first
+CRITICAL = 0    # transaction sends, blockhash, stop loss reads
+NORMAL = 1      # discovery, pool and swap reads
+BACKGROUND = 2  # telemetry, balances, notification driven reads
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", BACKGROUND: "background"}
+
+RPC_RATE_LIMIT = float(os.getenv("RPC_RATE_LIMIT", "10"))
+RPC_RATE_BURST = int(os.getenv("RPC_RATE_BURST", "20"))
+# Per endpoint overrides: "https://endpoint=rate,https://other=rate"
+RPC_RATE_LIMITS = os.getenv("RPC_RATE_LIMITS", "")
+# Share of the bucket a request of this class has to leave for higher classes
+RESERVED_SHARE = {CRITICAL: 0.0, NORMAL: 0.25, BACKGROUND: 0.5}
+RATE_LIMIT_BACKOFF_MIN = 0.5
+RATE_LIMIT_BACKOFF_MAX = 30
+# A 429 halves the rate, every success gives back this share of the limit
+RATE_RECOVERY = 0.05
+RATE_FLOOR = 0.1
+
+METHOD_PRIORITIES = {
+    "send_transaction": CRITICAL,
+    "send_raw_transaction": CRITICAL,
+    "get_latest_blockhash": CRITICAL,
+    "get_block_height": CRITICAL,
+    "get_balance": BACKGROUND,
+    "get_signatures_for_address": BACKGROUND,
+}
+
+_priority: ContextVar[Optional[int]] = ContextVar("rpc_priority", default=None)
+
+
+@contextmanager
+def rpc_priority(priority: int):
+    """Sets the priority class of the RPC requests made inside the block."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def prioritized(priority: int):
+    """Coroutine decorator version of `rpc_priority`."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with rpc_priority(priority):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def request_priority(method: str) -> int:
+    """
+    Priority class of an RPC method called in the current context.
+
+    A send or a blockhash read is critical wherever it happens, and the
+    caller's class never lowers a method below its own.
+    """
+    priority = _priority.get()
+    method_priority = METHOD_PRIORITIES.get(method)
+    if priority is None:
+        return NORMAL if method_priority is None else method_priority
+    if method_priority is None:
+        return priority
+    return min(priority, method_priority)
+
+
+def rate_limited(error: BaseException) -> Optional[httpx.Response]:
+    """The 429 response behind an RPC error, if it was rate limited."""
+    while error is not None:
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+            return error.response
+        error = error.__cause__
+    return None
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate_limits() -> Dict[str, float]:
+    limits = {}
+    for item in RPC_RATE_LIMITS.split(","):
+        # endpoint query strings contain "=" too
+        endpoint, _, rate = item.strip().rpartition("=")
+        if endpoint and rate:
+            limits[endpoint] = float(rate)
+    return limits
+
+
+class EndpointLimiter:
+    """
+    Token bucket of one endpoint with prioritized waiters.
+
+    Requests take a token each. A request only takes a token if it leaves
+    the `RESERVED_SHARE` of its class in the bucket, so background reads
+    stop well before the quota a send or a stop loss needs is used up.
+    Waiters are served strictly by priority, then in arrival order.
+
+    A 429 blocks the endpoint for its `Retry-After`, or for an exponential
+    backoff without one, and halves the refill rate; successes restore the
+    rate step by step.
+
+    Waiters live on the event loop, but the synchronous router takes and
+    reports tokens from worker threads, so the bucket state is guarded by
+    a lock.
+    """
+
+    def __init__(self, endpoint: str, rate: float = RPC_RATE_LIMIT, burst: int = RPC_RATE_BURST):
+        self.endpoint = endpoint
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = RATE_LIMIT_BACKOFF_MIN
+        self._lock = threading.Lock()
+
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.granted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.waited = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+
+    @property
+    def blocked_for(self) -> float:
+        return max(self.blocked_until - time.monotonic(), 0.0)
+
+    async def acquire(self, priority: int = NORMAL) -> None:
+        with self._lock:
+            head = self._waiters[0][0] if self._waiters else None
+            if (head is None or priority < head) and self._available(priority):
+                self._take(priority)
+                return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self._wake()
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # granted just before the cancellation
+                with self._lock:
+                    self.tokens += 1
+            raise
+        self.waited += 1
+        self.wait_time += time.monotonic() - started
+
+    def consume(self, priority: int = CRITICAL) -> None:
+        """Takes a token without waiting, the bucket may go into debt."""
+        with self._lock:
+            self._refill()
+            self._take(priority)
+
+    def penalize(self, delay: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttled += 1
+            if delay is None:
+                delay = self.backoff
+                self.backoff = min(self.backoff * 2, RATE_LIMIT_BACKOFF_MAX)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.rate = max(self.rate / 2, self.max_rate * RATE_FLOOR)
+            self.tokens = min(self.tokens, 0.0)
+        logging.warning(f"Rate limited by {self.endpoint.split('?', 1)[0]}, backing off {delay:.2f}s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.backoff = RATE_LIMIT_BACKOFF_MIN
+            if self.rate < self.max_rate:
+                self.rate = min(self.rate + self.max_rate * RATE_RECOVERY, self.max_rate)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            tokens = self.tokens
+        return {
+            "rate": round(self.rate, 2),
+            "tokens": round(tokens, 2),
+            "blocked_for": round(self.blocked_for, 2),
+            "queued": len(self._waiters),
+            "granted": {PRIORITY_NAMES[priority]: count for priority, count in self.granted.items()},
+            "waited": self.waited,
+            "wait_avg": self.wait_time / self.waited if self.waited else None,
+            "throttled": self.throttled,
+        }
+
+    # _refill, _available, _take and _delay expect the lock to be held
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+    def _needed(self, priority: int) -> float:
+        return 1 + RESERVED_SHARE[priority] * self.burst
+
+    def _available(self, priority: int) -> bool:
+        self._refill()
+        return time.monotonic() >= self.blocked_until and self.tokens >= self._needed(priority)
+
+    def _take(self, priority: int) -> None:
+        self.tokens -= 1
+        self.granted[priority] += 1
+
+    def _delay(self, priority: int) -> float:
+        return max(self.blocked_for, (self._needed(priority) - self.tokens) / self.rate, 0.001)
+
+    def _wake(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            with self._lock:
+                granted = self._available(priority)
+                if granted:
+                    heapq.heappop(self._waiters)
+                    self._take(priority)
+                else:
+                    delay = self._delay(priority)
+            if granted:
+                future.set_result(None)
+                continue
+            # a higher priority waiter may arrive before the tokens do
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+class RequestScheduler:
+    """
+    Rate limits of all RPC endpoints, shared by the routers and the sender.
+
+    Every endpoint has its own `EndpointLimiter`. The class of a request
+    comes from its method and from the `rpc_priority` context it runs in,
+    so callers tag whole code paths instead of single calls.
+    """
+    _instance = None
+
+    def __init__(self, rate: float = RPC_RATE_LIMIT, burst: int = RPC_RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.limits = _rate_limits()
+        self._limiters: Dict[str, EndpointLimiter] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = RequestScheduler()
+        return cls._instance
+
+    def limiter(self, endpoint: str) -> EndpointLimiter:
+        limiter = self._limiters.get(endpoint)
+        if limiter is None:
+            # the synchronous router may ask from a worker thread
+            with self._lock:
+                limiter = self._limiters.get(endpoint)
+                if limiter is None:
+                    limiter = EndpointLimiter(endpoint, self.limits.get(endpoint, self.rate), self.burst)
+                    self._limiters[endpoint] = limiter
+        return limiter
+
+    async def acquire(self, endpoint: str, method: str) -> None:
+        await self.limiter(endpoint).acquire(request_priority(method))
+
+    def consume(self, endpoint: str, method: str) -> None:
+        self.limiter(endpoint).consume(request_priority(method))
+
+    def blocked_for(self, endpoint: str) -> float:
+        limiter = self._limiters.get(endpoint)
+        return limiter.blocked_for if limiter else 0.0
+
+    def record(self, endpoint: str, error: Optional[BaseException] = None) -> None:
+        """Feeds the outcome of a request back into the endpoint's limiter."""
+        if error is None:
+            self.limiter(endpoint).record_success()
+            return
+        response = rate_limited(error)
+        if response is not None:
+            self.limiter(endpoint).penalize(retry_after(response))
+
+    def stats(self) -> dict:
+        return {endpoint.split("?", 1)[0]: limiter.stats() for endpoint, limiter in list(self._limiters.items())}
+
+
+if __name__ == "__main__":
+    # Preemption and 429 backoff on a tiny bucket: python -m app.scheduler
+    async def check() -> None:
+        limiter = EndpointLimiter("http://stub", rate=20, burst=4)
+        order = []
+
+        async def request(name: str, priority: int) -> None:
+            await limiter.acquire(priority)
+            order.append(name)
+
+        # background requests stop at half the bucket, the send still goes out at once
+        await asyncio.gather(*(request(f"balance{i}", BACKGROUND) for i in range(3)))
+        assert order[:2] == ["balance0", "balance1"] and limiter.tokens < 3
+        started = time.monotonic()
+        await request("send", CRITICAL)
+        assert order[-1] == "send" and time.monotonic() - started < 0.01
+
+        # queued background reads wait behind a later stop loss read
+        order.clear()
+        limiter.tokens = 0
+        await asyncio.gather(request("telemetry", BACKGROUND), request("stop_loss", CRITICAL))
+        assert order == ["stop_loss", "telemetry"]
+
+        response = httpx.Response(429, headers={"Retry-After": "0.2"}, request=httpx.Request("POST", "http://stub"))
+        error = RuntimeError("rpc error")
+        error.__cause__ = httpx.HTTPStatusError("429", request=response.request, response=response)
+        scheduler = RequestScheduler(rate=20, burst=4)
+        scheduler._limiters["http://stub"] = limiter
+        scheduler.record("http://stub", error)
+        assert 0.15 < limiter.blocked_for <= 0.2 and limiter.rate == 10
+        started = time.monotonic()
+        with rpc_priority(CRITICAL):
+            await scheduler.acquire("http://stub", "get_multiple_accounts")
+        assert time.monotonic() - started >= 0.15
+
+        # the synchronous router takes tokens from worker threads
+        threaded = RequestScheduler(rate=1000, burst=10)
+
+        def consume_many() -> None:
+            for _ in range(1000):
+                threaded.consume("http://threads", "get_account_info")
+                threaded.record("http://threads")
+
+        await asyncio.gather(*(asyncio.to_thread(consume_many) for _ in range(8)))
+        assert threaded.limiter("http://threads").granted[NORMAL] == 8000
+        print(scheduler.stats())
+        print("scheduler checks passed")
+
+    asyncio.run(check())
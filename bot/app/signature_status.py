@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from solana.rpc.commitment import Commitment, Confirmed
+from solders.signature import Signature  # type: ignore
+
+from app.rpc import get_async_client
+
+# getSignatureStatuses accepts up to 256 signatures per request
+MAX_SIGNATURE_STATUSES = 256
+SIGNATURE_STATUS_INTERVAL = 1
+
+COMMITMENT_RANK = {"processed": 0, "confirmed": 1, "finalized": 2}
+
+
+def status_rank(status) -> int:
+    # `TransactionConfirmationStatus.Confirmed` -> "confirmed"
+    return COMMITMENT_RANK[str(status).rsplit(".", 1)[-1].lower()]
+
+
+class SignatureStatusManager:
+    """
+    Checks every pending signature with one `getSignatureStatuses` call per tick.
+
+    Callers get a future per signature and commitment that resolves with its
+    `TransactionStatus` once it failed or reached that commitment.
+    The request rate depends on the tick interval, not on how many
+    transactions are in flight.
+    """
+    _instance = None
+
+    def __init__(self, interval: float = SIGNATURE_STATUS_INTERVAL):
+        self.interval = interval
+        self._watched: Dict[Tuple[Signature, int], asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.requests = 0
+        self.checked = 0
+        self.resolved = 0
+        self.errors = 0
+        self.tick_latency: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SignatureStatusManager()
+        return cls._instance
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def watch(self, signature: Signature, commitment: Commitment = Confirmed) -> asyncio.Future:
+        """Returns a future resolved with the signature's status at `commitment`."""
+        self.start()
+        key = (signature, COMMITMENT_RANK[commitment])
+        future = self._watched.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._watched[key] = future
+        return future
+
+    def forget(self, signature: Signature, commitment: Commitment = Confirmed) -> None:
+        future = self._watched.pop((signature, COMMITMENT_RANK[commitment]), None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._watched),
+            "requests": self.requests,
+            "checked": self.checked,
+            "resolved": self.resolved,
+            "errors": self.errors,
+            "tick_latency": self.tick_latency,
+        }
+
+    async def check(self) -> None:
+        # one lookup per signature, whatever commitments it is watched at
+        signatures = list(dict.fromkeys(signature for signature, _ in self._watched))
+        if not signatures:
+            return
+        started = time.monotonic()
+        chunks = [
+            signatures[i:i + MAX_SIGNATURE_STATUSES]
+            for i in range(0, len(signatures), MAX_SIGNATURE_STATUSES)
+        ]
+        responses = await asyncio.gather(
+            *(get_async_client().get_signature_statuses(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                self.errors += 1
+                logging.error(f"Error checking signature statuses: {str(response)}")
+                continue
+            self.requests += 1
+            self._apply(chunk, response.value)
+        self.tick_latency = time.monotonic() - started
+
+    def _apply(self, signatures: List[Signature], statuses: list) -> None:
+        for signature, status in zip(signatures, statuses):
+            self.checked += 1
+            if status is None or status.confirmation_status is None:
+                continue
+            for wanted in COMMITMENT_RANK.values():
+                future = self._watched.get((signature, wanted))
+                if future is None:
+                    continue
+                if status.err is None and status_rank(status.confirmation_status) < wanted:
+                    continue
+                del self._watched[(signature, wanted)]
+                if not future.done():
+                    future.set_result(status)
+                    self.resolved += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error in signature status loop: {str(e)}")
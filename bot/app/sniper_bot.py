@@ -4,7 +4,6 @@ import logging
 from solders.keypair import Keypair  #  type: ignore
 from solders.pubkey import Pubkey  # type: ignore
 from solders.signature import Signature  # type: ignore
-from solana.rpc.async_api import AsyncClient
 
 from termcolor import colored, cprint
 import asyncio
@@ -12,15 +11,30 @@ import time
 import json
 from datetime import datetime
 
-from app.find_new_token import find_new_tokens
+from app.blockhash import BlockhashCache
+from app.chain_constants import ChainConstants
+from app.confirmation import ConfirmationEngine
+from app.token_accounts import TokenAccountIndex
+from app.price_feed import PriceFeed
+from app.price_poller import PricePoller
+from app.wsol import WsolAccountManager
+from app.discovery import NewPoolEvent, PoolDiscoveryService
+from app.history import PoolHistory
+from app.pool_cache import PoolKeysCache
 from app.track_pnl import RaydiumPnLTracker
-from app.raydium import sell, buy
-from app.config import payer_keypair, MAIN_RPC
+from app.async_raydium import prepare_swap, sell, buy
+from app.async_utils import fetch_pool_keys, get_token_price
+from app.config import PERSISTENT_WSOL, payer_keypair
 from app.global_bot import GlobalBot
+from app.rpc import get_async_client
+from app.scheduler import BACKGROUND, CRITICAL, rpc_priority
 from app.utils import get_token_balance as gtb, find_data
 
 # from playsound import playsound
 
+# Reuse the last tick when the price feed is silent this long
+PRICE_TICK_TIMEOUT = 4.5
+
 
 # logging.basicConfig(
 # #    filename='logs/telegam_bot.log',
@@ -39,6 +53,7 @@ class RaydiumSniper:
         self.mint = None
         self.base = None
         self.pair_address = None
+        self.pool_keys = None
         self.token_name = None
         self.token_symbol = None
         self.sol_in = sol_in
@@ -56,47 +71,55 @@ class RaydiumSniper:
         self.df = pd.DataFrame(self.pool_data)
         self.is_tracking_pnl = True
         self.pnl_percentage = 0
+        self.discovery = PoolDiscoveryService.get_instance()
+        self.pool_events = None
+        self.pool_event = None
 
     async def get_balance(self):
         try:
-            # Mainnet RPC endpoint (replace with your preferred endpoint)
-            rpc_url = "https://api.mainnet-beta.solana.com"
-
-            # Create an async Solana client
-            async with AsyncClient(rpc_url) as client:
-                # Get account info
-                account_info = await client.get_account_info(self.payer_pubkey )
+            # Get account info
+            with rpc_priority(BACKGROUND):
+                account_info = await get_async_client().get_account_info(self.payer_pubkey)
 
-                # Check if account exists
-                if account_info.value is None:
+            # Check if account exists
+            if account_info.value is None:
 
-                    print(f"Account {self.payer_pubkey} does not exist.")
-                    return 0.0
+                print(f"Account {self.payer_pubkey} does not exist.")
+                return 0.0
 
-                # Get balance in lamports (1 SOL = 10^9 lamports)
-                balance_lamports = account_info.value.lamports 
-                # Convert lamports to SOL
-                balance_sol = balance_lamports / 10**9
-                return balance_sol
+            # Get balance in lamports (1 SOL = 10^9 lamports)
+            balance_lamports = account_info.value.lamports
+            # Convert lamports to SOL
+            balance_sol = balance_lamports / 10**9
+            return balance_sol
 
         except Exception as e:
             print(f"Error fetching balance: {e}")
             return 0.0
 
-    async def get_new_raydium_pool(self, max_retries, retry_delay):
+    def set_pool(self, event: NewPoolEvent):
+        self.base, self.mint, self.pair_address = event.base, event.mint, event.pair_address
+        self.pool_event = event
+        self.pool_keys = None
+
+    async def prepare_swap(self):
+        """Fetches the pool keys and precompiles the swap while the buy is being decided."""
+        self.pool_keys = await fetch_pool_keys(str(self.pair_address))
+        if self.pool_keys:
+            prepare_swap(self.pool_keys)
+
+    async def get_new_raydium_pool(self):
         print("\n")
         logging.info("Getting new Raydium pool...")
         cprint("Getting new Raydium pool...", "green", attrs=["bold", "reverse"])
-        for attempt in range(max_retries):
-            try:
-                data = await find_new_tokens(self.RaydiumLPV4)
-                if data:
-                    self.base, self.mint, self.pair_address = data
-                    return data
-            except Exception as e:
-                cprint(f"Error in main loop (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                await asyncio.sleep(retry_delay)
-        return False
+        if self.pool_events is None:
+            self.pool_events = self.discovery.subscribe("sniper")
+        self.discovery.start()
+
+        event = await self.pool_events.get()
+        self.set_pool(event)
+        logging.info(f"Discovery stats: {self.discovery.stats()}")
+        return event.base, event.mint, event.pair_address
 
     async def check_if_rug(self, mint_token=None):
 
@@ -153,11 +176,13 @@ class RaydiumSniper:
         print("Buying token...")
         confirm = False
         for _ in range(4):
-            self.buy_txn_signature, confirm = buy(str(self.pair_address), self.sol_in, self.slippage)
+            self.buy_txn_signature, confirm = await buy(str(self.pair_address), self.pool_keys, sol_in=self.sol_in, slippage=self.slippage, token_symbol=self.token_symbol)
             if confirm:
+                PoolKeysCache.get_instance().pin(self.pair_address)
                 return confirm
-
-            await asyncio.sleep(4)
+            # an expired attempt already waited out its blockhash, rebuild at once
+            if confirm is False:
+                await asyncio.sleep(4)
         return False
 
     async def sell(self, percentage=100):
@@ -165,7 +190,7 @@ class RaydiumSniper:
         print("Selling token...")
         try:
             for attempt in range(3):
-                confirm, self.sell_txn_signature, sold_token_amount = sell(str(self.pair_address), percentage)
+                confirm, self.sell_txn_signature, sold_token_amount = await sell(str(self.pair_address), percentage, token_symbol=self.token_symbol, pool_keys=self.pool_keys)
                 if confirm:
 #                    self.token_amount = gtb(str(self.mint))
 
@@ -175,8 +200,13 @@ Rest amount: {self.token_amount - sold_token_amount} {self.token_symbol}
                     """)
                     print(f"Token {self.token_symbol} sold successfully!!! Rest amount: {self.token_amount - sold_token_amount} {self.token_symbol}")
                     self.token_amount -= sold_token_amount
+                    if percentage == 100:
+                        PoolKeysCache.get_instance().unpin(self.pair_address)
+                    PoolHistory.get_instance().record_trade(
+                        self.pair_address, "sell", self.mint, self.token_symbol,
+                        token_amount=sold_token_amount, pnl=self.pnl_percentage, signature=self.sell_txn_signature
+                    )
                     return confirm
-                await asyncio.sleep(2)
             return False
         except Exception as e:
             logging.error(f"Error in sell: {str(e)}")
@@ -213,14 +243,39 @@ Token Amount: {self.token_amount} {self.token_symbol}
     async def track_pnl_and_sell(self, first_tp, second_tp, sp=None):
         cprint("tracking PnL...", "green", attrs=["bold"])
         logging.info("\nTracking PnL...")
+        if self.pool_keys is None:
+            self.pool_keys = await fetch_pool_keys(str(self.pair_address))
+            if self.pool_keys is None:
+                logging.error("No pool keys found, cannot track PnL")
+                return False
+        price_feed = PriceFeed.get_instance()
+        ticks = await price_feed.track(self.pool_keys)
+        try:
+            return await self._follow_pnl(ticks, first_tp, second_tp, sp)
+        finally:
+            await price_feed.untrack(self.pool_keys["amm_id"], ticks)
+
+    async def next_price(self, ticks):
+        try:
+            tick = await asyncio.wait_for(ticks.get(), PRICE_TICK_TIMEOUT)
+            return tick.price
+        except asyncio.TimeoutError:
+            # no vault change in a while: the last price still holds
+            tick = PriceFeed.get_instance().latest(self.pool_keys["amm_id"])
+            if tick is not None:
+                return tick.price
+            # the stop loss waits on this read
+            with rpc_priority(CRITICAL):
+                current_price, _ = await get_token_price(self.pool_keys)
+            return current_price
+
+    async def _follow_pnl(self, ticks, first_tp, second_tp, sp):
         last_pnl = 0
         err_amount = 0
         while self.is_tracking_pnl:
             try:
-                await asyncio.sleep(4.5)
-                pnl_percentage = self.tracker.get_pnl(
-                    self.bought_price
-                )
+                current_price = await self.next_price(ticks)
+                pnl_percentage = ((current_price - self.bought_price) / self.bought_price) * 100
                 self.pnl_percentage = pnl_percentage
 
                 if self.token_amount < 1:
@@ -287,10 +342,20 @@ Amount: {self.token_amount} {self.token_symbol}
                         logging.error("cannot access local variable 'pnl' where it is not associated with a value")
 
     async def run(self):
+        BlockhashCache.get_instance().start()
+        ConfirmationEngine.get_instance().start()
+        PriceFeed.get_instance().start()
+        PricePoller.get_instance().start()
+        await ChainConstants.get_instance().start()
+        await TokenAccountIndex.get_instance().start()
+        if PERSISTENT_WSOL:
+            await WsolAccountManager.get_instance().start()
 
         while True:
 
-            new_pool = await self.get_new_raydium_pool(5, 2)
+            new_pool = await self.get_new_raydium_pool()
+            # the pool may only be processed yet, keys and template are cheap to drop
+            await self.prepare_swap()
 
             cprint(f"Dexscreener URL with my txn: https://dexscreener.com/solana/{self.pair_address}?maker={self.payer_pubkey}", "yellow", "on_blue")
             cprint(f"GMGN SCREENER URL : https://gmgn.ai/sol/token/{self.mint}", "light_magenta")
@@ -299,6 +364,10 @@ Amount: {self.token_amount} {self.token_symbol}
             rugcheck = await self.check_if_rug()
 
             if rugcheck and new_pool:
+                if not await self.discovery.confirm(self.pool_event):
+                    cprint(f"Pool {self.pair_address} was not confirmed, skipping", "red")
+                    continue
+
                 token_info = f"""
 🚀 [Rug checked!!!](https://rugcheck.xyz/tokens/{self.mint})
 💼 Token: {self.token_symbol} ({self.token_name})
@@ -310,6 +379,8 @@ Amount: {self.token_amount} {self.token_symbol}
                 print(token_info)
 
                 self.tracker = RaydiumPnLTracker(self.pair_address, self.base, self.mint)
+                if not self.pool_keys:
+                    await self.prepare_swap()
                 await asyncio.sleep(2)
                 confirm =  await self.buy()
                 if not confirm:
@@ -319,6 +390,11 @@ Amount: {self.token_amount} {self.token_symbol}
                 elif confirm:
                     await self.get_bought_price()
                     if self.bought_price:
+                        opened_at = time.time()
+                        PoolHistory.get_instance().record_trade(
+                            self.pair_address, "buy", self.mint, self.token_symbol, self.sol_in,
+                            self.token_amount, self.bought_price, signature=self.buy_txn_signature
+                        )
                         buy_info = f"""
     💹 Token Bought Successfully:
     Buy Price: {self.bought_price:.10f} SOL
@@ -328,6 +404,10 @@ Amount: {self.token_amount} {self.token_symbol}
                         print(buy_info)
 
                         sell_confirm = await self.track_pnl_and_sell(70, 300)
+                        PoolHistory.get_instance().record_outcome(
+                            self.pair_address, "sold" if sell_confirm else "not_sold", self.mint, self.token_symbol,
+                            self.sol_in, self.bought_price, self.pnl_percentage, opened_at=opened_at
+                        )
 
                         if sell_confirm:
                             print("Sell transaction confirmed")
@@ -0,0 +1,176 @@
+import base64
+import os
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from solana.transaction import AccountMeta
+from solders.instruction import Instruction  # type: ignore
+from solders.pubkey import Pubkey  # type: ignore
+
+from app.config import payer_keypair
+from app.constants import OPEN_BOOK_PROGRAM, RAY_AUTHORITY_V4, RAY_V4, TOKEN_PROGRAM_ID
+
+# Same bytes as `SWAP_LAYOUT.build(...)`
+SWAP_DATA = struct.Struct("<BQQ")
+SWAP_INSTRUCTION = 9
+SWAP_TEMPLATES_SIZE = 256
+
+
+def new_wsol_seed() -> str:
+    """Seed of a one-shot WSOL account, created and closed by the same swap."""
+    return base64.urlsafe_b64encode(os.urandom(24)).decode('utf-8')
+
+
+class SwapTemplate:
+    """
+    Raydium v4 swap instruction for one pool with everything but the amounts precompiled.
+
+    The pool and market account metas are built once. Routes registered with
+    `prepare_route` (the payer's token account and WSOL account) keep their
+    full account list, so a trade only packs the 17 bytes of instruction data.
+
+    Without a persistent WSOL account every swap goes through a fresh seeded
+    WSOL account. `prepare_wsol_route` picks that seed ahead of the trade and
+    precompiles its route; `take_wsol_seed` hands it to a single swap.
+    """
+
+    def __init__(self, pool_keys: dict, owner: Pubkey = None):
+        self.amm_id = pool_keys["amm_id"]
+        self._pool_metas = [
+            AccountMeta(pubkey=TOKEN_PROGRAM_ID, is_signer=False, is_writable=False),
+            AccountMeta(pubkey=pool_keys["amm_id"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=RAY_AUTHORITY_V4, is_signer=False, is_writable=False),
+            AccountMeta(pubkey=pool_keys["open_orders"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["target_orders"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["base_vault"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["quote_vault"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=OPEN_BOOK_PROGRAM, is_signer=False, is_writable=False),
+            AccountMeta(pubkey=pool_keys["market_id"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["bids"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["asks"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["event_queue"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["market_base_vault"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["market_quote_vault"], is_signer=False, is_writable=True),
+            AccountMeta(pubkey=pool_keys["market_authority"], is_signer=False, is_writable=False),
+        ]
+        self._owner_meta = AccountMeta(pubkey=owner or payer_keypair.pubkey(), is_signer=True, is_writable=False)
+        self._routes: Dict[Tuple[Pubkey, Pubkey], List[AccountMeta]] = {}
+        # side -> (token account, seed) of the prepared one-shot WSOL routes
+        self._wsol_seeds: Dict[str, Tuple[Pubkey, str]] = {}
+        self._one_shot_routes: Dict[Tuple[Pubkey, Pubkey], List[AccountMeta]] = {}
+
+    def _build_keys(self, token_account_in: Pubkey, token_account_out: Pubkey) -> List[AccountMeta]:
+        return [
+            *self._pool_metas,
+            AccountMeta(pubkey=token_account_in, is_signer=False, is_writable=True),
+            AccountMeta(pubkey=token_account_out, is_signer=False, is_writable=True),
+            self._owner_meta
+        ]
+
+    def prepare_route(self, token_account_in: Pubkey, token_account_out: Pubkey) -> None:
+        route = (token_account_in, token_account_out)
+        if route not in self._routes:
+            self._routes[route] = self._build_keys(token_account_in, token_account_out)
+
+    def prepare_wsol_route(self, side: str, token_account: Pubkey) -> None:
+        """Precompiles the route of the next "buy" or "sell" through a seeded WSOL account."""
+        prepared = self._wsol_seeds.get(side)
+        if prepared is not None and prepared[0] == token_account:
+            return
+        if prepared is not None:
+            self._one_shot_routes.pop(self._wsol_route(side, *prepared), None)
+        seed = new_wsol_seed()
+        route = self._wsol_route(side, token_account, seed)
+        self._wsol_seeds[side] = (token_account, seed)
+        self._one_shot_routes[route] = self._build_keys(*route)
+
+    def take_wsol_seed(self, side: str, token_account: Pubkey) -> Optional[str]:
+        """The prepared seed for this swap, None if there is none for the token account."""
+        prepared = self._wsol_seeds.get(side)
+        if prepared is None or prepared[0] != token_account:
+            return None
+        # two swaps on one seed would both create the same account
+        del self._wsol_seeds[side]
+        return prepared[1]
+
+    def _wsol_route(self, side: str, token_account: Pubkey, seed: str) -> Tuple[Pubkey, Pubkey]:
+        wsol_account = Pubkey.create_with_seed(self._owner_meta.pubkey, seed, TOKEN_PROGRAM_ID)
+        return (wsol_account, token_account) if side == "buy" else (token_account, wsol_account)
+
+    def swap_instruction(
+            self,
+            amount_in: int,
+            minimum_amount_out: int,
+            token_account_in: Pubkey,
+            token_account_out: Pubkey
+    ) -> Instruction:
+        route = (token_account_in, token_account_out)
+        keys = self._routes.get(route) or self._one_shot_routes.pop(route, None)
+        if keys is None:
+            # per-trade WSOL accounts have a fresh address every time
+            keys = self._build_keys(token_account_in, token_account_out)
+        data = SWAP_DATA.pack(SWAP_INSTRUCTION, int(amount_in), int(minimum_amount_out))
+        return Instruction(RAY_V4, data, keys)
+
+
+class SwapTemplates:
+    """Bounded registry of swap templates keyed by AMM id."""
+    _instance = None
+
+    def __init__(self, maxsize: int = SWAP_TEMPLATES_SIZE):
+        self.maxsize = maxsize
+        self._templates: OrderedDict[str, SwapTemplate] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SwapTemplates()
+        return cls._instance
+
+    def get(self, pool_keys: dict) -> SwapTemplate:
+        """Returns the pool's template, building it on a miss."""
+        key = str(pool_keys["amm_id"])
+        template = self._templates.get(key)
+        if template is None:
+            self.misses += 1
+            template = SwapTemplate(pool_keys)
+            self._templates[key] = template
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        else:
+            self.hits += 1
+        self._templates.move_to_end(key)
+        return template
+
+    def prepare(self, pool_keys: dict, token_account: Pubkey, wsol_account: Optional[Pubkey] = None) -> SwapTemplate:
+        """
+        Builds the pool's template ahead of the trade.
+
+        Args:
+            pool_keys: Decoded pool keys of the pool.
+            token_account: The payer's account for the traded token.
+            wsol_account: The persistent WSOL account, if swaps go through one,
+                otherwise the next buy and sell get seeded WSOL routes.
+        """
+        template = self.get(pool_keys)
+        if wsol_account is not None:
+            template.prepare_route(wsol_account, token_account)
+            template.prepare_route(token_account, wsol_account)
+        else:
+            template.prepare_wsol_route("buy", token_account)
+            template.prepare_wsol_route("sell", token_account)
+        return template
+
+    def discard(self, amm_id) -> None:
+        self._templates.pop(str(amm_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._templates),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from solana.rpc.commitment import Processed
+from solana.rpc.types import MemcmpOpts, TokenAccountOpts
+from solana.rpc.websocket_api import connect
+from websockets.exceptions import ConnectionClosedError, ProtocolError
+
+from solders.pubkey import Pubkey  # type: ignore
+from solders.rpc.responses import ProgramNotification  # type: ignore
+
+from app.config import WSS_RPC, payer_keypair
+from app.constants import TOKEN_PROGRAM_ID
+from app.decoders import TOKEN_ACCOUNT_DECODER
+from app.layouts import ACCOUNT_LAYOUT
+from app.rpc import get_async_client
+from app.scheduler import BACKGROUND, prioritized
+
+RECONCILE_INTERVAL = 60
+RECONNECT_DELAY = 2
+
+
+class TokenAccountEntry(NamedTuple):
+    account: Pubkey
+    amount: int
+    decimals: Optional[int]
+
+
+class TokenAccountIndex:
+    """
+    In-memory index of the payer's token accounts and balances.
+
+    Seeded once with `getTokenAccountsByOwner`, then kept current by a
+    `programSubscribe` on the token program filtered by owner. A periodic
+    reconciliation re-reads the accounts and logs any drift it corrects.
+    Every mint remembers the slot it was last updated at, so a snapshot
+    never overwrites a newer subscription update.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            owner: Pubkey = None,
+            wss: str = WSS_RPC,
+            reconcile_interval: float = RECONCILE_INTERVAL
+    ):
+        self.owner = owner or payer_keypair.pubkey()
+        self.wss = wss
+        self.reconcile_interval = reconcile_interval
+
+        self._accounts: Dict[Pubkey, TokenAccountEntry] = {}
+        self._slots: Dict[Pubkey, int] = {}
+        self._last_slot = 0
+        self._tasks = []
+
+        self.ready = False
+        self.subscribed = False
+        self.updates = 0
+        self.drift = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = TokenAccountIndex()
+        return cls._instance
+
+    def get_account(self, mint: Pubkey) -> Optional[Pubkey]:
+        entry = self._accounts.get(mint)
+        return entry.account if entry else None
+
+    def get_raw_amount(self, mint: Pubkey) -> Optional[int]:
+        entry = self._accounts.get(mint)
+        return entry.amount if entry else None
+
+    def get_balance(self, mint: Pubkey, decimals: Optional[int] = None) -> Optional[float]:
+        """UI balance of the mint, None if the index has no account for it."""
+        entry = self._accounts.get(mint)
+        if entry is None:
+            return None
+        decimals = entry.decimals if decimals is None else decimals
+        if decimals is None:
+            return None
+        return entry.amount / 10**decimals
+
+    def remove(self, mint: Pubkey) -> None:
+        """Drops a closed account, snapshots up to the latest seen slot keep it dropped."""
+        self._accounts.pop(mint, None)
+        self._slots[mint] = self._last_slot
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self.seed()
+        self._tasks = [
+            asyncio.create_task(self._subscribe()),
+            asyncio.create_task(self._reconcile())
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready = False
+        self.subscribed = False
+
+    async def fetch_accounts(self) -> Tuple[int, Dict[Pubkey, TokenAccountEntry]]:
+        """Snapshot of the payer's token accounts and the slot it was read at."""
+        response = await get_async_client().get_token_accounts_by_owner_json_parsed(
+            self.owner,
+            TokenAccountOpts(program_id=TOKEN_PROGRAM_ID),
+            Processed
+        )
+        accounts = {}
+        for keyed_account in response.value:
+            info = keyed_account.account.data.parsed["info"]
+            token_amount = info["tokenAmount"]
+            accounts[Pubkey.from_string(info["mint"])] = TokenAccountEntry(
+                keyed_account.pubkey,
+                int(token_amount["amount"]),
+                token_amount["decimals"]
+            )
+        return response.context.slot, accounts
+
+    async def seed(self) -> None:
+        try:
+            self._merge(*await self.fetch_accounts())
+            self.ready = True
+            logging.info(f"Token account index seeded with {len(self._accounts)} accounts")
+        except Exception as e:
+            logging.error(f"Error seeding token account index: {str(e)}")
+
+    def _merge(self, slot: int, accounts: Dict[Pubkey, TokenAccountEntry]) -> List[Pubkey]:
+        """Applies a snapshot to the mints it is newer for, returns the mints it changed."""
+        self._last_slot = max(self._last_slot, slot)
+        changed = []
+        for mint in set(accounts) | set(self._accounts):
+            if self._slots.get(mint, -1) > slot:
+                # a subscription update arrived while the snapshot was read
+                continue
+            entry = accounts.get(mint)
+            if _balance_key(entry) != _balance_key(self._accounts.get(mint)):
+                changed.append(mint)
+            if entry is None:
+                self._accounts.pop(mint, None)
+            else:
+                self._accounts[mint] = entry
+            self._slots[mint] = slot
+        return changed
+
+    def _apply(self, account: Pubkey, data: bytes, slot: int) -> None:
+        self._last_slot = max(self._last_slot, slot)
+        if len(data) < ACCOUNT_LAYOUT.sizeof():
+            return
+        mint_bytes, owner_bytes, amount = TOKEN_ACCOUNT_DECODER.unpack(data)
+        if Pubkey.from_bytes(owner_bytes) != self.owner:
+            return
+        mint = Pubkey.from_bytes(mint_bytes)
+        if self._slots.get(mint, -1) > slot:
+            return
+        previous = self._accounts.get(mint)
+        decimals = previous.decimals if previous else None
+        self._accounts[mint] = TokenAccountEntry(account, amount, decimals)
+        self._slots[mint] = slot
+        self.updates += 1
+
+    async def _subscribe(self) -> None:
+        async for websocket in connect(self.wss):
+            try:
+                await websocket.program_subscribe(
+                    TOKEN_PROGRAM_ID,
+                    Processed,
+                    encoding="base64",
+                    filters=[ACCOUNT_LAYOUT.sizeof(), MemcmpOpts(offset=32, bytes=str(self.owner))]
+                )
+                self.subscribed = True
+                # accounts could have changed while we were disconnected
+                await self.seed()
+
+                async for messages in websocket:
+                    for message in messages:
+                        if isinstance(message, ProgramNotification):
+                            keyed_account = message.result.value
+                            self._apply(keyed_account.pubkey, keyed_account.account.data, message.result.context.slot)
+
+            except (ProtocolError, ConnectionClosedError) as err:
+                logging.error(f"Token account subscription closed: {str(err)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logging.error(f"Token account subscription error: {str(err)}")
+            self.subscribed = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    @prioritized(BACKGROUND)
+    async def _reconcile(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                drifted = self._merge(*await self.fetch_accounts())
+            except Exception as e:
+                logging.error(f"Error reconciling token account index: {str(e)}")
+                continue
+
+            if drifted:
+                self.drift += len(drifted)
+                logging.warning(f"Token account index drift corrected for {len(drifted)} mints: {drifted}")
+
+
+def _balance_key(entry: Optional[TokenAccountEntry]) -> Optional[tuple]:
+    return (entry.account, entry.amount) if entry else None
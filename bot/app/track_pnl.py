@@ -7,7 +7,6 @@ import requests
 
 from solders.pubkey import Pubkey  # type: ignore
 from solders.signature import Signature  # type: ignore
-from solana.rpc.api import Client
 from solana.rpc.async_api import AsyncClient
 from solana.rpc.commitment import Commitment
 from solana.rpc.websocket_api import connect, SolanaWsClientProtocol
@@ -17,11 +16,13 @@ from termcolor import colored, cprint
 
 from datetime import datetime
 
+from app.rpc import get_client
+
 
 
 class RaydiumPnLTracker:
-    def __init__(self, pool_id, from_token, to_token, amount=0.001, rpc_url="https://api.mainnet-beta.solana.com"):
-        self.client = Client(rpc_url)
+    def __init__(self, pool_id, from_token, to_token, amount=0.001, rpc_url=None):
+        self.client = get_client(rpc_url)
         self.pool_id = pool_id
         self.from_token = from_token
         self.to_token = to_token
@@ -6,6 +6,7 @@ import requests
 import logging
 
 from solana.rpc.commitment import Processed
+from solana.rpc.types import TokenAccountOpts
 from solana.transaction import AccountMeta, Signature
 from solders.instruction import Instruction  # type: ignore
 from solders.keypair import Keypair  # type: ignore
@@ -13,7 +14,8 @@ from solders.pubkey import Pubkey  # type: ignore
 
 from termcolor import cprint
 
-from app.config import RPC, client, payer_keypair, setup_logging
+from app.config import payer_keypair, setup_logging
+from app.rpc import get_client
 from app.constants import (
     OPEN_BOOK_PROGRAM,
     RAY_AUTHORITY_V4,
@@ -21,11 +23,17 @@ from app.constants import (
     TOKEN_PROGRAM_ID,
     SOL
 )
-from app.layouts import (
-    LIQUIDITY_STATE_LAYOUT_V4,
-    MARKET_STATE_LAYOUT_V3,
-    SWAP_LAYOUT
+from app.chain_constants import get_market_authority
+from app.decoders import (
+    AMM_MARKET_DECODER,
+    AMM_POOL_KEYS_DECODER,
+    MARKET_POOL_KEYS_DECODER,
+    TOKEN_ACCOUNT_DECODER
 )
+from app.pool_cache import PoolKeysCache
+from app.layouts import SWAP_LAYOUT
+
+client = get_client()
 
 # logger = setup_logging()
 
@@ -90,35 +98,68 @@ def make_swap_instruction(
         return None
 
 
+def pool_keys_from_decoded(amm_id: Pubkey, amm_data_decoded: dict, market_decoded: dict) -> dict:
+    marketId = Pubkey.from_bytes(amm_data_decoded["serumMarket"])
+
+    return {
+        "amm_id": amm_id,
+        "base_mint": Pubkey.from_bytes(market_decoded["base_mint"]),
+        "quote_mint": Pubkey.from_bytes(market_decoded["quote_mint"]),
+        "base_decimals": amm_data_decoded["coinDecimals"],
+        "quote_decimals": amm_data_decoded["pcDecimals"],
+        "swap_fee_numerator": amm_data_decoded["swapFeeNumerator"],
+        "swap_fee_denominator": amm_data_decoded["swapFeeDenominator"],
+        "open_orders": Pubkey.from_bytes(amm_data_decoded["ammOpenOrders"]),
+        "target_orders": Pubkey.from_bytes(amm_data_decoded["ammTargetOrders"]),
+        "base_vault": Pubkey.from_bytes(amm_data_decoded["poolCoinTokenAccount"]),
+        "quote_vault": Pubkey.from_bytes(amm_data_decoded["poolPcTokenAccount"]),
+        "withdrawQueue": Pubkey.from_bytes(amm_data_decoded["poolWithdrawQueue"]),
+        "market_id": marketId,
+        "market_authority": get_market_authority(marketId, market_decoded["vault_signer_nonce"]),
+        "market_base_vault": Pubkey.from_bytes(market_decoded["base_vault"]),
+        "market_quote_vault": Pubkey.from_bytes(market_decoded["quote_vault"]),
+        "bids": Pubkey.from_bytes(market_decoded["bids"]),
+        "asks": Pubkey.from_bytes(market_decoded["asks"]),
+        "event_queue": Pubkey.from_bytes(market_decoded["event_queue"])
+    }
+
+
+def decode_pool_keys(amm_id: Pubkey, amm_data: bytes, market_data: bytes) -> dict:
+    return pool_keys_from_decoded(
+        amm_id,
+        AMM_POOL_KEYS_DECODER.decode(amm_data),
+        MARKET_POOL_KEYS_DECODER.decode(market_data)
+    )
+
+
+def decode_many_pool_keys(amm_ids: list, amm_datas: list, market_datas: list) -> list:
+    return [
+        pool_keys_from_decoded(amm_id, amm_data_decoded, market_decoded)
+        for amm_id, amm_data_decoded, market_decoded in zip(
+            amm_ids,
+            AMM_POOL_KEYS_DECODER.decode_many(amm_datas),
+            MARKET_POOL_KEYS_DECODER.decode_many(market_datas)
+        )
+    ]
+
+
+def get_market_id(amm_data: bytes) -> Pubkey:
+    return Pubkey.from_bytes(AMM_MARKET_DECODER.unpack(amm_data)[0])
+
+
 def fetch_pool_keys(pair_address: str) -> dict:
     try:
-        amm_id = Pubkey.from_string(pair_address)
-        amm_data = client.get_account_info_json_parsed(amm_id).value.data
-        amm_data_decoded = LIQUIDITY_STATE_LAYOUT_V4.parse(amm_data)
-        marketId = Pubkey.from_bytes(amm_data_decoded.serumMarket)
-        marketInfo = client.get_account_info_json_parsed(marketId).value.data
-        market_decoded = MARKET_STATE_LAYOUT_V3.parse(marketInfo)
-
-        pool_keys = {
-            "amm_id": amm_id,
-            "base_mint": Pubkey.from_bytes(market_decoded.base_mint),
-            "quote_mint": Pubkey.from_bytes(market_decoded.quote_mint),
-            "base_decimals": amm_data_decoded.coinDecimals,
-            "quote_decimals": amm_data_decoded.pcDecimals,
-            "open_orders": Pubkey.from_bytes(amm_data_decoded.ammOpenOrders),
-            "target_orders": Pubkey.from_bytes(amm_data_decoded.ammTargetOrders),
-            "base_vault": Pubkey.from_bytes(amm_data_decoded.poolCoinTokenAccount),
-            "quote_vault": Pubkey.from_bytes(amm_data_decoded.poolPcTokenAccount),
-            "withdrawQueue": Pubkey.from_bytes(amm_data_decoded.poolWithdrawQueue),
-            "market_id": marketId,
-            "market_authority": Pubkey.create_program_address([bytes(marketId)] + [bytes([market_decoded.vault_signer_nonce])] + [bytes(7)], OPEN_BOOK_PROGRAM),
-            "market_base_vault": Pubkey.from_bytes(market_decoded.base_vault),
-            "market_quote_vault": Pubkey.from_bytes(market_decoded.quote_vault),
-            "bids": Pubkey.from_bytes(market_decoded.bids),
-            "asks": Pubkey.from_bytes(market_decoded.asks),
-            "event_queue": Pubkey.from_bytes(market_decoded.event_queue)
-        }
-
+        cache = PoolKeysCache.get_instance()
+        pool_keys = cache.get(pair_address)
+        if pool_keys is not None:
+            return pool_keys
+
+        amm_id = Pubkey.from_string(str(pair_address))
+        amm_data = client.get_account_info(amm_id, encoding="base64").value.data
+        marketId = get_market_id(amm_data)
+        marketInfo = client.get_account_info(marketId, encoding="base64").value.data
+        pool_keys = decode_pool_keys(amm_id, amm_data, marketInfo)
+        cache.put(amm_id, pool_keys)
         return pool_keys
     except Exception as e:
         # cprint(f"Error fetching pool keys in utils.py module: {e}",
@@ -146,31 +187,36 @@ def find_data(data: Union[dict, list], field: str) -> Optional[str]:
 
 def get_token_balance(mint_str: str):
     try:
-        pubkey_str = str(payer_keypair.pubkey())
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json"
-        }
-
-        payload = {
-            "id": 1,
-            "jsonrpc": "2.0",
-            "method": "getTokenAccountsByOwner",
-            "params": [
-                pubkey_str,
-                {"mint": mint_str},
-                {"encoding": "jsonParsed"}
-            ],
-        }
-
-        response = requests.post(RPC, json=payload, headers=headers)
-        ui_amount = find_data(response.json(), "uiAmount")
+        response = client.get_token_accounts_by_owner_json_parsed(
+            payer_keypair.pubkey(),
+            TokenAccountOpts(mint=Pubkey.from_string(mint_str))
+        )
+        ui_amount = find_data(json.loads(response.to_json()), "uiAmount")
         return float(ui_amount)
     except Exception as e:
         logging.error(f"Error fetching token balance: {str(e)}")
         return None
 
 
+def check_txn_meta(txn_res, token_name: str = None, retries: int = 1) -> bool:
+    """
+    Returns True if the transaction succeeded, False if it failed.
+    Raises if the transaction is not available yet.
+    """
+    txn_json = json.loads(txn_res.value.transaction.meta.to_json())
+
+    if txn_json['err'] is None:
+        # cprint(f"Transaction confirmed... try count: {retries}",
+        #        "yellow", attrs=["bold", "reverse"])
+        logging.debug(f"\n  {token_name} -   Transaction confirmed... try count: {retries}\n")
+        return True
+
+    # cprint("Transaction failed!!!",
+    #        "red", attrs=["bold", "reverse"])
+    logging.error(f" {token_name} -  Transaction failed!!!")
+    return False
+
+
 def confirm_txn(
         txn_sig: Signature,
         token_name: str = None,
@@ -184,22 +230,7 @@ def confirm_txn(
             txn_res = client.get_transaction(txn_sig, encoding="json",
                                              commitment="confirmed",
                                              max_supported_transaction_version=0)
-            txn_json = json.loads(txn_res.value.transaction.meta.to_json())
-
-            if txn_json['err'] is None:
-                # cprint(f"Transaction confirmed... try count: {retries}",
-                #        "yellow", attrs=["bold", "reverse"])
-                logging.debug(f"\n  {token_name} -   Transaction confirmed... try count: {retries}\n")
-                return True
-
-            # cprint("Error: Transaction not confirmed. Retrying...",
-            #        "magenta", attrs=["bold", "reverse"])
-            logging.error(f" {token_name} -  Transaction not confirmed. Retrying...")
-            if txn_json['err']:
-                # cprint("Transaction failed!!!",
-                #        "red", attrs=["bold", "reverse"])
-                logging.error(f" {token_name} -  Transaction failed!!!")
-                return False
+            return check_txn_meta(txn_res, token_name, retries)
         except Exception as e:
             cprint(f" -- {token_name} --  Awaiting confirmation... try count: {retries}...")
             # logging.error(f"Awaiting confirmation... try count: {retries}. Error: {str(e)}")
@@ -225,43 +256,81 @@ def get_pair_address(mint):
         return None
 
 
-def get_token_price(pool_keys: dict) -> tuple:
-    try:
-        base_vault = pool_keys["base_vault"]
-        quote_vault = pool_keys["quote_vault"]
-        base_decimal = pool_keys["base_decimals"]
-        quote_decimal = pool_keys["quote_decimals"]
-        base_mint = pool_keys["base_mint"]
+def parse_token_price(pool_keys: dict, balances: list) -> tuple:
+    base_decimal = pool_keys["base_decimals"]
+    quote_decimal = pool_keys["quote_decimals"]
+    base_mint = pool_keys["base_mint"]
 
-        balances_response = client.get_multiple_accounts_json_parsed(
-            [base_vault, quote_vault],
-            Processed
-        )
-        balances = balances_response.value
+    pool_coin_account = balances[0]
+    pool_pc_account = balances[1]
 
-        pool_coin_account = balances[0]
-        pool_pc_account = balances[1]
+    pool_coin_account_balance = pool_coin_account.data.parsed['info']['tokenAmount']['uiAmount']
+    pool_pc_account_balance = pool_pc_account.data.parsed['info']['tokenAmount']['uiAmount']
 
-        pool_coin_account_balance = pool_coin_account.data.parsed['info']['tokenAmount']['uiAmount']
-        pool_pc_account_balance = pool_pc_account.data.parsed['info']['tokenAmount']['uiAmount']
+    if pool_coin_account_balance is None or pool_pc_account_balance is None:
+        return None, None
+
+    sol_mint_address = Pubkey.from_string(SOL)
+
+    if base_mint == sol_mint_address:
+        base_reserve = pool_coin_account_balance
+        quote_reserve = pool_pc_account_balance
+        token_decimal = quote_decimal
+    else:
+        base_reserve = pool_pc_account_balance
+        quote_reserve = pool_coin_account_balance
+        token_decimal = base_decimal
+
+    token_price = base_reserve / quote_reserve
+
+    return token_price, token_decimal
 
-        if pool_coin_account_balance is None or pool_pc_account_balance is None:
+
+def price_from_vault_amounts(pool_keys: dict, base_vault_amount: int, quote_vault_amount: int) -> tuple:
+    """
+    Same as `parse_token_price`, from the raw amounts of the two vault accounts.
+
+    Returns:
+        (token_price, token_decimal), the price in SOL per token.
+    """
+    base_balance = base_vault_amount / 10**pool_keys["base_decimals"]
+    quote_balance = quote_vault_amount / 10**pool_keys["quote_decimals"]
+    if str(pool_keys["base_mint"]) == SOL:
+        if not quote_balance:
             return None, None
+        return base_balance / quote_balance, pool_keys["quote_decimals"]
+    if not base_balance:
+        return None, None
+    return quote_balance / base_balance, pool_keys["base_decimals"]
 
-        sol_mint_address = Pubkey.from_string(SOL)
 
-        if base_mint == sol_mint_address:
-            base_reserve = pool_coin_account_balance
-            quote_reserve = pool_pc_account_balance
-            token_decimal = quote_decimal
-        else:
-            base_reserve = pool_pc_account_balance
-            quote_reserve = pool_coin_account_balance
-            token_decimal = base_decimal
+def parse_vault_amounts(accounts: list) -> Optional[tuple]:
+    """Raw token amounts of base64 encoded (base_vault, quote_vault) accounts."""
+    if any(account is None for account in accounts):
+        return None
+    return tuple(TOKEN_ACCOUNT_DECODER.unpack(account.data)[2] for account in accounts)
+
 
-        token_price = base_reserve / quote_reserve
+def get_pool_reserves(pool_keys: dict) -> Optional[tuple]:
+    """
+    Returns:
+        (base_vault_amount, quote_vault_amount) in raw units.
+    """
+    response = client.get_multiple_accounts(
+        [pool_keys["base_vault"], pool_keys["quote_vault"]],
+        Processed,
+        encoding="base64"
+    )
+    return parse_vault_amounts(response.value)
 
-        return token_price, token_decimal
+
+def get_token_price(pool_keys: dict) -> tuple:
+    try:
+        balances_response = client.get_multiple_accounts_json_parsed(
+            [pool_keys["base_vault"], pool_keys["quote_vault"]],
+            Processed
+        )
+        return parse_token_price(pool_keys, balances_response.value)
 
     except Exception as e:
         # cprint(f"Error occurred: {e}", "red", attrs=["bold", "reverse"])
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price  # type: ignore
+from solders.system_program import TransferParams, transfer
+
+from spl.token.instructions import (
+    CloseAccountParams,
+    SyncNativeParams,
+    close_account,
+    create_idempotent_associated_token_account,
+    sync_native
+)
+
+from app.blockhash import BlockhashCache
+from app.broadcast import TransactionSender
+from app.chain_constants import get_payer_token_account
+from app.config import UNIT_PRICE, payer_keypair
+from app.constants import SOL_DECIMAL, TOKEN_PROGRAM_ID, WSOL
+from app.raydium import sign_transaction
+from app.token_accounts import TokenAccountIndex
+
+# Balances of the wrapped SOL account, in lamports
+WSOL_MIN_BALANCE = int(float(os.getenv("WSOL_MIN_BALANCE", "0.05")) * SOL_DECIMAL)
+WSOL_TARGET_BALANCE = int(float(os.getenv("WSOL_TARGET_BALANCE", "0.1")) * SOL_DECIMAL)
+WSOL_MAX_BALANCE = int(float(os.getenv("WSOL_MAX_BALANCE", "0.5")) * SOL_DECIMAL)
+WSOL_CHECK_INTERVAL = 10
+WSOL_UNIT_BUDGET = 50_000
+
+
+class WsolAccountManager:
+    """
+    Owns the payer's wrapped SOL associated token account.
+
+    Swaps spend from and pay into this account directly, so the trade
+    transaction carries no create/init/fund/close instructions. A background
+    task tops the account up when it falls below the minimum and sweeps it
+    back to native SOL when sells leave more than the maximum in it.
+
+    Swaps reserve the lamports they spend for as long as they are in
+    flight, so concurrent buys cannot count the same balance twice. The
+    background task leaves the account alone while any reservation is held,
+    and no reservation is granted while it is changing the account.
+    """
+    _instance = None
+
+    def __init__(
+            self,
+            min_balance: int = WSOL_MIN_BALANCE,
+            target_balance: int = WSOL_TARGET_BALANCE,
+            max_balance: int = WSOL_MAX_BALANCE,
+            check_interval: float = WSOL_CHECK_INTERVAL
+    ):
+        self.min_balance = min_balance
+        self.target_balance = target_balance
+        self.max_balance = max_balance
+        self.check_interval = check_interval
+
+        self.account = get_payer_token_account(WSOL)
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._reserved = 0
+        self._reservations = 0
+
+        self.top_ups = 0
+        self.sweeps = 0
+        self.errors = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = WsolAccountManager()
+        return cls._instance
+
+    @property
+    def balance(self) -> Optional[int]:
+        """Wrapped lamports in the account, None if it does not exist or is unknown."""
+        token_accounts = TokenAccountIndex.get_instance()
+        if not token_accounts.ready or token_accounts.get_account(WSOL) != self.account:
+            return None
+        return token_accounts.get_raw_amount(WSOL)
+
+    def can_spend(self, lamports: int) -> bool:
+        balance = self.balance
+        return balance is not None and balance - self._reserved >= lamports
+
+    def reserve(self, lamports: int) -> bool:
+        """
+        Reserves `lamports` of the balance for a swap through the account.
+
+        Sells reserve 0: they only pay into the account, but it must not be
+        swept under them. Every granted reservation has to be released.
+        """
+        if self._lock.locked() or not self.can_spend(lamports):
+            return False
+        self._reserved += lamports
+        self._reservations += 1
+        return True
+
+    def release(self, lamports: int) -> None:
+        # the processed subscription update lands before the swap is confirmed,
+        # so the index balance already shows what the swap spent
+        self._reserved -= lamports
+        self._reservations -= 1
+
+    @property
+    def ready(self) -> bool:
+        return self.balance is not None
+
+    async def start(self) -> None:
+        """Funds the account once, then keeps it within bounds in the background."""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            await self.rebalance()
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Error preparing WSOL account: {str(e)}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, sweep: bool = False) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if sweep:
+            await self.sweep()
+
+    async def rebalance(self) -> None:
+        if not TokenAccountIndex.get_instance().ready:
+            # An unknown balance must not be mistaken for a missing account
+            return
+        if self._reservations:
+            return
+        async with self._lock:
+            balance = self.balance
+            if balance is None:
+                await self._send(self._top_up_instructions(self.target_balance, create=True))
+                self.top_ups += 1
+            elif balance < self.min_balance:
+                await self._send(self._top_up_instructions(self.target_balance - balance))
+                self.top_ups += 1
+            elif balance > self.max_balance:
+                await self._sweep()
+
+    async def sweep(self) -> None:
+        """Closes the account, unwrapping everything in it back to native SOL."""
+        if self._reservations:
+            logging.warning(f"Not sweeping the WSOL account, {self._reservations} swaps are using it")
+            return
+        async with self._lock:
+            if self.balance is not None:
+                await self._sweep()
+
+    def stats(self) -> dict:
+        return {
+            "balance": self.balance,
+            "reserved": self._reserved,
+            "reservations": self._reservations,
+            "top_ups": self.top_ups,
+            "sweeps": self.sweeps,
+            "errors": self.errors,
+        }
+
+    async def _sweep(self) -> None:
+        # The account is recreated and refunded by the next rebalance
+        await self._send([
+            close_account(CloseAccountParams(TOKEN_PROGRAM_ID, self.account, payer_keypair.pubkey(), payer_keypair.pubkey()))
+        ])
+        TokenAccountIndex.get_instance().remove(WSOL)
+        self.sweeps += 1
+
+    def _top_up_instructions(self, lamports: int, create: bool = False) -> list:
+        instructions = []
+        if create:
+            instructions.append(create_idempotent_associated_token_account(payer_keypair.pubkey(), payer_keypair.pubkey(), WSOL))
+        instructions.append(
+            transfer(TransferParams(from_pubkey=payer_keypair.pubkey(), to_pubkey=self.account, lamports=int(lamports)))
+        )
+        instructions.append(sync_native(SyncNativeParams(TOKEN_PROGRAM_ID, self.account)))
+        return instructions
+
+    async def _send(self, instructions: list) -> None:
+        instructions = [
+            set_compute_unit_limit(WSOL_UNIT_BUDGET),
+            set_compute_unit_price(UNIT_PRICE),
+            *instructions
+        ]
+        blockhash, last_valid_block_height = await BlockhashCache.get_instance().get()
+        txn = sign_transaction(instructions, blockhash)
+        txn_sig, confirmed = await TransactionSender.get_instance().send(txn, last_valid_block_height)
+        if not confirmed:
+            raise RuntimeError(f"WSOL account transaction {txn_sig} failed")
+        # Pick up the new balance without waiting for the subscription
+        await TokenAccountIndex.get_instance().seed()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error rebalancing WSOL account: {str(e)}")
@@ -12,10 +12,22 @@ from solana.exceptions import SolanaRpcException
 from dotenv import load_dotenv
 
 
-from app.utils import get_token_price, fetch_pool_keys
+from app.async_utils import get_token_price, fetch_pool_keys, get_sol_balance
 from app.track_pnl import RaydiumPnLTracker
-from app.raydium import sell, buy
-from app.config import RPC, setup_logging, payer_pubkey, client as solana_client
+from app.async_raydium import prepare_swap, sell, buy
+from app.blockhash import BlockhashCache
+from app.chain_constants import ChainConstants
+from app.confirmation import ConfirmationEngine
+from app.token_accounts import TokenAccountIndex
+from app.price_feed import PriceFeed
+from app.price_poller import PricePoller
+from app.position_manager import PositionAbandoned, PositionManager
+from app.history import PoolHistory
+from app.pool_cache import PoolKeysCache
+from app.scheduler import CRITICAL, rpc_priority
+from app.raydium import get_token_mint
+from app.wsol import WsolAccountManager
+from app.config import PERSISTENT_WSOL, setup_logging, payer_pubkey
 
 import logging.handlers
 
@@ -31,6 +43,10 @@ PHONE_NUMBER = os.getenv('PHONE_NUMBER')
 # ID чатов
 SOURCE_CHAT_ID = int(os.getenv('SOURCE_CHAT_ID', '-1002093384030'))
 TARGET_CHAT_ID = int(os.getenv('TARGET_CHAT_ID', '7475229862'))
+# Reuse the last tick when the price feed is silent this long
+PRICE_TICK_TIMEOUT = 5
+# SOL spent per position
+BUY_AMOUNT = 0.006
 
 # В функции main() добавить:
 logger = setup_logging()
@@ -62,21 +78,9 @@ def rugcheck(mint):
         logging.error(f"Error rugchecking: {str(e)}")
         return None
 
-def get_balance(client, payer_pubkey):
+async def get_balance(payer_pubkey):
     try:
-        account_info = client.get_account_info(payer_pubkey )
-
-        # Check if account exists
-        if account_info.value is None:
-
-            print(f"Account {payer_pubkey} does not exist.")
-            return 0.0
-
-        # Get balance in lamports (1 SOL = 10^9 lamports)
-        balance_lamports = account_info.value.lamports 
-        # Convert lamports to SOL
-        balance_sol = balance_lamports / 10**9
-        return balance_sol
+        return await get_sol_balance(payer_pubkey)
     except Exception as e:
         logging.error(f"Error getting balance: {str(e)}")
         return 0.0
@@ -84,6 +88,34 @@ def get_balance(client, payer_pubkey):
 async def track_price(
         pool_keys, symbol, token_name, pair_address,
         start_price, client, event_id
+):
+    price_feed = PriceFeed.get_instance()
+    ticks = await price_feed.track(pool_keys)
+    try:
+        await follow_price(
+            ticks, pool_keys, symbol, token_name, pair_address,
+            start_price, client, event_id
+        )
+    finally:
+        await price_feed.untrack(pool_keys["amm_id"], ticks)
+
+async def next_price(ticks, pool_keys):
+    try:
+        tick = await asyncio.wait_for(ticks.get(), PRICE_TICK_TIMEOUT)
+        return tick.price
+    except asyncio.TimeoutError:
+        # no vault change in a while: the last price still holds
+        tick = PriceFeed.get_instance().latest(pool_keys["amm_id"])
+        if tick is not None:
+            return tick.price
+        # the stop loss waits on this read
+        with rpc_priority(CRITICAL):
+            current_price, _ = await get_token_price(pool_keys)
+        return current_price
+
+async def follow_price(
+        ticks, pool_keys, symbol, token_name, pair_address,
+        start_price, client, event_id
 ):
     last_pnl = 0
     pnl_message = None
@@ -94,7 +126,7 @@ async def track_price(
 
     while True:
         try:
-            current_price, _ = get_token_price(pool_keys)
+            current_price = await next_price(ticks, pool_keys)
             pnl = ((current_price - start_price) / start_price) * 100
 
             max_pnl = max(max_pnl, pnl)
@@ -106,9 +138,13 @@ async def track_price(
 
             if max_pnl > hundreds:
                 try:
-                    conf, _, token_amount = sell(pair_address, 50, token_symbol=symbol)
+                    conf, _, token_amount = await sell(pair_address, 50, token_symbol=symbol, pool_keys=pool_keys)
                     logging.debug(f"{token_name}  sell txn: confirm - {conf} ; ")
                     if conf:
+                        PoolHistory.get_instance().record_trade(
+                            pair_address, "sell", get_token_mint(pool_keys), symbol,
+                            token_amount=token_amount, price=current_price, pnl=pnl
+                        )
                         hundreds += 200
                         print(f"hundreds is {hundreds}")
                         await send_message_safely(client,
@@ -167,12 +203,21 @@ async def track_price(
                 pnl_side = "❇️🟩❇️" if pnl > 0 else "❌⭕️❌"
                 for _ in range(3):
 
-                    confirm, txn, token_amount = sell(pair_address, 100, token_symbol=symbol)
+                    confirm, txn, token_amount = await sell(pair_address, 100, token_symbol=symbol, pool_keys=pool_keys)
                     if confirm:
+                        history = PoolHistory.get_instance()
+                        history.record_trade(
+                            pair_address, "sell", get_token_mint(pool_keys), symbol,
+                            token_amount=token_amount, price=current_price, pnl=pnl, signature=txn
+                        )
+                        history.record_outcome(
+                            pair_address, "stop_loss", get_token_mint(pool_keys), symbol,
+                            BUY_AMOUNT, start_price, pnl, max_pnl
+                        )
                         await asyncio.sleep(5)
                         # cprint(f"Transaction sent - txn: {txn}", "yellow", attrs=["bold"])
                         try:
-                            sol_balance = get_balance(solana_client, payer_pubkey)
+                            sol_balance = await get_balance(payer_pubkey)
                             logging.info(colored(f"Current balance: {sol_balance:.2f}", "green"))
                         except Exception as e:
                             logging.error(colored(f"Error getting balance: {str(e)}", "red", attrs=["reverse"]))
@@ -195,7 +240,11 @@ async def track_price(
                     else:
                         logging.error(colored("Error sending transaction", "red", attrs=["reverse"]))
                         continue
-                logging.error(colored(f"Sell {token_name} transaction failed 3 times. Trying later...", "red", attrs=["bold", "reverse"]))
+                logging.error(colored(f"Sell {token_name} transaction failed 3 times. Giving up the position", "red", attrs=["bold", "reverse"]))
+                PoolHistory.get_instance().record_outcome(
+                    pair_address, "sell_failed", get_token_mint(pool_keys), symbol,
+                    BUY_AMOUNT, start_price, pnl, max_pnl
+                )
                 await send_message_safely(client, 
                                           TARGET_CHAT_ID,
                                           f"""
@@ -206,7 +255,7 @@ async def track_price(
               Pnl: **{pnl:.2f}%**""",
                                     parse_mode="Markdown",
                                     link_preview=False)
-                return
+                raise PositionAbandoned(f"sell failed 3 times at {pnl:.2f}%")
 
             if pnl_message:
                 await send_message_safely(client, 
@@ -215,18 +264,12 @@ async def track_price(
                                           parse_mode="Markdown",
                                           link_preview=False)
                 pnl_message = None
-            await asyncio.sleep(5)
 
         except SolanaRpcException:
             logging.critical(colored("Solana RPC error. Retrying...", "red", attrs=["bold", "reverse"]))
             await asyncio.sleep(2.5)
             continue
 
-        except Exception as e:
-            logging.error(colored(f"Error tracking pnl: {str(e)}", "red", attrs=["bold", "reverse"]))
-            print(traceback.format_exc())
-            continue
-
 async def send_message_safely(client, target_id, message, **kwargs):
     try:
         # Пробуем отправить напрямую
@@ -243,6 +286,28 @@ async def send_message_safely(client, target_id, message, **kwargs):
 async def main():
     # Создаем клиент Telegram
     client = TelegramClient('session/telegram_session', API_ID, API_HASH)
+    positions = PositionManager.get_instance()
+    history = PoolHistory.get_instance()
+
+    @client.on(events.NewMessage(chats=TARGET_CHAT_ID, pattern=r"^/positions"))
+    async def show_positions(event):
+        await event.reply(positions.summary(), parse_mode="Markdown")
+
+    @client.on(events.NewMessage(chats=TARGET_CHAT_ID, pattern=r"^/release\s+(\w+)"))
+    async def release_position(event):
+        # frees an abandoned position once its tokens were sold by hand
+        position = positions.get(event.pattern_match.group(1))
+        if position is None or position.status != "abandoned":
+            await event.reply("No abandoned position with this pair address")
+            return
+        positions.release(position)
+        await event.reply(f"Released {position.symbol}")
+
+    @client.on(events.NewMessage(chats=TARGET_CHAT_ID, pattern=r"^/history(?:\s+(\d+))?"))
+    async def show_history(event):
+        days = int(event.pattern_match.group(1) or 7)
+        report = await asyncio.to_thread(history.summary, days)
+        await event.reply(report, parse_mode="Markdown")
 
     # Обработчик новых сообщений
     @client.on(events.NewMessage(chats=SOURCE_CHAT_ID))
@@ -250,6 +315,7 @@ async def main():
         id = event.message.id
         logging.info(colored(f"New message received - ID: {event.message.id}", "light_blue"))
 
+        position = None
         try:
             if "New" in event.message.text:
                 mint = event.message.text.split("New")[0].split(
@@ -265,27 +331,34 @@ async def main():
                 cprint(f"\nGMGN URL: https://gmgn.ai/sol/token/{mint}", "light_magenta")
                 cprint(f"DexScreener URL: https://dexscreener.com/solana/{mint}\n", "magenta")
 
-                rug_check = rugcheck(mint)
+                # requests calls run in a thread so other signals keep flowing
+                rug_check = await asyncio.to_thread(rugcheck, mint)
 
                 if rug_check:
                     pair_address, symbol, score, risk_descriptions, is_no_danger = rug_check
                     if is_no_danger:
 
-                        pool_keys = fetch_pool_keys(pair_address)
+                        pool_keys = await fetch_pool_keys(pair_address)
 
                         if pool_keys:
+                            position = positions.reserve(pair_address, symbol, token_name, BUY_AMOUNT)
+                            if position is None:
+                                return
+                            prepare_swap(pool_keys)
 
-                            balance = get_balance(solana_client, payer_pubkey)
+                            balance = await get_balance(payer_pubkey)
                             logging.info(colored(f"Solana balance: {balance}", "light_green", attrs=["bold"]))
 
-                            txn, confirm = buy(pair_address, pool_keys, 0.006, 5, token_symbol=symbol)
+                            txn, confirm = await buy(pair_address, pool_keys, BUY_AMOUNT, 5, token_symbol=symbol)
                             logging.info(colored(f"Buy transaction: {str(txn)[:5]}...{str(txn)[-5:]}, confirm: {confirm}", "light_green", attrs=["bold"]))
                             wsol = "So11111111111111111111111111111111111111112"
-                            if confirm:
+                            if not confirm:
+                                positions.release(position)
+                            else:
                                 while True:
-                                    tracker = RaydiumPnLTracker(pair_address, mint, wsol, 0.001, RPC)
+                                    tracker = RaydiumPnLTracker(pair_address, mint, wsol, 0.001)
                                     try:
-                                        start_price, token_amount, _ = tracker.get_current_price(txn)
+                                        start_price, token_amount, _ = await asyncio.to_thread(tracker.get_current_price, txn)
 
                                         logging.info(colored(f"\n    Buy price: {start_price:.10f}", "light_green", attrs=["bold"]))
                                         break
@@ -312,18 +385,35 @@ async def main():
                                                           link_preview=False)
                                 logging.info(colored(f" Message forwarded to target chat: {event.message.id}", "dark_grey", "on_cyan"))
 
-                                await track_price(
+                                history.record_trade(
+                                    pair_address, "buy", mint, symbol, BUY_AMOUNT,
+                                    token_amount, start_price, signature=txn
+                                )
+                                position.amm_id = pool_keys["amm_id"]
+                                position.start_price = start_price
+                                positions.track(position, lambda: track_price(
                                     pool_keys, symbol, token_name,
                                     pair_address, start_price, client, id
-                                )
+                                ))
+                                logging.info(f"Positions: {positions.stats()}")
 
         except Exception as e:
             logging.error(f"Error processing message: {str(e)}")
+            if position is not None and position.task is None:
+                positions.release(position)
             print(traceback.format_exc())
 
     # Подключаемся к клиенту
     try:
         await client.start(phone=PHONE_NUMBER)        
+        BlockhashCache.get_instance().start()
+        ConfirmationEngine.get_instance().start()
+        PriceFeed.get_instance().start()
+        PricePoller.get_instance().start()
+        await ChainConstants.get_instance().start()
+        await TokenAccountIndex.get_instance().start()
+        if PERSISTENT_WSOL:
+            await WsolAccountManager.get_instance().start()
         logging.info(colored("Bot started and waiting for new messages...", "green", "on_white", attrs=["bold"]))
 
         # Добавляем получение информации о целевом пользователе при старте
@@ -342,6 +432,9 @@ async def main():
     except Exception as e:
         logging.critical(f"Error during bot startup or connection: {str(e)}")
     finally:
+        await positions.stop()
+        history.close()
+        PoolKeysCache.get_instance().close()
         await client.disconnect()
 
 # Запускаем основную функцию
@@ -10,6 +10,7 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.filters import CommandStart
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+from app.discovery import PoolDiscoveryService
 from app.global_bot import GlobalBot
 from app.sniper_bot import RaydiumSniper
 
@@ -149,8 +150,23 @@ User ID: {user_id}
     
     async def find_new_token(self, message: types.Message):
         try:
-            # Run the new token finding logic from main.py
-            await self.sniper.get_new_raydium_pool(5, 2)
+            if self.sniper is None:
+                self.sniper = RaydiumSniper(
+                    sol_in=self.sol_in,
+                    slippage=self.slippage,
+                    priority_fee=self.priority_fee,
+                    global_bot=GlobalBot.get_instance()
+                )
+
+            # Wait for the next pool from the shared discovery stream
+            discovery = PoolDiscoveryService.get_instance()
+            pool_events = discovery.subscribe("telegram")
+            discovery.start()
+            try:
+                event = await pool_events.get()
+            finally:
+                discovery.unsubscribe("telegram")
+            self.sniper.set_pool(event)
             
             # Check if token is safe
             is_safe = await self.sniper.check_if_rug()
@@ -184,6 +200,12 @@ Screener URL: https://dexscreener.com/solana/{self.sniper.pair_address}
             return
         
         try:
+            # the pool may only be processed yet, do not buy it before it confirms
+            pool_event = self.sniper.pool_event
+            if pool_event is not None and not await PoolDiscoveryService.get_instance().confirm(pool_event):
+                await message.answer("❌ Pool creation was not confirmed, skipping")
+                return
+
             confirm = await self.sniper.buy()
             if confirm:
                 await self.sniper.get_bought_price()